@@ -0,0 +1,70 @@
+'''
+    Benchmark of building the diagram of a long chain of nodes.
+
+    Builds a chain of -c nodes (default 50000) and times the walk that
+    adds them to the dot graph, without running Graphviz.  Trees whose
+    walk recursed once per hop need -r, which raises the recursion
+    limit and runs the walk in a thread with a 512 MB stack.  The
+    digest of the dot output is printed so trees can be compared.
+
+        python bench/bench_diagram.py [-n <natlas tree>] [-c <nodes>] [-r]
+'''
+
+import sys
+import time
+import hashlib
+import threading
+
+from common import load_natlas
+
+opts, args = load_natlas('c:r', '[-c <nodes>] [-r]')
+num_nodes = int(opts.get('-c', 50000))
+
+import pydot
+import simsnmp
+from natlas.network import natlas_network
+from natlas.node import natlas_node, natlas_node_link
+from natlas.output_diagram import natlas_output_diagram
+
+network = natlas_network(simsnmp.config())
+prev = None
+for i in range(num_nodes):
+    n = natlas_node('10.%i.%i.%i' % (i >> 16, (i >> 8) & 255, i & 255))
+    n.name = 'c%05i' % i
+    network.nodes.append(n)
+    if (prev != None):
+        l = natlas_node_link()
+        l.node              = n
+        l.local_port        = 'Gi0/1'
+        l.remote_port       = 'Gi0/2'
+        l.local_lag         = 'UNKNOWN'
+        l.local_lag_ips     = []
+        l.remote_lag_ips    = []
+        prev.links.append(l)
+    prev = n
+network.root_node = network.nodes[0]
+
+result = {}
+def walk():
+    diagram = pydot.Dot(graph_type='graph')
+    output = natlas_output_diagram(network)
+    start = time.perf_counter()
+    try:
+        output._natlas_output_diagram__generate(diagram, network.root_node)
+    except RecursionError:
+        result['error'] = 'RecursionError'
+        return
+    result['time'] = time.perf_counter() - start
+    result['digest'] = hashlib.md5(diagram.to_string().encode()).hexdigest()
+
+if ('-r' in opts):
+    sys.setrecursionlimit(num_nodes * 4)
+    threading.stack_size(512 * 1024 * 1024)
+thread = threading.Thread(target=walk)
+thread.start()
+thread.join()
+
+if ('error' in result):
+    print('%i node chain: %s' % (num_nodes, result['error']))
+else:
+    print('%i node chain: %.2f s, digest %s' % (num_nodes, result['time'], result['digest']))
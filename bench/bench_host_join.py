@@ -0,0 +1,90 @@
+'''
+    Benchmark of the get-hosts join of MAC entries to ARP entries.
+
+    Builds synthetic tables of 100k MACs and 150k ARPs, two of every
+    three ARPs for a known MAC, and times the join through
+    natlas_arp_table.index_by_mac() against the old scan of every ARP
+    entry for each MAC.  The old scan is timed on a sample of MACs and
+    extrapolated, the full run takes hours.
+
+    The ARP table is first built as a raw ipNetToMediaTable walk and
+    parsed with natlas_node.get_arp_table(), which is timed too, against
+    the old parse that scanned the walk for the MAC and type of each
+    row (also sampled).
+
+        python bench/bench_host_join.py [-m <MACs>] [-a <ARPs>] [-s <sample>]
+'''
+
+import random
+import time
+
+from common import load_natlas
+
+opts, args = load_natlas('m:a:s:', '[-m <MACs>] [-a <ARPs>] [-s <sample>]')
+num_macs    = int(opts.get('-m', 100000))
+num_arps    = int(opts.get('-a', 150000))
+sample      = int(opts.get('-s', 20))
+
+import natlas
+from pysnmp.proto.rfc1902 import ObjectName, OctetString, Integer
+from natlas.snmp import natlas_snmp, OID_ARP_VLAN, OID_ARP_MAC, OID_ARP_TYPE, OID_IFNAME
+from natlas.node import natlas_node
+
+random.seed(1)
+macs = natlas.natlas_mac_table()
+for i in range(num_macs):
+    # 00 as the first byte keeps the MACs in 0x hex form in the ARP walk
+    macs.append('sw%i' % (i % 200), '10.0.0.%i' % (i % 200), i % 100, random.getrandbits(40), 'gi1/0/%i' % (i % 48))
+mac_ints = list(macs.macs)
+
+# a raw ipNetToMediaTable walk, one ifIndex/MAC/type column each
+cols = ([], [], [])
+for i in range(num_arps):
+    mac = mac_ints[i % num_macs] if (i % 3) else random.getrandbits(40)
+    ip  = '10.%i.%i.%i' % (i >> 16, (i >> 8) & 255, i & 255)
+    idx = '%i.%s' % (i % 100 + 1, ip)
+    cols[0].append([(ObjectName('%s.%s' % (OID_ARP_VLAN, idx)), Integer(i % 100 + 1))])
+    cols[1].append([(ObjectName('%s.%s' % (OID_ARP_MAC, idx)), OctetString(hexValue='%012x' % mac))])
+    cols[2].append([(ObjectName('%s.%s' % (OID_ARP_TYPE, idx)), Integer(3))])
+vbtbl = cols[0] + cols[1] + cols[2]
+
+ifnames = [[(ObjectName('%s.%i' % (OID_IFNAME, i)), OctetString('Vlan%i' % i))] for i in range(1, 101)]
+natlas_snmp.get_bulk = lambda self, oid: ifnames if (oid == OID_IFNAME) else None
+
+node = natlas_node('10.0.0.1')
+node.arp_vbtbl = vbtbl
+start = time.perf_counter()
+arps = node.get_arp_table()
+parse = time.perf_counter() - start
+print('ARP parse:      %.2f s, %i entries' % (parse, len(arps)))
+
+# the old parse, two scans of the walk per row
+start = time.perf_counter()
+for r in cols[0][:sample]:
+    n, v = r[0]
+    suffix = str(n)[len(OID_ARP_VLAN):]
+    node.snmpobj.cache_lookup(vbtbl, OID_ARP_MAC + suffix)
+    node.snmpobj.cache_lookup(vbtbl, OID_ARP_TYPE + suffix)
+per_row = (time.perf_counter() - start) / sample
+print('scan per ARP:   %.4f s, %.0f s for %i ARPs (from a sample of %i)' % (per_row, per_row * num_arps, num_arps, sample))
+
+# the indexed join, as in get-hosts
+start = time.perf_counter()
+index = arps.index_by_mac()
+matches = 0
+for m in macs:
+    rows = index.get(m.mac_int)
+    if (rows != None):
+        matches += len(rows)
+new = time.perf_counter() - start
+print('indexed join:   %.2f s, %i matches' % (new, matches))
+
+# the old join, a scan of the ARP entries for each MAC
+arp_rows = list(arps)
+start = time.perf_counter()
+for m in list(macs)[:sample]:
+    for a in arp_rows:
+        if (a.mac == m.mac):
+            break
+per_mac = (time.perf_counter() - start) / sample
+print('scan per MAC:   %.4f s, %.0f s for %i MACs (from a sample of %i)' % (per_mac, per_mac * num_macs, num_macs, sample))
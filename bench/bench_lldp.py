@@ -0,0 +1,62 @@
+'''
+    Benchmark of parsing the LLDP remote tables of a node.
+
+    Builds an lldpRemTable with -c neighbors (default 1000), 5 columns
+    and one management address each, and times get_lldp_neighbors().
+    The digest of the parsed neighbors is printed so the results of two
+    natlas trees can be compared.  Trees before the one pass parser
+differ, they matched remIndex 1 to the addresses of 10, 11, 100...
+
+        python bench/bench_lldp.py [-n <natlas tree>] [-c <neighbors>]
+'''
+
+import time
+import hashlib
+
+from common import load_natlas
+
+opts, args = load_natlas('c:', '[-c <neighbors>]')
+count = int(opts.get('-c', 1000))
+
+from pysnmp.proto.rfc1902 import ObjectName, OctetString, Integer
+from natlas.snmp import *
+from natlas.node import natlas_node
+
+cols = {
+    4:  lambda i: Integer(4),
+    5:  lambda i: OctetString(bytes([0, 1, 2, 3, (i >> 8) & 255, i & 255])),
+    7:  lambda i: OctetString('Gi0/%i' % (i % 48)),
+    9:  lambda i: OctetString('host%i.example.com' % i),
+    10: lambda i: OctetString('Linux'),
+}
+keys = [(1 + (i % 48), i + 1) for i in range(count)]
+
+rows = []
+for c in sorted(cols):
+    for i, (port, idx) in enumerate(keys):
+        rows.append([(ObjectName('1.0.8802.1.1.2.1.4.1.1.%i.0.%i.%i' % (c, port, idx)), cols[c](i))])
+for i, (port, idx) in enumerate(keys):
+    oid = '1.0.8802.1.1.2.1.4.2.1.5.0.%i.%i.1.4.10.%i.%i.1' % (port, idx, (i >> 8) & 255, i & 255)
+    rows.append([(ObjectName(oid), Integer(2))])
+
+class bench_snmp(natlas_snmp):
+    def __init__(self):
+        natlas_snmp.__init__(self, '10.0.0.1')
+        self.success = 1
+        self.ver = 2
+        self.v2_community = 'bench'
+    def get_bulk(self, oid):
+        return rows if (oid == OID_LLDP) else []
+
+node = natlas_node('10.0.0.1')
+node.snmpobj = bench_snmp()
+if (hasattr(node, 'interfaces')):
+    node.interfaces.snmpobj = node.snmpobj
+
+start = time.perf_counter()
+neighbors = node.get_lldp_neighbors()
+elapsed = time.perf_counter() - start
+
+digest = hashlib.md5(repr([(n.remote_ip, n.remote_name, n.local_port, n.remote_port, n.remote_mac)
+                           for n in neighbors]).encode()).hexdigest()
+print('%i neighbors parsed in %.3f s, digest %s' % (len(neighbors), elapsed, digest))
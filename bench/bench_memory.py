@@ -0,0 +1,97 @@
+'''
+    Benchmark of the memory used by discovered nodes and links.
+
+    Builds -c nodes (default 20000) with 10 links, an SVI and a loopback
+    each, as a discovery would, and measures them with tracemalloc.
+    Strings are built fresh, like strings parsed from SNMP.  With -i
+    the platform, software, port and VLAN strings are interned through
+    util.intern_str() as discovery does.
+
+    With -b <commit> the nodes are also built with the natlas of that
+    commit, eg 9c9f4d0^ from before __slots__ and interning, and the
+    baseline, this tree and this tree with -i are reported together.
+    Each is measured in its own process.
+
+        python bench/bench_memory.py [-n <natlas tree>] [-c <nodes>] [-i]
+        python bench/bench_memory.py -b <commit> [-c <nodes>]
+'''
+
+import gc
+import sys
+import shutil
+import subprocess
+import tracemalloc
+
+from common import load_natlas, export_tree, REPO_ROOT
+
+opts, args = load_natlas('c:ib:', '[-c <nodes>] [-i] [-b <commit>]')
+num_nodes   = int(opts.get('-c', 20000))
+num_links   = 10
+
+if ('-b' in opts):
+    base = export_tree(opts['-b'])
+    try:
+        for label, tree, flags in (('before (%s)' % opts['-b'], base, []),
+                                   ('after', REPO_ROOT, []),
+                                   ('after, interned', REPO_ROOT, ['-i'])):
+            out = subprocess.run([sys.executable, __file__, '-n', tree, '-c', str(num_nodes)] + flags,
+                                 stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+            print('%-24s %s' % (label + ':', out.strip().split('\n')[-1]))
+    finally:
+        shutil.rmtree(base)
+    sys.exit(0)
+
+from natlas.node import natlas_node, natlas_node_link, natlas_node_svi, natlas_node_lo
+from natlas.util import *
+
+PLATS = ['WS-C3850-48P', 'WS-C2960X-48FPD-L', 'N9K-C93180YC-EX', 'C9300-48U']
+IOSES = ['16.9.4', '15.2(7)E2', '9.3(5)', '17.3.3']
+
+def s(x):
+    # a new string object, not a shared constant
+    return ''.join(list(x))
+
+intern = lambda x: x
+if ('-i' in opts):
+    intern = util.intern_str
+
+tracemalloc.start()
+
+nodes = []
+for i in range(num_nodes):
+    n = natlas_node(s('10.%i.%i.1' % (i >> 8, i & 255)))
+    n.name          = s('sw%05i' % i)
+    n.plat          = intern(s(PLATS[i % 4]))
+    n.ios           = intern(s(IOSES[i % 4]))
+    n.serial        = s('FOC%08i' % i)
+    n.discovered    = 1
+    n.router        = 0
+    svi = natlas_node_svi(s('10'))
+    svi.ip = [s('10.%i.%i.1/24' % (i >> 8, i & 255))]
+    n.svis.append(svi)
+    n.loopbacks.append(natlas_node_lo(s('Loopback0'), [s('172.16.%i.%i/32' % (i >> 8, i & 255))]))
+    nodes.append(n)
+
+for i, n in enumerate(nodes):
+    for j in range(num_links):
+        r = nodes[(i + j + 1) % num_nodes]
+        l = natlas_node_link()
+        l.node              = r
+        l.link_type         = s('1')
+        l.vlan              = intern(s('10'))
+        l.local_native_vlan = 1
+        l.local_port        = intern(s('gi1/0/%i' % (j + 1)))
+        l.remote_port       = intern(s('gi1/0/%i' % (48 - j)))
+        l.local_lag         = s('UNKNOWN')
+        l.local_lag_ips     = []
+        l.remote_lag_ips    = []
+        l.remote_ip         = s(r.ip[0])
+        l.remote_name       = s(r.name)
+        l.remote_ios        = intern(s(IOSES[(i + j + 1) % 4]))
+        l.discovered_proto  = s('cdp')
+        n.add_link(l)
+
+gc.collect()
+cur, peak = tracemalloc.get_traced_memory()
+print('%i nodes, %i links: %.1f MB (%.0f bytes/node with its links)' %
+        (num_nodes, num_nodes * num_links, cur / 1e6, cur / num_nodes))
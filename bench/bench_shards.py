@@ -0,0 +1,61 @@
+'''
+    Benchmark of sharded discovery on a simulated network.
+
+    Discovers a tree of -c devices (default 300) under simsnmp, once in
+    one process and then as 3 shards, one per subtree of the root, with
+    1 and -w worker processes (default 3).  Every SNMP request sleeps
+    -l seconds (default 0.002).  The sharded topology is checked against
+    the single process one.
+
+        python bench/bench_shards.py [-c <devices>] [-w <workers>] [-l <latency>]
+'''
+
+import io
+import time
+import contextlib
+
+from common import load_natlas
+
+opts, args = load_natlas('c:w:l:', '[-c <devices>] [-w <workers>] [-l <latency>]')
+num_devs    = int(opts.get('-c', 300))
+workers     = int(opts.get('-w', 3))
+
+import simsnmp
+from natlas.network import natlas_network
+from natlas.shard import natlas_shard_discovery
+from natlas.config import natlas_discover_shard
+
+simsnmp.LATENCY = float(opts.get('-l', 0.002))
+devs = simsnmp.tree(num_devs, fan=3)
+
+# each shard owns a subtree of the root, the root is in none
+owner = {}
+for i, d in enumerate(devs):
+    j = i
+    while (j > 3):
+        j = (j - 1) // 3
+    owner[d.ip] = j
+
+def make_network():
+    c = simsnmp.config()
+    c.shards = [natlas_discover_shard({'name': 's%i' % k, 'root': devs[k].ip,
+                                       'acl': ['permit ip %s/32' % ip for ip in owner if (owner[ip] == k)]})
+                for k in (1, 2, 3)]
+    net = natlas_network(c)
+    net.set_max_depth(100)
+    net.set_verbose(0)
+    return net
+
+start = time.time()
+ref = make_network()
+ref.discover(devs[0].ip)
+ref.discover_details()
+print('1 process:     %.2f s, %i nodes' % (time.time() - start, len(ref.nodes)))
+
+for w in sorted(set([1, workers])):
+    start = time.time()
+    net = make_network()
+    with contextlib.redirect_stdout(io.StringIO()):
+        natlas_shard_discovery(net, w).discover(1)
+    same = (simsnmp.topology(net) == simsnmp.topology(ref))
+    print('%i shard workers: %.2f s, %i nodes, same topology %s' % (w, time.time() - start, len(net.nodes), same))
@@ -0,0 +1,65 @@
+'''
+    Shared setup of the natlas benchmarks.
+
+    Every benchmark takes -n <natlas tree> to measure another copy of
+    natlas, eg a checkout of the commit before a change:
+
+        git worktree add /tmp/natlas-before <commit>^
+        python bench/bench_memory.py -n /tmp/natlas-before
+
+    Call load_natlas() before importing natlas.  export_tree() does the
+    checkout itself, for benchmarks that measure a baseline in the same
+    run.
+'''
+
+import sys
+import os
+import io
+import getopt
+import tarfile
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_natlas(opts='', usage=''):
+    '''
+    Parse -n <natlas tree> and the benchmark options, and put the
+    natlas tree first on sys.path.
+
+    Returns:
+        (dict of option -> value, other args)
+    '''
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'n:' + opts)
+    except getopt.GetoptError:
+        print('Usage: %s [-n <natlas tree>] %s' % (sys.argv[0], usage))
+        sys.exit(1)
+
+    ret = dict(opts)
+    tree = os.path.abspath(ret.get('-n', REPO_ROOT))
+    sys.path.insert(0, tree)
+    sys.path.insert(1, os.path.dirname(os.path.abspath(__file__)))
+
+    # old trees still have a few python 2 names
+    import builtins
+    if (hasattr(builtins, 'xrange') == False):
+        builtins.xrange = range
+
+    print('natlas from %s' % tree)
+    return (ret, args)
+
+
+def export_tree(commit):
+    '''
+    Extract the natlas package of a commit of this repository into a
+    temporary directory, for use with -n.
+
+    Returns:
+        Path of the directory
+    '''
+    tar = subprocess.run(['git', '-C', REPO_ROOT, 'archive', '--format=tar', commit, 'natlas'],
+                         stdout=subprocess.PIPE, check=True).stdout
+    tree = tempfile.mkdtemp(prefix='natlas-bench-')
+    tarfile.open(fileobj=io.BytesIO(tar)).extractall(tree)
+    return tree
@@ -0,0 +1,136 @@
+'''
+    A simulated network of SNMP devices for the benchmarks.
+
+    natlas_snmp is patched in place so that discovery talks to the
+    sim_device objects in WORLD instead of the network.  Each device
+    answers the system, CDP and interface tables discovery uses.
+    STATS counts the requests and LATENCY seconds are slept in each.
+'''
+
+import time
+
+from pysnmp.proto.rfc1902 import ObjectName, OctetString, Integer
+from natlas.snmp import *
+from natlas.config import natlas_config, natlas_discover_acl
+
+WORLD   = {}        # ip -> sim_device
+STATS   = {'get': 0, 'bulk': 0}
+LATENCY = 0.0
+
+class sim_device:
+    def __init__(self, ip, name):
+        self.ip     = ip
+        self.name   = name
+        self.plat   = 'WS-C3850'
+        self.ios    = 'Version 16.9.4,'
+        self.engine = '0x8000000903' + ip_hex(ip)[2:]
+        self.serial = 'FOC' + ip_hex(ip)[2:]
+        self.nbrs   = []    # (local ifindex, sim_device, remote port name)
+
+def ip_hex(ip):
+    return '0x%02x%02x%02x%02x' % tuple([int(o) for o in ip.split('.')])
+
+def link(a, b):
+    ia = len(a.nbrs) + 1
+    ib = len(b.nbrs) + 1
+    a.nbrs.append((ia, b, 'GigabitEthernet1/0/%i' % ib))
+    b.nbrs.append((ib, a, 'GigabitEthernet1/0/%i' % ia))
+
+def tree(n, fan=3):
+    '''
+    Make a tree of n devices, each linked to its parent.
+    '''
+    WORLD.clear()
+    devs = []
+    for i in range(n):
+        d = sim_device('10.0.%i.%i' % (i >> 8, i & 255), 'sw%04i' % i)
+        WORLD[d.ip] = d
+        devs.append(d)
+        if (i > 0):
+            link(devs[(i - 1) // fan], d)
+    return devs
+
+def config():
+    c = natlas_config()
+    c.snmp_creds    = [{'ver': 2, 'community': 'sim'}]
+    c.discover_acl  = [natlas_discover_acl('permit ip any')]
+    return c
+
+def topology(network):
+    '''
+    Return the sorted node names and the set of links of a network,
+    to compare two discoveries.
+    '''
+    nodes = sorted([n.name for n in network.nodes])
+    links = set()
+    for n in network.nodes:
+        for l in n.links:
+            if (l.node == None):
+                continue
+            links.add(tuple(sorted([(n.name, l.local_port), (l.node.name, l.remote_port)])))
+    return (nodes, links)
+
+def _request(snmpobj, kind):
+    STATS[kind] += 1
+    if (LATENCY > 0):
+        time.sleep(LATENCY)
+    return WORLD.get(snmpobj._ip)
+
+def _get_cred(self, creds):
+    if (_request(self, 'get') == None):
+        return 0
+    self.ver = 2
+    self.success = 1
+    self.v2_community = 'sim'
+    return 1
+
+def _probe(self, creds, oids, timeout=1, retries=0):
+    d = _request(self, 'get')
+    if (d == None):
+        return None
+    self.ver = 2
+    self.success = 1
+    self.v2_community = 'sim'
+    vals = {OID_SYSNAME: d.name, OID_SYS_OBJECT_ID: '1.3.6.1.4.1.9.1.1',
+            OID_SNMP_ENGINE_ID: d.engine, OID_SYS_SERIAL: d.serial}
+    return [vals.get(o) for o in oids]
+
+def _get_val(self, oid):
+    d = _request(self, 'get')
+    if ((d != None) and (oid == OID_SYSNAME)):
+        return d.name
+    return None
+
+def _get_vals(self, oids):
+    if (_request(self, 'get') == None):
+        return None
+    return [None for o in oids]
+
+def _get_bulk(self, oid):
+    d = _request(self, 'bulk')
+    if (d == None):
+        return None
+
+    if (oid == OID_CDP):
+        cols = ((OID_CDP_IPADDR,  lambda r: OctetString(hexValue=ip_hex(r[1].ip)[2:])),
+                (OID_CDP_IOS,     lambda r: OctetString(r[1].ios)),
+                (OID_CDP_DEVID,   lambda r: OctetString(r[1].name)),
+                (OID_CDP_DEVPORT, lambda r: OctetString(r[2])),
+                (OID_CDP_DEVPLAT, lambda r: OctetString(r[1].plat)))
+        rows = []
+        for col, val in cols:
+            for r in d.nbrs:
+                rows.append([(ObjectName('%s.%i.1' % (col, r[0])), val(r))])
+        return rows
+
+    if (oid == OID_IFNAME):
+        return [[(ObjectName('%s.%i' % (oid, i)), OctetString('GigabitEthernet1/0/%i' % i))]
+                for i in range(1, len(d.nbrs) + 2)]
+
+    return []
+
+natlas_snmp.get_cred    = _get_cred
+natlas_snmp.probe       = _probe
+natlas_snmp.get_val     = _get_val
+natlas_snmp.get_vals    = _get_vals
+natlas_snmp.get_bulk    = _get_bulk
@@ -38,12 +38,15 @@ def mod_load(mod):
     mod.author      = 'Michael Laforest'
     mod.authoremail = 'mjlaforest@gmail.com'
     mod.about       = 'Discover and diagram the network'
-    mod.syntax      = '-r <root IP>\n'                          \
+    mod.syntax      = '<-r <root IP> | -s | --resume | -P <processes>>\n' \
                       '        -o <output file>\n'              \
                       '        [-d <max depth>]\n'              \
                       '        [-c <config file>]\n'            \
                       '        [-t <diagram title>]\n'          \
-                      '        [-C <catalog file>]'
+                      '        [-C <catalog file>]\n'         \
+                      '        [-S <snapshot file> [-U]]\n'     \
+                      '        [-k <checkpoint file>]\n'       \
+                      '        [-b <time budget>]'
     mod.require_api = '0.12'
     mod_help        = 'Discover and diagram the network beginning at the specified root node.'
     return 1
@@ -52,11 +55,18 @@ def mod_entry(natlas_obj, argv):
     opt_root_ip = None
     opt_output  = None
     opt_catalog = None
+    opt_snapshot = None
+    opt_update  = 0
+    opt_checkpoint = natlas_obj.config.checkpoint.file
+    opt_resume  = 0
+    opt_procs   = 0
+    opt_sweep   = 0
+    opt_budget  = None
     opt_depth   = DEFAULT_OPT_DEPTH
     opt_title   = DEFAULT_OPT_TITLE
 
     try:
-        opts, args = getopt.getopt(argv, 'o:d:r:t:F:c:C:')
+        opts, args = getopt.getopt(argv, 'o:d:r:t:F:c:C:S:Uk:P:sb:', ['resume'])
     except getopt.GetoptError:
         print('Invalid arguments.')
         return
@@ -66,15 +76,62 @@ def mod_entry(natlas_obj, argv):
         if (opt == '-d'):   opt_depth = int(arg)
         if (opt == '-t'):   opt_title = arg
         if (opt == '-C'):   opt_catalog = arg
+        if (opt == '-S'):   opt_snapshot = arg
+        if (opt == '-U'):   opt_update = 1
+        if (opt == '-k'):   opt_checkpoint = arg
+        if (opt == '-P'):   opt_procs = int(arg)
+        if (opt == '-s'):   opt_sweep = 1
+        if (opt == '-b'):   opt_budget = int(arg)
+        if (opt == '--resume'): opt_resume = 1
+
+    if (((opt_root_ip == None) & (opt_resume == 0) & (opt_procs == 0) & (opt_sweep == 0)) | (opt_output == None)):
+        print('Invalid arguments.')
+        return
+
+    # -P discovers the shards in the config block in parallel
+    if ((opt_procs > 0) & (len(natlas_obj.config.shards) == 0)):
+        print('-P requires shards in the config file.')
+        return
+    if ((opt_procs > 0) & ((opt_resume == 1) | (opt_update == 1))):
+        print('Invalid arguments.')
+        return
+
+    # -s sweeps the config ranges for extra seeds
+    if ((opt_sweep == 1) & (len(natlas_obj.config.sweep.ranges) == 0)):
+        print('-s requires sweep ranges in the config file.')
+        return
+    if ((opt_sweep == 1) & ((opt_resume == 1) | (opt_update == 1) | (opt_procs > 0))):
+        print('Invalid arguments.')
+        return
+
+    # --resume continues from the checkpoint file
+    if ((opt_resume == 1) & (opt_checkpoint == None)):
+        print('--resume requires a checkpoint file (-k or the config checkpoint block).')
+        return
+    if ((opt_resume == 1) and (os.path.isfile(opt_checkpoint) == False)):
+        print('Checkpoint file %s not found.' % opt_checkpoint)
+        return
 
-    if ((opt_root_ip == None) | (opt_output == None)):
+    # -U updates the topology in the snapshot file rather than
+    # discovering it again, if there is one to update
+    if ((opt_update == 1) & (opt_snapshot == None)):
         print('Invalid arguments.')
         return
+    if ((opt_update == 1) and (os.path.isfile(opt_snapshot) == False)):
+        print('Snapshot file %s not found, discovering the whole network.' % opt_snapshot)
+        opt_update = 0
 
     print('     Config file: %s' % natlas_obj.config_file)
     print('     Output file: %s' % opt_output)
     print('Out Catalog file: %s' % opt_catalog)
-    print('       Root node: %s' % opt_root_ip)
+    print('   Snapshot file: %s%s' % (opt_snapshot, ' (update)' if opt_update else ''))
+    print(' Checkpoint file: %s%s' % (opt_checkpoint, ' (resume)' if opt_resume else ''))
+    if (opt_procs > 0):
+        print('          Shards: %i (%i processes)' % (len(natlas_obj.config.shards), opt_procs))
+    else:
+        print('       Root node: %s' % opt_root_ip)
+    if (opt_sweep == 1):
+        print('     Sweep range: %s' % ', '.join(natlas_obj.config.sweep.ranges))
     print('  Discover depth: %s' % opt_depth)
     print('   Diagram title: %s' % opt_title)
     print()
@@ -82,10 +139,30 @@ def mod_entry(natlas_obj, argv):
     # start discovery
     natlas_obj.set_discover_maxdepth(opt_depth)
     natlas_obj.set_verbose(1)
-    natlas_obj.discover_network(opt_root_ip, 1)
+    if (opt_budget != None):
+        natlas_obj.set_time_budget(opt_budget)
+    if (opt_checkpoint != None):
+        natlas_obj.set_checkpoint(opt_checkpoint)
+
+    if (opt_procs > 0):
+        natlas_obj.discover_network_sharded(1, opt_procs)
+    elif (opt_resume == 1):
+        natlas_obj.resume_network(opt_checkpoint, 1)
+    elif (opt_update == 1):
+        natlas_obj.discover_network_delta(opt_snapshot, 1)
+    else:
+        # -r can list several seed IPs, discovered at the same time
+        seeds = opt_root_ip.split(',') if (opt_root_ip != None) else []
+        if (opt_sweep == 1):
+            seeds += natlas_obj.sweep_network()
+        if (len(seeds) == 0):
+            print('No devices found.')
+            return
+        natlas_obj.discover_network(seeds, 1)
 
     # outputs
     if (opt_output != None):    natlas_obj.write_diagram(opt_output, opt_title)
     if (opt_catalog != None):   natlas_obj.write_catalog(opt_catalog)
+    if (opt_snapshot != None):  natlas_obj.save_snapshot(opt_snapshot)
 
     return
@@ -85,9 +85,14 @@ def mod_entry(natlas_obj, argv):
     # set some snmp credentials for us to use
     natlas_obj.snmp_add_credential(2, opt_community)
     
+    # the ARP interface is the SVI name (eg, Vlan800)
+    opt_interf = None
+    if (opt_vlan != None):
+        opt_interf = 'Vl(an)?(%s)$' % opt_vlan
+
     # get the ARP table
     try:
-        arp = natlas_obj.get_arp_table(opt_devip, ip=opt_ip, mac=opt_mac, interf=opt_vlan, arp_type=opt_type)
+        arp = natlas_obj.get_arp_table(opt_devip, ip=opt_ip, mac=opt_mac, interf=opt_interf, arp_type=opt_type)
     except Exception as e:
         print(e)
         return
@@ -24,7 +24,6 @@
 
 import sys
 import getopt
-import socket
 import natlas
 
 def mod_load(mod):
@@ -34,8 +33,8 @@ def mod_load(mod):
     mod.authoremail = 'mjlaforest@gmail.com'
     mod.about       = 'Display details about connected hosts'
     mod.syntax      = [
-                        '-r <root IP> -c <config file> [-o <csv file>] [-d <discovery depth>]',
-                        '-n <node IP> [-r <router IP>] -C <snmp v2 community> [-v <vlan regex>] [-p <port regex>] [-o <csv file>]'
+                        '-r <root IP> -c <config file> [-v <vlan>] [-o <csv file>] [-d <discovery depth>] [-w <workers>]',
+                        '-n <node IP> [-r <router IP>] -C <snmp v2 community> [-v <vlan>] [-p <port regex>] [-o <csv file>]'
                       ]
     mod.help         = '''
                         Collect information about hosts connected to the network.
@@ -43,11 +42,13 @@ def mod_load(mod):
                         To get information from just one node, use the -n option.
                         To get information from discovered nodes, use the -r option.
 
-                        If -r is used, a network discovery is performed at the specified root node. The discovered nodes are then queried to determine hosts connected to each node.
+                        If -r is used, a network discovery is performed at the specified root node. The discovered nodes are then queried to determine hosts connected to each node.  Up to -w nodes (default 16) are queried at the same time.  ARP entries are only collected from routers; when routers are HSRP/VPC peers, only enough of them to cover every SVI subnet are queried.  If -v is used then only hosts in that VLAN are collected.
 
                         Details about hosts include MAC addresses, IP addresses, VLANs, switch ports, and DNS names if available.
 
-                        The resulting data is printed to stdout and can also be saved to a CSV file using the -o option.
+                        DNS names are resolved concurrently and cached as configured by the 'dns' block of the config file.
+
+                        The resulting data is printed to stdout and can also be saved to a CSV file using the -o option.  Rows are written as soon as each node has been collected.  If the file name ends with .gz the CSV is gzip compressed.
                         '''
 
     mod.example      = '''
@@ -101,8 +102,9 @@ def mod_entry(natlas_obj, argv):
     opt_port        = None
     opt_output      = None
     opt_depth       = 100
+    opt_workers     = natlas.DEFAULT_HARVEST_WORKERS
     try:
-        opts, args = getopt.getopt(argv, 'r:n:o:d:C:v:p:')
+        opts, args = getopt.getopt(argv, 'r:n:o:d:C:v:p:w:')
     except getopt.GetoptError:
         return natlas.RETURN_SYNTAXERR
     for opt, arg in opts:
@@ -112,7 +114,20 @@ def mod_entry(natlas_obj, argv):
         if (opt == '-d'):   opt_depth = arg
         if (opt == '-C'):   opt_community = arg
         if (opt == '-v'):   opt_vlan = arg
-        if (opt == '-p'):   opt_depth = arg
+        if (opt == '-p'):   opt_port = arg
+        if (opt == '-w'):   opt_workers = arg
+
+    # -v is a single VLAN ID, it selects the CAM table to walk
+    try:
+        if (opt_vlan != None):
+            opt_vlan = str(int(opt_vlan))
+            if ((int(opt_vlan) < 1) | (int(opt_vlan) > 4094)):
+                return natlas.RETURN_SYNTAXERR
+        opt_workers = int(opt_workers)
+        if (opt_workers < 1):
+            return natlas.RETURN_SYNTAXERR
+    except ValueError:
+        return natlas.RETURN_SYNTAXERR
 
     if ((opt_root_ip == None) & (opt_node_ip == None)):
         return natlas.RETURN_SYNTAXERR
@@ -120,86 +135,115 @@ def mod_entry(natlas_obj, argv):
     if (opt_node_ip != None):
         return single_node(natlas_obj, opt_node_ip, opt_root_ip, opt_community, opt_vlan, opt_port, opt_output)
         
-    return all_nodes(natlas_obj, opt_root_ip, opt_output, opt_depth)
-
-
-def get_arp_entry_for_mac(arps, macaddr):
-    for a in arps:
-        if (a.mac == macaddr):
-            return a
-    return None
+    return all_nodes(natlas_obj, opt_root_ip, opt_vlan, opt_output, opt_depth, opt_workers)
+
+
+def get_arp_entries_for_mac(arps, arp_index, mac_int):
+    '''
+    Return all ARP entries for the MAC using the index from
+    natlas_arp_table.index_by_mac().  Returns [None] if no entries
+    exist so the MAC is still displayed.
+    '''
+    rows = arp_index.get(mac_int)
+    if (rows == None):
+        return [None]
+    return [arps[i] for i in rows]
+
+
+def join_hosts(macs, arps, arp_index=None, opt_vlan=None):
+    '''
+    Join the MAC entries to their ARP entries.
+    Returns a list of (mac, arp) tuples; arp is None for MACs without an ARP entry.
+    '''
+    ret = []
+    if (arp_index == None):
+        arp_index = arps.index_by_mac()
+    for m in macs:
+        for arp in get_arp_entries_for_mac(arps, arp_index, m.mac_int):
+            if ((arp != None) & (opt_vlan != None)):
+                if (str(arp.interf).lstrip('Vl') != opt_vlan):
+                    continue
+            ret.append((m, arp))
+    return ret
 
 
 def create_csv_file(filepath, colnames):
     f = None
     if (filepath != None):
         try:
-            f = open(filepath, 'w')
-            f.write('%s\n' % colnames)
+            f = natlas.natlas_output_csv(filepath, colnames)
+            f.open()
         except:
             print('Unable to open CSV output file "%s"' % filepath)
+            f = None
     return f
 
 
-def all_nodes(natlas_obj, opt_root_ip, opt_output, opt_depth):
+def all_nodes(natlas_obj, opt_root_ip, opt_vlan, opt_output, opt_depth, opt_workers):
     # discover the network
     natlas_obj.set_discover_maxdepth(opt_depth)
     natlas_obj.set_verbose(1)
     natlas_obj.discover_network(opt_root_ip, 0)
 
-    network_macs = [] 
-    network_arps = []
-
-    # iterate through each discovered node
     natlas_nodes = natlas_obj.get_discovered_nodes()
-    for node in natlas_nodes:
-        # get the switch MAC table
+
+    # only routers have useful ARP tables
+    print('\nFinding routers...')
+    arp_nodes = natlas_obj.get_arp_nodes(natlas_nodes, [opt_vlan] if (opt_vlan != None) else None, opt_workers)
+    print('Collecting ARPs from %i of %i nodes' % (len(arp_nodes), len(natlas_nodes)))
+
+    # collect the ARP tables first, they are the lookup side of the join
+    network_arps = natlas.natlas_arp_table()
+    for node, macs, arps, err in natlas_obj.harvest_hosts(arp_nodes, get_macs=False, max_workers=opt_workers):
         nip = natlas_obj.get_node_ip(node)
-        print('Collecting MACs from %s...' % nip)
-        try:
-            macs = natlas_obj.get_switch_macs(nip, verbose=1)
-            network_macs.extend(macs)
-        except Exception as e:
-            print(e)
-            pass
-  
-        # get the ARP table for the router
-        print('Collecting ARPs from %s...' % nip)
-        try:
-            arps = natlas_obj.get_arp_table(nip)
+        if (err != None):
+            print('Collecting ARPs from %s failed: %s' % (nip, err))
+        if (arps != None):
+            print('Collected %i ARPs from %s' % (len(arps), nip))
             network_arps.extend(arps)
-        except Exception as e:
-            print(e)
-            pass
-    
-    print()
-    print('Found %i MAC entries' % len(network_macs))
-    print('Found %i ARP entries' % len(network_arps))
+    arp_index = network_arps.index_by_mac()
+
     print()
     print('NODE_NAME               NODE_IP            PORT        IP                MAC               VLAN        DNS')
     print('---------               -------            ----        --                ---               ----        ---')
 
     # create the output csv file
-    f = create_csv_file(opt_output, 'NODE_NAME,NODE_IP,PORT,IP,MAC,VLAN,DNS')
-    for m in network_macs:
-        arp = get_arp_entry_for_mac(network_arps, m.mac)
-        ip   = ''
-        interf = ''
-        dns  = ''
-        if (arp != None):
-            ip   = arp.ip
-            interf = str(arp.interf).lstrip('Vl')
-            try:
-                dns  = socket.gethostbyaddr(ip)[0]
-            except:
-                pass
-        print('{:<20}    {:<15}    {:<8}    {:<14}    {:<5}    {:<8}    {:}'.format(m.node_host, m.node_ip, m.port, ip, m.mac, interf, dns))
-
-        if (f != None):
-            f.write('"%s","%s","%s","%s","%s","%s","%s"\n' % (m.node_host, m.node_ip, m.port, ip, m.mac, interf, dns))
+    f = create_csv_file(opt_output, ['NODE_NAME', 'NODE_IP', 'PORT', 'IP', 'MAC', 'VLAN', 'DNS'])
+
+    # join the MACs of each node as soon as the node is finished
+    num_macs = 0
+    for node, macs, arps, err in natlas_obj.harvest_hosts(natlas_nodes, get_arps=False, max_workers=opt_workers):
+        if (err != None):
+            print('Collecting MACs from %s failed: %s' % (natlas_obj.get_node_ip(node), err))
+        if (macs == None):
+            continue
+        if (opt_vlan != None):
+            macs = macs.filter_vlan(opt_vlan)
+        num_macs += len(macs)
+
+        hosts = join_hosts(macs, network_arps, arp_index)
+        names = natlas_obj.resolve_hosts([arp.ip for m, arp in hosts if (arp != None)])
+
+        for m, arp in hosts:
+            ip   = ''
+            interf = ''
+            dns  = ''
+            if (arp != None):
+                ip   = arp.ip
+                interf = str(arp.interf).lstrip('Vl')
+                dns  = names.get(ip, '')
+            print('{:<20}    {:<15}    {:<8}    {:<14}    {:<5}    {:<8}    {:}'.format(m.node_host, m.node_ip, m.port, ip, m.mac, interf, dns))
+
+            if (f != None):
+                f.write_row([m.node_host, m.node_ip, m.port, ip, m.mac, interf, dns])
     
     if (f != None):
         f.close()
+    natlas_obj.close_resolver()
+
+    print()
+    print('Found %i MAC entries' % num_macs)
+    print('Found %i ARP entries' % len(network_arps))
 
     return natlas.RETURN_OK
 
@@ -236,29 +280,27 @@ def single_node(natlas_obj, opt_devip, opt_routerip, opt_community, opt_vlan, op
     print('PORT        IP                MAC               VLAN        DNS')
     print('----        --                ---               ----        ---')
 
-    f = create_csv_file(opt_output, 'NODE_NAME,NODE_IP,PORT,IP,MAC,VLAN,DNS')
+    hosts = join_hosts(macs, arps, opt_vlan=opt_vlan)
+    names = natlas_obj.resolve_hosts([arp.ip for m, arp in hosts if (arp != None)])
 
-    for m in macs:
-        arp    = get_arp_entry_for_mac(arps, m.mac)
+    f = create_csv_file(opt_output, ['NODE_NAME', 'NODE_IP', 'PORT', 'IP', 'MAC', 'VLAN', 'DNS'])
+
+    for m, arp in hosts:
         ip     = ''
         interf = ''
         dns    = ''
         if (arp != None):
             ip     = arp.ip
             interf = str(arp.interf).lstrip('Vl')
-            if ((opt_vlan != None) & (interf != opt_vlan)):
-                continue
-            try:
-                dns = socket.gethostbyaddr(ip)[0]
-            except:
-                pass
+            dns    = names.get(ip, '')
         print('{:<8}    {:<14}    {:<5}    {:<8}    {:}'.format(m.port, ip, m.mac, interf, dns))
         
         if (f != None):
-            f.write('"","%s","%s","%s","%s","%s","%s"\n' % (opt_devip, m.port, ip, m.mac, interf, dns))
+            f.write_row(['', opt_devip, m.port, ip, m.mac, interf, dns])
     
     if (f != None):
         f.close()
+    natlas_obj.close_resolver()
     
     return natlas.RETURN_OK
 
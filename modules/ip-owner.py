@@ -0,0 +1,107 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        ip-owner.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+import sys
+import getopt
+import natlas
+
+DEFAULT_OPT_DEPTH   = 100
+
+def mod_load(mod):
+    mod.name         = 'ip-owner'
+    mod.version      = '0.1'
+    mod.author       = 'Michael Laforest'
+    mod.authoremail  = 'mjlaforest@gmail.com'
+    mod.about        = 'Find which node owns an IP address'
+    mod.syntax       = [
+                        '-r <root IP> [-d <discovery depth>] <IP> [<IP> ...]',
+                        '-t <snapshot file> <IP> [<IP> ...]'
+                       ]
+    mod.help         = '''
+                        Find which node owns an IP address.
+
+                        The network is discovered from the root node given with -r, or loaded from a snapshot saved by the diagram module with -t.  Every interface address of the discovered nodes (management IPs, SVIs, loopbacks and routed links) is indexed.
+
+                        Each IP address is matched against the index by longest prefix.  If the address is configured on a node that node and interface are listed.  Otherwise the nodes attached to the most specific subnet containing the address are listed.
+                        '''
+    mod.example      = '''
+                        # ip-owner -t network.json 10.20.30.1 10.20.30.40
+
+                        IP                MATCH               NODE NAME                  NODE IP           INTERFACE
+                        --                -----               ---------                  -------           ---------
+                        10.20.30.1        10.20.30.1/24       RouterA                    10.0.0.1          Vlan30
+                        10.20.30.40       10.20.30.1/24       RouterA                    10.0.0.1          Vlan30 (subnet)
+                        10.20.30.40       10.20.30.2/24       RouterB                    10.0.0.2          Vlan30 (subnet)
+                        '''
+    mod.notimer      = 0
+    mod.preload_conf = 1
+    mod.require_api  = '0.12'
+    return 1
+
+def mod_entry(natlas_obj, argv):
+    opt_root_ip  = None
+    opt_snapshot = None
+    opt_depth    = DEFAULT_OPT_DEPTH
+    try:
+        opts, args = getopt.getopt(argv, 'r:d:t:')
+    except getopt.GetoptError:
+        return natlas.RETURN_SYNTAXERR
+    for opt, arg in opts:
+        if (opt == '-r'):   opt_root_ip = arg
+        if (opt == '-d'):   opt_depth = int(arg)
+        if (opt == '-t'):   opt_snapshot = arg
+
+    if (((opt_root_ip == None) & (opt_snapshot == None)) | (len(args) == 0)):
+        return natlas.RETURN_SYNTAXERR
+
+    if (opt_snapshot != None):
+        try:
+            natlas_obj.load_snapshot(opt_snapshot)
+        except (OSError, ValueError) as e:
+            print('[ERROR] Unable to load snapshot "%s": %s' % (opt_snapshot, e))
+            return natlas.RETURN_ERR
+    else:
+        natlas_obj.set_discover_maxdepth(opt_depth)
+        natlas_obj.set_verbose(1)
+        natlas_obj.discover_network(opt_root_ip, 1)
+        print()
+
+    print('IP                MATCH               NODE NAME                  NODE IP           INTERFACE')
+    print('--                -----               ---------                  -------           ---------')
+
+    for ip in args:
+        owners = natlas_obj.lookup_ip(ip)
+        if (len(owners) == 0):
+            print('{:<16}  {}'.format(ip, 'not found'))
+            continue
+        for o in owners:
+            interface = o.interface or ''
+            if (o.exact == 0):
+                interface += ' (subnet)'
+            print('{:<16}  {:<18}  {:<25}  {:<16}  {}'.format(ip, o.cidr, o.node.name, o.node.ip[0], interface))
+
+    return natlas.RETURN_OK
+
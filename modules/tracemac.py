@@ -30,20 +30,26 @@ import os
 import natlas
 
 HOP_LIMIT   = 1000
-gnatlas     = None
-visited_ips = []
+
+# with a topology, look up at most this many MACs on a switch one at a
+# time before walking its whole CAM table instead
+TARGETED_LOOKUP_MAX = 8
 
 def mod_load(mod):
     mod.name         = 'tracemac'
-    mod.version      = '0.1'
+    mod.version      = '0.2'
     mod.author       = 'Michael Laforest'
     mod.authoremail  = 'mjlaforest@gmail.com'
     mod.about        = 'Trace a MAC address through a layer 2 network.'
-    mod.syntax       = '-n <starting node IP> -m <MAC address>'
+    mod.syntax       = '-n <starting node IP> <-m <MAC address> | -f <MAC file>> [-t <snapshot file> | -D]'
     mod.help         = '''
                         Trace a MAC address through a layer 2 network.
 
                         Define a switch on that network to begin the trace using -n. tracemac will use the MAC and CDP/LLDP tables to iteratively trace the MAC defined with -m until the host port is located.
+
+                        To trace many MACs at once use -f with a file containing one MAC address per line.  All of the traces run together and each switch is queried only once for the whole batch.
+
+                        Neighbors are normally found by walking the CDP/LLDP tables of each switch in the path.  Use -t to load a topology snapshot saved by the diagram module, or -D to discover the topology from the starting node first, and the next hop is taken from the discovered links instead.  The port of the MAC is then found with direct SNMP GETs rather than walking the whole CAM table.
                         '''
     mod.example      = '''
                         # tracemac -n 10.10.20.1 -m d4be.d939.4fd2
@@ -60,6 +66,15 @@ def mod_load(mod):
                             Node IP: 10.10.20.5
                           Node Name: SwitchE
                                Port: Gi0/8
+
+                        # tracemac -n 10.10.20.1 -f macs.txt
+
+                        MAC               RESULT     HOPS   NODE IP          NODE NAME                  VLAN     PORT
+                        ---               ------     ----   -------          ---------                  ----     ----
+                        d4be.d939.4fd3    FOUND      3      10.10.20.5       SwitchE                    10       Gi0/8
+                        0050.56a1.0001    NOT FOUND  1
+
+                        Traced 2 MACs, 1 found, 3 switches queried.
                         '''
     mod.notimer      = 0
     mod.preload_conf = 1
@@ -67,87 +82,294 @@ def mod_load(mod):
     return 1
 
 def mod_entry(natlas_obj, argv):
-    global gnatlas
-    gnatlas = natlas_obj
-
     opt_ip = None
-    opt_community = None
+    opt_mac = None
+    opt_file = None
+    opt_snapshot = None
+    opt_discover = 0
     try:
-        opts, args = getopt.getopt(argv, 'n:m:')
+        opts, args = getopt.getopt(argv, 'n:m:f:t:D')
     except getopt.GetoptError:
-        return natlas.RETURN_ERR
+        return natlas.RETURN_SYNTAXERR
     for opt, arg in opts:
         if (opt == '-n'):   opt_ip = arg
         if (opt == '-m'):   opt_mac = arg
+        if (opt == '-f'):   opt_file = arg
+        if (opt == '-t'):   opt_snapshot = arg
+        if (opt == '-D'):   opt_discover = 1
+
+    if ((opt_ip == None) | ((opt_mac == None) & (opt_file == None))):
+        return natlas.RETURN_SYNTAXERR
+
+    port_index = None
+    if (opt_snapshot != None):
+        try:
+            natlas_obj.load_snapshot(opt_snapshot)
+        except (OSError, ValueError) as e:
+            print('[ERROR] Unable to load snapshot "%s": %s' % (opt_snapshot, e))
+            return natlas.RETURN_ERR
+        port_index = natlas_obj.network.get_port_index()
+    elif (opt_discover == 1):
+        natlas_obj.set_discover_maxdepth(HOP_LIMIT)
+        natlas_obj.set_verbose(0)
+        natlas_obj.discover_network(opt_ip, 0)
+        port_index = natlas_obj.network.get_port_index()
+
+    cache = trace_cache(natlas_obj, port_index)
+
+    if (opt_file == None):
+        return single_mac(cache, opt_ip, opt_mac)
 
+    try:
+        macs = load_mac_file(opt_file)
+    except OSError as e:
+        print('[ERROR] Unable to read "%s": %s' % (opt_file, e.strerror))
+        return natlas.RETURN_ERR
+
+    return batch_macs(cache, opt_ip, macs)
+
+def single_mac(cache, opt_ip, opt_mac):
     print('HOP    NODE IP          NODE NAME                  VLAN     PORT          REMOTE NODE IP   REMOTE NODE NAME')
     print('---    -------          ---------                  ----     ----          --------------   ----------------')
 
-    try:
-        node, port = trace_node(opt_ip, opt_mac, 1)
-    except Exception as e:
-        print('[ERROR] %s' % e)
+    t = trace_macs(cache, opt_ip, [opt_mac])[0]
+
+    for hop in t.hops:
+        sys.stdout.write('{:<5}  {:<15}  '.format(hop.depth, hop.node_ip))
+        if (hop.port != None):
+            sys.stdout.write('{:<25}  {:<7}  {:<12}  '.format(hop.node_name, hop.vlan, hop.port))
+        if (hop.remote_ip != None):
+            sys.stdout.write('{:<15}  {:<25}'.format(hop.remote_ip, hop.remote_name))
+        print()
+
+    if (t.error != None):
+        print('[ERROR] %s' % t.error)
         return natlas.RETURN_OK
 
     print()
-    if (node == None):
+    if (t.node == None):
         print('NOT FOUND')
     else:
         print('FOUND\n')
         print('MAC Address: %s' % opt_mac)
-        print('    Node IP: %s' % node.get_ipaddr())
-        print('  Node Name: %s' % node.name)
-        print('       Port: %s' % port)
+        print('    Node IP: %s' % t.node.get_ipaddr())
+        print('  Node Name: %s' % t.node.name)
+        print('       Port: %s' % t.port)
 
     return natlas.RETURN_OK
 
-def trace_node(node_ip, macaddr, depth):
-    global visited_ips
-    if (node_ip in visited_ips):
-        raise Exception('Loop encountered.')
-    visited_ips.append(node_ip)
-
-    if (depth > HOP_LIMIT):
-        # probably some weird problem
-        raise Exception('Hop count too high. Terminating trace.')
-
-    sys.stdout.write('{:<5}  {:<15}  '.format(depth, node_ip))
-    sys.stdout.flush()
-
-    node = gnatlas.new_node(node_ip)
-    macs = gnatlas.get_switch_macs(node=node)
-    gnatlas.query_node(node, get_name=True)
-
-    match = None
-    for mac in macs:
-        if (mac.mac == macaddr):
-            node_name = ''
-            if (node.name != None):
-                node_name = node.name
-            sys.stdout.write('{:<25}  {:<7}  {:<12}  '.format(node_name, mac.vlan, mac.port))
-            sys.stdout.flush()
-            match = mac
-            break
-
-    if (match == None):
-        return (None, None)
-
-    port = node.shorten_port_name(mac.port)
-    neighbors = gnatlas.get_neighbors(node)
-
-    match = None
-    for n in neighbors:
-        if (n.local_port == port):
-            sys.stdout.write('{:<15}  {:<25}'.format(n.remote_ip, n.remote_name))
-            sys.stdout.flush()
-            match = n
-            break
+def batch_macs(cache, opt_ip, macs):
+    traces = trace_macs(cache, opt_ip, macs)
+
+    print('MAC               RESULT     HOPS   NODE IP          NODE NAME                  VLAN     PORT')
+    print('---               ------     ----   -------          ---------                  ----     ----')
+
+    found = 0
+    for t in traces:
+        if (t.error != None):
+            print('{:<16}  {:<9}  {:<5}  {}'.format(t.macaddr, 'ERROR', len(t.hops), t.error))
+        elif (t.node == None):
+            print('{:<16}  {:<9}  {:<5}'.format(t.macaddr, 'NOT FOUND', len(t.hops)))
+        else:
+            found += 1
+            hop = t.hops[-1]
+            print('{:<16}  {:<9}  {:<5}  {:<15}  {:<25}  {:<7}  {:<12}'.format(t.macaddr, 'FOUND', len(t.hops), hop.node_ip, hop.node_name, hop.vlan, t.port))
 
     print()
-    if (match == None):
-        # MAC is on this node
-        return (node, mac.port)
+    print('Traced %i MACs, %i found, %i switches queried.' % (len(traces), found, len(cache.nodes)))
+
+    return natlas.RETURN_OK
+
+def load_mac_file(filename):
+    macs = []
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if (line != ''):
+                macs.append(line)
+    return macs
+
+class trace_cache:
+    '''
+    Per-switch data shared by every trace in a run.
+
+    Each switch is connected to, named, and has its CAM and neighbor
+    tables walked at most once no matter how many traces pass through it.
+
+    If port_index (from natlas_network.get_port_index()) is given then
+    neighbors are taken from it and MACs are looked up with direct GETs
+    while only a few traces are waiting at a switch.
+    '''
+    def __init__(self, natlas_obj, port_index=None):
+        self.natlas     = natlas_obj
+        self.port_index = port_index
+        self.nodes      = {}        # ip -> natlas_node
+        self.macs       = {}        # ip -> (natlas_mac_table, MAC index)
+        self.vlans      = {}        # ip -> list of VLAN IDs
+        self.neighbors  = {}        # ip -> local port -> (remote IP, remote name)
+
+        # names of nodes already known from the topology
+        self.names      = {}
+        if (port_index != None):
+            for neighbor, link in port_index.values():
+                for ip in neighbor.ip:
+                    self.names[ip] = neighbor.name
+
+    def get_node(self, ip):
+        node = self.nodes.get(ip)
+        if (node == None):
+            node = self.natlas.new_node(ip)
+            if (ip in self.names):
+                node.name = self.names[ip]
+            else:
+                self.natlas.query_node(node, get_name=True)
+            self.nodes[ip] = node
+        return node
+
+    def find_mac(self, ip, t, pending):
+        '''
+        Find the MAC of trace t on the switch at ip.
+
+        Returns:
+            (vlan, port) or None if not found.
+        '''
+        if ((self.port_index != None) & (ip not in self.macs) & (pending <= TARGETED_LOOKUP_MAX)):
+            node = self.get_node(ip)
+            vlans = self.vlans.get(ip)
+            if (vlans == None):
+                vlans = [v.id for v in node.get_vlans()]
+                self.vlans[ip] = vlans
+            # the MAC is most likely in the VLAN it was found in last hop
+            if (t.vlan in vlans):
+                vlans = [t.vlan] + [v for v in vlans if (v != t.vlan)]
+            vlan, port = self.natlas.get_switch_mac_port(node, t.macaddr, vlans)
+            if (vlan == None):
+                return None
+            return (vlan, port)
+
+        if (ip not in self.macs):
+            macs = self.natlas.get_switch_macs(node=self.get_node(ip))
+            self.macs[ip] = (macs, macs.index_by_mac())
+        macs, index = self.macs[ip]
+        rows = index.get(t.imac)
+        if (rows == None):
+            return None
+        mac = macs[rows[0]]
+        return (mac.vlan, mac.port)
+
+    def find_neighbor(self, ip, port):
+        '''
+        Returns:
+            (remote IP, remote name) of the neighbor on the port, or None.
+        '''
+        if (self.port_index != None):
+            n = self.port_index.get((ip, port))
+            if (n == None):
+                return None
+            return (n[0].ip[0], n[0].name)
+
+        neighbors = self.neighbors.get(ip)
+        if (neighbors == None):
+            neighbors = {}
+            for n in self.natlas.get_neighbors(self.get_node(ip)):
+                # first neighbor listed on a port wins
+                if (n.local_port not in neighbors):
+                    neighbors[n.local_port] = (n.remote_ip, n.remote_name)
+            self.neighbors[ip] = neighbors
+        return neighbors.get(port)
+
+class trace_hop:
+    def __init__(self, depth, node_ip):
+        self.depth          = depth
+        self.node_ip        = node_ip
+        self.node_name      = ''
+        self.vlan           = None
+        self.port           = None
+        self.remote_ip      = None
+        self.remote_name    = None
+
+class mac_trace:
+    '''
+    State of the trace of a single MAC address.
+    '''
+    def __init__(self, macaddr):
+        self.macaddr    = macaddr
+        self.imac       = natlas.table.mac_str_to_int(macaddr)
+        self.visited    = set()
+        self.hops       = []
+        self.vlan       = None
+        self.node       = None
+        self.port       = None
+        self.error      = None
+
+def trace_macs(cache, start_ip, macaddrs):
+    '''
+    Trace a list of MAC addresses starting from start_ip.
+
+    The traces advance together one hop at a time.  All traces waiting at
+    a switch are looked up against that switch's tables before any of
+    them move on.
+
+    Returns:
+        List of mac_trace in the same order as macaddrs.
+    '''
+    traces = [mac_trace(m) for m in macaddrs]
+
+    # node IP -> traces to look up on that node
+    worklist = {start_ip: list(traces)}
+    depth = 1
+
+    while (len(worklist)):
+        next_worklist = {}
+        for node_ip in worklist:
+            try:
+                node = cache.get_node(node_ip)
+            except Exception as e:
+                for t in worklist[node_ip]:
+                    t.hops.append(trace_hop(depth, node_ip))
+                    t.error = str(e)
+                continue
+
+            pending = len(worklist[node_ip])
+            for t in worklist[node_ip]:
+                hop = trace_hop(depth, node_ip)
+                t.hops.append(hop)
+
+                if (node_ip in t.visited):
+                    t.error = 'Loop encountered.'
+                    continue
+                t.visited.add(node_ip)
+
+                if (depth > HOP_LIMIT):
+                    # probably some weird problem
+                    t.error = 'Hop count too high. Terminating trace.'
+                    continue
+
+                try:
+                    mac = cache.find_mac(node_ip, t, pending)
+                    if (mac == None):
+                        continue
+                    t.vlan, port = mac
+                    hop.node_name = node.name or ''
+                    hop.vlan = t.vlan
+                    hop.port = port
+                    neighbor = cache.find_neighbor(node_ip, node.shorten_port_name(port))
+                except Exception as e:
+                    t.error = str(e)
+                    continue
+
+                if (neighbor == None):
+                    # MAC is on this node
+                    t.node = node
+                    t.port = port
+                    continue
+
+                # found MAC on the same port as a neighbor - trace that node
+                hop.remote_ip, hop.remote_name = neighbor
+                next_worklist.setdefault(hop.remote_ip, []).append(t)
+
+        worklist = next_worklist
+        depth += 1
 
-    # found MAC on the same port as a neighbor - trace that node
-    return trace_node(match.remote_ip, macaddr, depth+1)
+    return traces
 
@@ -37,6 +37,7 @@ import natlas
 DEFAULT_OPT_DEPTH   = 100
 DEFAULT_OPT_TITLE   = 'natlas Diagram'
 DEFAULT_OPT_CONF    = './natlas.conf'
+DEFAULT_OPT_PROGRESS = 'text'
 
 class natlas_mod:
     def __init__(self):
@@ -105,7 +106,9 @@ def print_syntax():
           '  natlas-cli.py list              - Display available modules\n'
           '  natlat-cli.py info <module>     - Display information about the module\n'
           '  natlat-cli.py help <module>     - Display help for module\n'
-          '  natlat-cli.py syntax <module>   - Display syntax for module\n')
+          '  natlat-cli.py syntax <module>   - Display syntax for module\n'
+          '\n'
+          'Modules accept --progress <quiet | text | tty | json> to set how progress is reported.\n')
 
 def print_banner():
     print('natlas v%s' % natlas.__version__)
@@ -147,6 +150,8 @@ def exec_mod(module, argv):
 
     try:
         natlas_obj = natlas.natlas()
+        argv, opt_progress = argv_get_progress(argv)
+        natlas_obj.set_progress(opt_progress)
     except Exception as e:
         print('[ERROR] %s' % e)
         return 0
@@ -193,6 +198,18 @@ def argv_get_conf(argv):
             break
     return (argv, opt_conf)
 
+def argv_get_progress(argv):
+    opt_progress = DEFAULT_OPT_PROGRESS
+    for i in range(0, len(argv)):
+        if (argv[i] == '--progress'):
+            if ((i+1) >= len(argv)):
+                raise Exception('--progress used but no reporter specified')
+            opt_progress = argv[i+1]
+            del argv[i+1]
+            del argv[i]
+            break
+    return (argv, opt_progress)
+
 def list_mods(modules):
     print('Module                  Version   Status    Author                    About')
     print('------                  -------   ------    ------                    -----')
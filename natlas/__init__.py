@@ -1,5 +1,14 @@
 from ._version  import __version__
 from .natlas import natlas
 from .network import natlas_network
+from .table import natlas_mac_table, natlas_arp_table
+from .output_csv import natlas_output_csv
+from .snapshot import natlas_snapshot
+from .checkpoint import natlas_checkpoint
+from .shard import natlas_shard_discovery
+from .event import natlas_event, natlas_event_stream
+from .progress import natlas_progress
+from .event import EVENT_NODE_DISCOVERED, EVENT_NODE_DETAILED, EVENT_LINK_ADDED, EVENT_NODE_FAILED
 
 from .natlas import RETURN_SYNTAXERR, RETURN_ERR, RETURN_OK
+from .natlas import DEFAULT_HARVEST_WORKERS
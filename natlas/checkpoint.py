@@ -0,0 +1,159 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        checkpoint.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+import os
+import json
+
+from timeit import default_timer as timer
+from .network import CHECKPOINT_DISCOVER, CHECKPOINT_DETAILS, CHECKPOINT_DONE
+from .snapshot import natlas_snapshot
+
+CHECKPOINT_VERSION = 1
+
+class natlas_checkpoint:
+    '''
+    Save the progress of a discovery to a file so it can be resumed if
+    the process is stopped.
+
+    A checkpoint is a topology snapshot (see natlas_snapshot) plus the
+    discovery frontier, which nodes have been discovered or had their
+    details collected, and which SNMP credential worked for each node.
+    The credential is saved as its position in the config, not the
+    community itself, so resume with the same config.
+
+    The file is written to a temporary file and renamed over the old
+    checkpoint so a crash while saving leaves the previous one intact.
+    '''
+
+    def __init__(self, conf, filename, interval=None):
+        self.config     = conf
+        self.filename   = filename
+        self.interval   = conf.checkpoint.interval if (interval == None) else interval
+        self.last       = timer()
+        self.saves      = 0
+
+    def __str__(self):
+        return ('<filename="%s", interval=%s, saves=%i>' % (self.filename, self.interval, self.saves))
+    def __repr__(self):
+        return self.__str__()
+
+    def due(self):
+        '''
+        Return True if interval seconds have passed since the last save.
+        '''
+        return ((timer() - self.last) >= self.interval)
+
+    def save(self, network, phase):
+        data = self.to_dict(network, phase)
+
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.filename)
+
+        self.last   = timer()
+        self.saves += 1
+
+    def load(self, network):
+        '''
+        Load the checkpoint into a network.
+
+        Returns:
+            The phase the discovery was in, CHECKPOINT_DISCOVER,
+            CHECKPOINT_DETAILS or CHECKPOINT_DONE.
+        '''
+        with open(self.filename, 'r') as f:
+            data = json.load(f)
+
+        phase = self.from_dict(data, network)
+        self.last = timer()
+        return phase
+
+    def to_dict(self, network, phase):
+        '''
+        Return the state of a discovery as a dict that can be saved as JSON.
+        '''
+        nodes = network.nodes
+        node_idx = {}
+        for i, n in enumerate(nodes):
+            node_idx[id(n)] = i
+
+        data = natlas_snapshot(self.config).to_dict(network)
+        data['checkpoint'] = {
+            'version':      CHECKPOINT_VERSION,
+            'phase':        phase,
+            'max_depth':    network.max_depth,
+            'frontier':     [[node_idx[id(n)], depth] for n, depth in network.frontier if (id(n) in node_idx)],
+            'discovered':   [n.discovered for n in nodes],
+            'snmp':         [self.__snmp_to_list(n) for n in nodes],
+            'details_done': [node_idx[i] for i in node_idx if (i in network.details_done)],
+        }
+        return data
+
+    def from_dict(self, data, network):
+        '''
+        Load a dict returned by to_dict() into a network.
+
+        Returns:
+            The phase the discovery was in.
+        '''
+        ckpt = data.get('checkpoint')
+        if ((ckpt == None) or (ckpt.get('version') != CHECKPOINT_VERSION)):
+            raise Exception('%s is not a natlas checkpoint' % self.filename)
+
+        natlas_snapshot(self.config).from_dict(data, network)
+        nodes = network.nodes
+
+        for i, n in enumerate(nodes):
+            n.discovered = ckpt['discovered'][i]
+            self.__snmp_from_list(n, ckpt['snmp'][i])
+
+        network.max_depth    = ckpt['max_depth']
+        network.frontier     = [(nodes[i], depth) for i, depth in ckpt['frontier']]
+        network.details_done = set([id(nodes[i]) for i in ckpt['details_done']])
+
+        return ckpt['phase']
+
+    def __snmp_to_list(self, node):
+        if (node.snmpobj.success == 0):
+            return None
+        for i, cred in enumerate(self.config.snmp_creds):
+            if ((cred['ver'] == node.snmpobj.ver) & (cred['community'] == node.snmpobj.v2_community)):
+                return [i, node.snmpobj._ip]
+        return None
+
+    def __snmp_from_list(self, node, snmp):
+        if (snmp == None):
+            return
+        i, ip = snmp
+        if (i >= len(self.config.snmp_creds)):
+            return
+        cred = self.config.snmp_creds[i]
+        node.snmpobj._ip            = ip
+        node.snmpobj.ver            = cred['ver']
+        node.snmpobj.v2_community   = cred['community']
+        node.snmpobj.success        = 1
+
@@ -24,6 +24,7 @@
         Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 '''
 
+import re
 import json
 import sys
 
@@ -54,6 +55,37 @@ class natlas_config_diagram:
                             '<%loopback {lo.name} - {lo.ip}<br />%>' \
                             '<%svi VLAN {svi.vlan} - {svi.ip}<br />%>'
 
+class natlas_config_dns:
+    workers             = 32
+    timeout             = 2
+    ttl                 = 86400
+    neg_ttl             = 3600
+    cache_file          = None
+    hosts_file          = None
+
+class natlas_config_memory:
+    vbtbl_policy        = 'compact'
+    max_memory_mb       = 0
+
+class natlas_config_checkpoint:
+    file                = None
+    interval            = 60
+
+class natlas_config_schedule:
+    enabled             = False
+    budget              = 0
+    depth_weight        = -1
+    links_weight        = 1
+    tiers               = []
+
+class natlas_config_sweep:
+    ranges              = []
+    rate                = 100
+    max_packets         = 0
+    workers             = 32
+    timeout             = 1
+    retries             = 0
+
 class natlas_discover_acl:
     '''
     Define an ACL entry for the 'discover' config block.
@@ -88,12 +120,52 @@ class natlas_discover_acl:
     def __repr__(self):
         return '<%s %s %s>' % (self.action, self.type, self.str)
 
+class natlas_discover_shard:
+    '''
+    Define a region of the network discovered by its own process.
+    Defined in the 'shards' config block as:
+        { "name": <str>, "root": <IP>, "acl": [ <ACL entry>, ... ] }
+    The ACL entries use the 'discover' syntax.  Nodes the ACL permits
+    are in the shard, discovery starts at root.
+    '''
+    def __init__(self, d):
+        if ((type(d) != dict) or ('root' not in d)):
+            raise Exception('Invalid shard: "%s"' % d)
+        self.root   = d['root']
+        self.name   = d.get('name', self.root)
+        self.acl    = [natlas_discover_acl(a) for a in d.get('acl', [])]
+
+    def __repr__(self):
+        return '<name="%s", root=%s, acl=%s>' % (self.name, self.root, self.acl)
+
+class natlas_schedule_tier:
+    '''
+    Define a discovery priority for the nodes an ACL permits.
+    Defined in the 'tiers' list of the 'schedule' config block as:
+        { "priority": <number>, "acl": [ <ACL entry>, ... ] }
+    The ACL entries use the 'discover' syntax.
+    '''
+    def __init__(self, d):
+        if ((type(d) != dict) or ('priority' not in d) or (type(d['priority']) not in [int, float])):
+            raise Exception('Invalid tier: "%s"' % d)
+        self.priority   = d['priority']
+        self.acl        = [natlas_discover_acl(a) for a in d.get('acl', [])]
+
+    def __repr__(self):
+        return '<priority=%s, acl=%s>' % (self.priority, self.acl)
+
 class natlas_config:
     def __init__(self):
         self.host_domains       = []
         self.snmp_creds         = []
         self.discover_acl       = []
         self.diagram            = natlas_config_diagram()
+        self.dns                = natlas_config_dns()
+        self.memory             = natlas_config_memory()
+        self.checkpoint         = natlas_config_checkpoint()
+        self.sweep              = natlas_config_sweep()
+        self.schedule           = natlas_config_schedule()
+        self.shards             = []
 
     def load(self, filename):
         # load config
@@ -127,6 +199,56 @@ class natlas_config:
             self.diagram.group_vpc          = json_diagram.get('group_vpc', False)
             self.diagram.node_text          = json_diagram.get('node_text', self.diagram.node_text)
 
+        json_dns = json_data.get('dns', None)
+        if (json_dns != None):
+            self.dns.workers                = json_dns.get('workers', 32)
+            self.dns.timeout                = json_dns.get('timeout', 2)
+            self.dns.ttl                    = json_dns.get('ttl', 86400)
+            self.dns.neg_ttl                = json_dns.get('neg_ttl', 3600)
+            self.dns.cache_file             = json_dns.get('cache_file', None)
+            self.dns.hosts_file             = json_dns.get('hosts_file', None)
+
+        json_memory = json_data.get('memory', None)
+        if (json_memory != None):
+            self.memory.vbtbl_policy        = json_memory.get('vbtbl_policy', 'compact')
+            self.memory.max_memory_mb       = json_memory.get('max_memory_mb', 0)
+
+        # parse 'shards' block
+        for shard in json_data.get('shards', []):
+            try:
+                entry = natlas_discover_shard(shard)
+            except Exception as e:
+                print(e)
+                return 0
+
+            self.shards.append(entry)
+
+        json_checkpoint = json_data.get('checkpoint', None)
+        if (json_checkpoint != None):
+            self.checkpoint.file            = json_checkpoint.get('file', None)
+            self.checkpoint.interval        = json_checkpoint.get('interval', 60)
+
+        json_schedule = json_data.get('schedule', None)
+        if (json_schedule != None):
+            self.schedule.enabled           = True
+            self.schedule.budget            = json_schedule.get('budget', 0)
+            self.schedule.depth_weight      = json_schedule.get('depth_weight', -1)
+            self.schedule.links_weight      = json_schedule.get('links_weight', 1)
+            try:
+                self.schedule.tiers         = [natlas_schedule_tier(t) for t in json_schedule.get('tiers', [])]
+            except Exception as e:
+                print(e)
+                return 0
+
+        json_sweep = json_data.get('sweep', None)
+        if (json_sweep != None):
+            self.sweep.ranges               = json_sweep.get('ranges', [])
+            self.sweep.rate                 = json_sweep.get('rate', 100)
+            self.sweep.max_packets          = json_sweep.get('max_packets', 0)
+            self.sweep.workers              = json_sweep.get('workers', 32)
+            self.sweep.timeout              = json_sweep.get('timeout', 1)
+            self.sweep.retries              = json_sweep.get('retries', 0)
+
         return 1
 
     def __load_json_conf(self, json_file):
@@ -179,8 +301,14 @@ class natlas_config:
         ret += self.__validate_config_domains(json_data)
         ret += self.__validate_config_discover(json_data)
         ret += self.__validate_config_diagram(json_data)
+        ret += self.__validate_config_dns(json_data)
+        ret += self.__validate_config_memory(json_data)
+        ret += self.__validate_config_checkpoint(json_data)
+        ret += self.__validate_config_shards(json_data)
+        ret += self.__validate_config_sweep(json_data)
+        ret += self.__validate_config_schedule(json_data)
             
-        if (ret < 4):
+        if (ret < 10):
             print('FAILED')
         else:
             print('PASSED')
@@ -301,3 +429,175 @@ class natlas_config:
         print('ok')
         return 1
 
+    def __validate_config_dns(self, data):
+        sys.stdout.write('Checking dns...')
+        obj = data.get('dns', None)
+        if (obj == None):
+            print('not set, using defaults')
+            return 1
+        if (type(obj) != dict):
+            print('not a dict')
+            return 0
+
+        for nv in obj:
+            if (nv in ['workers', 'timeout', 'ttl', 'neg_ttl']):
+                if (type(obj[nv]) not in [int, float]):
+                    print('\'%s\' is not a number' % nv)
+                    return 0
+                if ((nv == 'workers') & (obj[nv] < 1)):
+                    print('\'%s\' must be at least 1' % nv)
+                    return 0
+                if ((nv == 'timeout') & (obj[nv] <= 0)):
+                    print('\'%s\' must be greater than 0' % nv)
+                    return 0
+                if (obj[nv] < 0):
+                    print('\'%s\' must not be negative' % nv)
+                    return 0
+            elif (nv in ['cache_file', 'hosts_file']):
+                if (type(obj[nv]) != str):
+                    print('\'%s\' is not a string' % nv)
+                    return 0
+            else:
+                print('invalid value \'%s\'' % nv)
+                return 0
+
+        print('ok')
+        return 1
+
+    def __validate_config_memory(self, data):
+        sys.stdout.write('Checking memory...')
+        obj = data.get('memory', None)
+        if (obj == None):
+            print('not set, using defaults')
+            return 1
+        if (type(obj) != dict):
+            print('not a dict')
+            return 0
+
+        for nv in obj:
+            if (nv == 'vbtbl_policy'):
+                if (obj[nv] not in ['keep', 'compact', 'drop']):
+                    print('\'%s\' must be keep, compact or drop' % nv)
+                    return 0
+            elif (nv == 'max_memory_mb'):
+                if (type(obj[nv]) not in [int, float]):
+                    print('\'%s\' is not a number' % nv)
+                    return 0
+            else:
+                print('invalid value \'%s\'' % nv)
+                return 0
+
+        print('ok')
+        return 1
+
+    def __validate_config_checkpoint(self, data):
+        sys.stdout.write('Checking checkpoint...')
+        obj = data.get('checkpoint', None)
+        if (obj == None):
+            print('not set, using defaults')
+            return 1
+        if (type(obj) != dict):
+            print('not a dict')
+            return 0
+
+        for nv in obj:
+            if (nv == 'interval'):
+                if (type(obj[nv]) not in [int, float]):
+                    print('\'%s\' is not a number' % nv)
+                    return 0
+            elif (nv == 'file'):
+                if (type(obj[nv]) != str):
+                    print('\'%s\' is not a string' % nv)
+                    return 0
+            else:
+                print('invalid value \'%s\'' % nv)
+                return 0
+
+        print('ok')
+        return 1
+
+    def __validate_config_shards(self, data):
+        sys.stdout.write('Checking shards...')
+        obj = data.get('shards', None)
+        if (obj == None):
+            print('not set')
+            return 1
+        if (type(obj) != list):
+            print('not a list')
+            return 0
+
+        for shard in obj:
+            try:
+                natlas_discover_shard(shard)
+            except Exception as e:
+                print(e)
+                return 0
+
+        print('ok')
+        return 1
+
+    def __validate_config_sweep(self, data):
+        sys.stdout.write('Checking sweep...')
+        obj = data.get('sweep', None)
+        if (obj == None):
+            print('not set')
+            return 1
+        if (type(obj) != dict):
+            print('not a dict')
+            return 0
+
+        for nv in obj:
+            if (nv == 'ranges'):
+                if (type(obj[nv]) != list):
+                    print('\'%s\' is not a list' % nv)
+                    return 0
+                for cidr in obj[nv]:
+                    if (re.match('^([0-2]?[0-9]?[0-9]\.){3}[0-2]?[0-9]?[0-9]/[0-9]+$', cidr) == None):
+                        print('invalid range \'%s\'' % cidr)
+                        return 0
+            elif (nv in ['workers', 'max_packets', 'retries']):
+                if (type(obj[nv]) != int):
+                    print('\'%s\' is not an integer' % nv)
+                    return 0
+            elif (nv in ['rate', 'timeout']):
+                if (type(obj[nv]) not in [int, float]):
+                    print('\'%s\' is not a number' % nv)
+                    return 0
+            else:
+                print('invalid value \'%s\'' % nv)
+                return 0
+
+        print('ok')
+        return 1
+
+    def __validate_config_schedule(self, data):
+        sys.stdout.write('Checking schedule...')
+        obj = data.get('schedule', None)
+        if (obj == None):
+            print('not set')
+            return 1
+        if (type(obj) != dict):
+            print('not a dict')
+            return 0
+
+        for nv in obj:
+            if (nv in ['budget', 'depth_weight', 'links_weight']):
+                if (type(obj[nv]) not in [int, float]):
+                    print('\'%s\' is not a number' % nv)
+                    return 0
+            elif (nv == 'tiers'):
+                if (type(obj[nv]) != list):
+                    print('\'%s\' is not a list' % nv)
+                    return 0
+                for tier in obj[nv]:
+                    try:
+                        natlas_schedule_tier(tier)
+                    except Exception as e:
+                        print(e)
+                        return 0
+            else:
+                print('invalid value \'%s\'' % nv)
+                return 0
+
+        print('ok')
+        return 1
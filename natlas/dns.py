@@ -0,0 +1,224 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        dns.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+import json
+import queue
+import socket
+import threading
+import time
+
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from timeit import default_timer as timer
+
+DNS_WAIT_TICK = 0.1
+
+class natlas_dns:
+    '''
+    Reverse DNS (PTR) resolver.
+
+    Addresses are resolved concurrently by a bounded pool of worker
+    threads, started on first use and kept until close().  Each lookup
+    is given conf.timeout seconds before it is reported as unresolved.
+    The workers are daemon threads, so a lookup that never returns
+    does not hold up the exit of the program.  Answers, including
+    negative answers, are cached with a TTL and the cache is saved to
+    conf.cache_file by close() so that it is reused across runs.
+
+    If conf.hosts_file is set then names are resolved only from that
+    file (in /etc/hosts format) and the network resolver is never used.
+    '''
+
+    def __init__(self, conf):
+        # with no workers or no time to answer nothing would resolve,
+        # see the config validator
+        if ((conf.workers < 1) | (conf.timeout <= 0)):
+            raise ValueError('Invalid dns config: workers must be at least 1 and timeout greater than 0')
+        self.workers    = conf.workers
+        self.timeout    = conf.timeout
+        self.ttl        = conf.ttl
+        self.neg_ttl    = conf.neg_ttl
+        self.cache_file = conf.cache_file
+        self.cache      = {}        # ip -> [name, expires]
+        self.hosts      = None
+        self.resolver   = self.__resolve_socket
+        self.__queue    = queue.Queue()     # (ip, Future, started) to resolve
+        self.__threads  = []
+
+        if (conf.hosts_file != None):
+            self.load_hosts_file(conf.hosts_file)
+        if (self.cache_file != None):
+            self.load_cache(self.cache_file)
+
+    def __str__(self):
+        return ('<workers=%i, timeout=%s, cached=%i>' % (self.workers, self.timeout, len(self.cache)))
+    def __repr__(self):
+        return self.__str__()
+
+    def load_hosts_file(self, filename):
+        '''
+        Load a hosts file and resolve only from it.
+        '''
+        self.hosts = {}
+        with open(filename, 'r') as f:
+            for line in f:
+                line = line.split('#')[0].split()
+                if (len(line) < 2):
+                    continue
+                # first name listed for the address wins, like the resolver
+                if (line[0] not in self.hosts):
+                    self.hosts[line[0]] = line[1]
+        self.resolver = self.__resolve_hosts
+
+    def load_cache(self, filename):
+        try:
+            with open(filename, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+
+        now = time.time()
+        for ip in data:
+            entry = data[ip]
+            if (entry[1] > now):
+                self.cache[ip] = entry
+        return 1
+
+    def save_cache(self, filename=None):
+        filename = filename or self.cache_file
+        if (filename == None):
+            return 0
+        try:
+            with open(filename, 'w') as f:
+                json.dump(self.cache, f)
+        except OSError:
+            print('Unable to write DNS cache file "%s"' % filename)
+            return 0
+        return 1
+
+    def lookup(self, ip):
+        '''
+        Return the cached name for ip, '' for a cached negative answer,
+        or None if ip is not cached.
+        '''
+        entry = self.cache.get(ip)
+        if (entry == None):
+            return None
+        if (entry[1] <= time.time()):
+            del self.cache[ip]
+            return None
+        return entry[0]
+
+    def resolve(self, ips):
+        '''
+        Resolve a list of IP addresses.
+
+        Returns:
+            dict of ip -> name.  Unresolved addresses map to ''.
+        '''
+        ret = {}
+        todo = []
+        for ip in ips:
+            if ((ip == None) | (ip == '') | (ip in ret)):
+                continue
+            name = self.lookup(ip)
+            if (name == None):
+                ret[ip] = ''
+                todo.append(ip)
+            else:
+                ret[ip] = name
+
+        if (len(todo) == 0):
+            return ret
+
+        now = time.time()
+        self.__start_workers()
+        started = {}
+        futures = {}
+        for ip in todo:
+            fut = Future()
+            futures[fut] = ip
+            self.__queue.put((ip, fut, started))
+
+        pending = set(futures)
+        while (len(pending)):
+            done, pending = wait(pending, timeout=DNS_WAIT_TICK, return_when=FIRST_COMPLETED)
+            for fut in done:
+                ip = futures[fut]
+                name = fut.result()
+                ret[ip] = name
+                self.cache[ip] = [name, now + (self.ttl if name else self.neg_ttl)]
+
+            # give up on lookups that have been running too long
+            t = timer()
+            for fut in list(pending):
+                ip = futures[fut]
+                if ((ip in started) and ((t - started[ip]) > self.timeout)):
+                    pending.discard(fut)
+                    fut.cancel()
+                    self.cache[ip] = ['', now + self.neg_ttl]
+
+        return ret
+
+    def close(self):
+        '''
+        Save the cache to conf.cache_file and stop the worker threads.
+        Workers stuck in a lookup are left to end with the program.
+        '''
+        for t in self.__threads:
+            self.__queue.put(None)
+        self.__threads = []
+
+        if (self.cache_file != None):
+            return self.save_cache()
+        return 1
+
+    def __start_workers(self):
+        while (len(self.__threads) < self.workers):
+            t = threading.Thread(target=self.__worker, daemon=True)
+            t.start()
+            self.__threads.append(t)
+
+    def __worker(self):
+        while True:
+            job = self.__queue.get()
+            if (job == None):
+                return
+            ip, fut, started = job
+            if (fut.set_running_or_notify_cancel() == False):
+                # gave up on it while it was queued
+                continue
+            started[ip] = timer()
+            try:
+                name = self.resolver(ip) or ''
+            except Exception:
+                name = ''
+            fut.set_result(name)
+
+    def __resolve_socket(self, ip):
+        return socket.gethostbyaddr(ip)[0]
+
+    def __resolve_hosts(self, ip):
+        return self.hosts.get(ip, '')
@@ -0,0 +1,115 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        event.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+
+import queue
+import threading
+
+EVENT_NODE_DISCOVERED   = 'node_discovered'
+EVENT_NODE_DETAILED     = 'node_detailed'
+EVENT_LINK_ADDED        = 'link_added'
+EVENT_NODE_FAILED       = 'node_failed'
+
+class natlas_event:
+    '''
+    Something that happened during a discovery, see
+    natlas_network.add_listener().
+
+        node_discovered     node was added to the network
+        node_failed         node was added but could not be queried
+        link_added          link was added to node, link.node is the
+                            neighbor
+        node_detailed       discover_details() queried node
+    '''
+    __slots__ = ('type', 'node', 'link', 'depth', 'error')
+
+    def __init__(self, type, node, link=None, depth=None, error=None):
+        self.type   = type
+        self.node   = node
+        self.link   = link
+        self.depth  = depth
+        self.error  = error
+
+    def __str__(self):
+        return ('<type=%s, node="%s", depth=%s, error=%s>' % (self.type, self.node.name, self.depth, self.error))
+    def __repr__(self):
+        return self.__str__()
+
+
+class natlas_event_stream:
+    '''
+    Run a discovery in a thread and yield its events as they happen.
+
+    The events are queued by the discovery thread and yielded in the
+    thread iterating the stream.  If the iteration is stopped early the
+    discovery is stopped too (see natlas_network.stop()) and what was
+    found so far is kept.  An exception raised by the discovery is
+    raised again by the iteration, after the events before it.
+    '''
+
+    def __init__(self, network):
+        self.network    = network
+        self.__queue    = queue.Queue()
+        self.__error    = None
+
+    def __str__(self):
+        return ('<queued=%i>' % self.__queue.qsize())
+    def __repr__(self):
+        return self.__str__()
+
+    def run(self, func, *args):
+        '''
+        Call func(*args) in a thread and yield the natlas_event of
+        self.network until it returns.
+        '''
+        network = self.network
+        thread  = threading.Thread(target=self.__run, args=(func, args), daemon=True)
+
+        network.stopped = 0
+        network.add_listener(self.__queue.put)
+        try:
+            thread.start()
+            while True:
+                event = self.__queue.get()
+                if (event == None):
+                    break
+                yield event
+        finally:
+            network.stop()
+            thread.join()
+            network.remove_listener(self.__queue.put)
+            network.stopped = 0
+
+        if (self.__error != None):
+            raise self.__error
+
+    def __run(self, func, args):
+        try:
+            func(*args)
+        except Exception as e:
+            self.__error = e
+        finally:
+            self.__queue.put(None)
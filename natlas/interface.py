@@ -0,0 +1,175 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        interface.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+from .snmp import *
+from .util import *
+
+IFTYPE_LOOPBACK         = 24
+
+class natlas_interface:
+    __slots__ = ('ifidx', 'name', 'short_name', 'descr', 'type', 'cidrs')
+
+    def __init__(self, ifidx):
+        self.ifidx      = ifidx
+        self.name       = None
+        self.short_name = None
+        self.descr      = None
+        self.type       = None
+        self.cidrs      = []
+
+    def __str__(self):
+        return ('<ifidx=%s,name="%s",type=%s,cidrs=%s>' % (self.ifidx, self.name, self.type, self.cidrs))
+    def __repr__(self):
+        return self.__str__()
+
+
+class natlas_interface_table:
+    '''
+    Interfaces of a node keyed by ifIndex.
+
+    Each column (ifName, ifDescr, ifType and the ipAddrTable addresses)
+    is walked only the first time it is needed and only that column is
+    walked, not the whole ifEntry or ipAddrTable.  Lookups by ifIndex
+    are then dict lookups instead of scans of the varbind tables.
+
+    ifIndex keys are strings.  Lookups accept anything str() turns into
+    the ifIndex, such as a value from another SNMP table.
+    '''
+
+    __slots__ = ('snmpobj', 'interfaces', '__loaded')
+
+    def __init__(self, snmpobj):
+        self.snmpobj    = snmpobj
+        self.interfaces = {}        # ifidx -> natlas_interface
+        self.__loaded   = set()     # columns already walked
+
+    def __str__(self):
+        return ('<interfaces=%i>' % len(self.interfaces))
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self.interfaces)
+
+    def __iter__(self):
+        return iter(self.interfaces.values())
+
+    def get(self, ifidx):
+        return self.interfaces.get(str(ifidx))
+
+    def get_name(self, ifidx):
+        '''
+        Return the full ifName of an interface, or None.
+        '''
+        self.load_names()
+        intf = self.get(ifidx)
+        return intf.name if (intf != None) else None
+
+    def get_short_name(self, ifidx):
+        '''
+        Return the shortened ifName of an interface, or None.
+        '''
+        self.load_names()
+        intf = self.get(ifidx)
+        return intf.short_name if (intf != None) else None
+
+    def get_descr(self, ifidx):
+        self.load_descrs()
+        intf = self.get(ifidx)
+        return intf.descr if (intf != None) else None
+
+    def get_cidrs(self, ifidx):
+        '''
+        Return a list of the IP addresses (a.b.c.d/n) on an interface.
+        '''
+        self.load_cidrs()
+        intf = self.get(ifidx)
+        return list(intf.cidrs) if (intf != None) else []
+
+    def get_by_type(self, iftype):
+        '''
+        Return a list of interfaces of an ifType, in ifIndex order.
+        '''
+        self.load_types()
+        return [i for i in self.interfaces.values() if (i.type == iftype)]
+
+    def load_names(self):
+        for ifidx, v in self.__walk(OID_IFNAME):
+            intf = self.__get_or_add(ifidx)
+            intf.name       = v.prettyPrint()
+            intf.short_name = util.shorten_port_name(intf.name)
+
+    def load_descrs(self):
+        for ifidx, v in self.__walk(OID_ETH_IF_DESC):
+            self.__get_or_add(ifidx).descr = v.prettyPrint()
+
+    def load_types(self):
+        for ifidx, v in self.__walk(OID_ETH_IF_TYPE):
+            try:
+                self.__get_or_add(ifidx).type = int(v)
+            except (TypeError, ValueError):
+                pass
+
+    def load_cidrs(self):
+        if (OID_IF_IP_ADDR in self.__loaded):
+            return
+        masks = {}
+        for ip, v in self.__walk(OID_IF_IP_NETM.rstrip('.')):
+            masks[ip] = v.prettyPrint()
+        for ip, v in self.__walk(OID_IF_IP_ADDR):
+            mask = masks.get(ip)
+            if (mask == None):
+                continue
+            cidr = '%s/%i' % (ip, util.get_net_bits_from_mask(mask))
+            self.__get_or_add(v.prettyPrint()).cidrs.append(cidr)
+
+    def __get_or_add(self, ifidx):
+        intf = self.interfaces.get(ifidx)
+        if (intf == None):
+            intf = natlas_interface(ifidx)
+            self.interfaces[ifidx] = intf
+        return intf
+
+    def __walk(self, oid):
+        '''
+        Walk a single column once.
+        Returns a list of (index, value) where index is the OID suffix.
+        '''
+        if (oid in self.__loaded):
+            return []
+        self.__loaded.add(oid)
+
+        vbtbl = self.snmpobj.get_bulk(oid)
+        if (vbtbl == None):
+            return []
+
+        ret = []
+        plen = len(oid) + 1
+        for row in vbtbl:
+            for n, v in row:
+                ret.append((str(n)[plen:], v))
+        return ret
+
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        ip_index.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+from .table import ip_str_to_int
+
+class natlas_ip_owner:
+    '''
+    A node that owns an address or subnet.
+
+    exact is 1 if the address is configured on the node, or 0 if the
+    node is only attached to the subnet the address is in.
+    '''
+    __slots__ = ('node', 'interface', 'cidr', 'exact')
+
+    def __init__(self, node, interface, cidr):
+        self.node       = node
+        self.interface  = interface
+        self.cidr       = cidr
+        self.exact      = 0
+
+    def __str__(self):
+        return ('<node="%s", interface="%s", cidr="%s", exact=%i>' % (self.node.name, self.interface, self.cidr, self.exact))
+    def __repr__(self):
+        return self.__str__()
+
+
+class natlas_ip_index:
+    '''
+    Longest prefix match index of the addresses and subnets of nodes.
+
+    Every interface CIDR a.b.c.d/n is added twice: the address itself as
+    a /32, and the subnet a.b.c.0/n it is attached to.  A lookup returns
+    the owners of the most specific prefix that contains the address.
+
+    The index is a binary trie on the address bits; each trie node is a
+    list of [child 0, child 1, owners].  Adding and looking up an address
+    costs at most 32 steps regardless of the size of the network.
+    '''
+
+    def __init__(self):
+        self.root       = [None, None, None]
+        self.prefixes   = 0
+
+    def __str__(self):
+        return ('<prefixes=%i>' % self.prefixes)
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return self.prefixes
+
+    def add_node(self, node):
+        '''
+        Add every known address of a node.  Addresses already in the
+        index for the node are not added again, so this can be called
+        again as more is learned about the node.
+        '''
+        for interface, cidr in self.__get_node_cidrs(node):
+            self.add(node, interface, cidr)
+
+    def remove_node(self, node):
+        '''
+        Remove every known address of a node, eg a duplicate that was
+        merged into another node.
+        '''
+        for interface, cidr in self.__get_node_cidrs(node):
+            prefix = self.__parse(cidr)
+            if (prefix == None):
+                continue
+            ip, nbits = prefix
+            self.__remove(ip, 32, node)
+            if (nbits < 32):
+                self.__remove(ip, nbits, node)
+
+    def add(self, node, interface, cidr):
+        '''
+        Add an address, a.b.c.d or a.b.c.d/n, owned by node.
+        '''
+        prefix = self.__parse(cidr)
+        if (prefix == None):
+            return
+        ip, nbits = prefix
+
+        self.__insert(ip, 32, node, interface, cidr, 1)
+        if (nbits < 32):
+            self.__insert(ip, nbits, node, interface, cidr, 0)
+
+    def lookup(self, ip):
+        '''
+        Find the owners of the most specific prefix containing ip.
+
+        Returns:
+            List of natlas_ip_owner, empty if nothing matches.
+        '''
+        iip = ip_str_to_int(ip)
+        best = None
+        tn = self.root
+        for b in range(31, -1, -1):
+            if (tn[2] != None):
+                best = tn[2]
+            tn = tn[(iip >> b) & 1]
+            if (tn == None):
+                break
+        else:
+            if (tn[2] != None):
+                best = tn[2]
+        return list(best) if (best != None) else []
+
+    def __get_node_cidrs(self, node):
+        for ip in node.ip:
+            yield (None, ip)
+        for svi in node.svis:
+            for cidr in svi.ip:
+                yield ('Vlan%s' % svi.vlan, cidr)
+        for lo in node.loopbacks:
+            for cidr in lo.ips:
+                yield (lo.name, cidr)
+        for link in node.links:
+            if (link.local_if_ip != None):
+                yield (link.local_port, link.local_if_ip)
+            for cidr in (link.local_lag_ips or []):
+                yield (link.local_lag, cidr)
+        # interfaces whose addresses have already been walked
+        for intf in node.interfaces:
+            for cidr in intf.cidrs:
+                yield (intf.short_name, cidr)
+
+    def __parse(self, cidr):
+        '''
+        Return (address as int, prefix length) of a.b.c.d or a.b.c.d/n,
+        or None if it is not indexed.
+        '''
+        if ((cidr == None) | (cidr == '') | (cidr == 'UNKNOWN')):
+            return None
+        t = cidr.split('/')
+        if (t[0] == '0.0.0.0'):
+            return None
+        try:
+            nbits = int(t[1]) if (len(t) > 1) else 32
+        except ValueError:
+            return None
+        if ((nbits < 0) | (nbits > 32) | (t[0].count('.') != 3)):
+            return None
+        ip = ip_str_to_int(t[0])
+        if (ip == 0):
+            return None
+        return (ip, nbits)
+
+    def __remove(self, ip, nbits, node):
+        tn = self.root
+        for b in range(31, 31 - nbits, -1):
+            tn = tn[(ip >> b) & 1]
+            if (tn == None):
+                return
+
+        if (tn[2] == None):
+            return
+        tn[2] = [owner for owner in tn[2] if (owner.node is not node)]
+        if (len(tn[2]) == 0):
+            tn[2] = None
+            self.prefixes -= 1
+
+    def __insert(self, ip, nbits, node, interface, cidr, exact):
+        tn = self.root
+        for b in range(31, 31 - nbits, -1):
+            bit = (ip >> b) & 1
+            if (tn[bit] == None):
+                tn[bit] = [None, None, None]
+            tn = tn[bit]
+
+        if (tn[2] == None):
+            tn[2] = []
+            self.prefixes += 1
+
+        for owner in tn[2]:
+            if (owner.node is node):
+                # already known - keep the most descriptive entry
+                if ((owner.interface == None) & (interface != None)):
+                    owner.interface = interface
+                    owner.cidr      = cidr
+                return
+
+        owner = natlas_ip_owner(node, interface, cidr)
+        owner.exact = exact
+        tn[2].append(owner)
+
@@ -27,16 +27,22 @@
 import os
 import re
 import sys
+import copy
 
 from timeit import default_timer as timer
 from .snmp import *
 from .config import natlas_config
 from .util import *
+from .table import natlas_mac_table, mac_str_to_int
+from .interface import natlas_interface_table
+from .progress import natlas_progress
 from ._version import __version__
 
 class natlas_mac:
 
     class mac_object:
+        __slots__ = ('node_host', 'node_ip', 'vlan', 'mac', 'port')
+
         def __init__(self, _host, _ip, _vlan, _mac, _port):
             self.node_host  = _host
             self.node_ip    = _ip
@@ -51,8 +57,9 @@ class natlas_mac:
             return self.__str__()
 
 
-    def __init__(self, conf):
-        self.config = conf
+    def __init__(self, conf, progress=None):
+        self.config     = conf
+        self.progress   = progress if (progress != None) else natlas_progress.create('text')
 
 
     def __str__(self):
@@ -63,12 +70,12 @@ class natlas_mac:
 
     def get_macs(self, ip, display_progress):
         '''
-        Return array of MAC addresses from single node at IP
+        Return a natlas_mac_table of MAC addresses from single node at IP
         '''
         if (ip == '0.0.0.0'):
             return None
 
-        ret_macs = []
+        ret_macs = natlas_mac_table()
         snmpobj = natlas_snmp(ip)
 
         # find valid credentials for this node
@@ -79,7 +86,7 @@ class natlas_mac:
 
         # cache some common MIB trees
         vlan_vbtbl      = snmpobj.get_bulk(OID_VLANS)
-        ifname_vbtbl    = snmpobj.get_bulk(OID_IFNAME)
+        interfaces      = natlas_interface_table(snmpobj)
 
         for vlan_row in vlan_vbtbl:
             for vlan_n, vlan_v in vlan_row:
@@ -87,38 +94,65 @@ class natlas_mac:
                 vlan = natlas_snmp.get_last_oid_token(vlan_n)
                 if (vlan >= 1002):
                     continue
-                vmacs = self.get_macs_for_vlan(ip, vlan, display_progress, snmpobj, system_name, ifname_vbtbl)
-                if (vmacs != None):
-                    ret_macs.extend(vmacs)
+                self.get_macs_for_vlan(ip, vlan, display_progress, snmpobj, system_name, interfaces, ret_macs)
 
         if (display_progress == 1):
-            print('')
+            self.progress.add('switches', 1, '\n')
 
         return ret_macs
 
 
-    def get_macs_for_vlan(self, ip, vlan, display_progress=0, snmpobj=None, system_name=None, ifname_vbtbl=None):
+    def get_node_macs(self, node, display_progress=0):
         '''
-        Return array of MAC addresses for a single VLAN from a single node at an IP
+        Return a natlas_mac_table of MAC addresses from a natlas_node that
+        already has valid credentials, eg from a discovery.
+        The node's cached name, VLAN and interface tables are reused rather
+        than probing the device again.
         '''
-        ret_macs = []
+        if (node.snmpobj.success == 0):
+            return None
+
+        ret_macs = natlas_mac_table()
+        snmpobj  = node.snmpobj
+        ip       = node.get_ipaddr()
+
+        system_name = node.name
+        if (system_name == None):
+            system_name = node.get_system_name(self.config.host_domains)
+
+        for vlan in node.get_vlans():
+            self.get_macs_for_vlan(ip, vlan.id, display_progress, snmpobj, system_name, node.interfaces, ret_macs)
+
+        if (display_progress == 1):
+            self.progress.add('switches', 1, '\n')
+
+        return ret_macs
+
+
+    def get_macs_for_vlan(self, ip, vlan, display_progress=0, snmpobj=None, system_name=None, interfaces=None, ret_macs=None):
+        '''
+        Return a natlas_mac_table of MAC addresses for a single VLAN from a single node at an IP.
+        If ret_macs is given the entries are appended to it instead of a new table.
+        '''
+        if (ret_macs == None):
+            ret_macs = natlas_mac_table()
 
         if (snmpobj == None):
             snmpobj = natlas_snmp(ip)
             if (snmpobj.get_cred(self.config.snmp_creds) == 0):
                 return None
-        if (ifname_vbtbl == None):
-            ifname_vbtbl = snmpobj.get_bulk(OID_IFNAME)
+        if (interfaces == None):
+            interfaces = natlas_interface_table(snmpobj)
         if (system_name == None):
             system_name = util.shorten_host_name(snmpobj.get_val(OID_SYSNAME), self.config.host_domains)
 
-        # change our SNMP credentials
-        old_cred = snmpobj.v2_community
-        snmpobj.v2_community = old_cred + '@' + str(vlan)
+        # use a copy of the SNMP object with the VLAN community so the
+        # caller's object can be shared with other threads
+        snmpobj = copy.copy(snmpobj)
+        snmpobj.v2_community = snmpobj.v2_community + '@' + str(vlan)
 
         if (display_progress == 1):
-            sys.stdout.write(str(vlan)) # found VLAN
-            sys.stdout.flush()
+            self.progress.add('vlans', 1, str(vlan)) # found VLAN
 
         # get CAM table for this VLAN
         cam_vbtbl       = snmpobj.get_bulk(OID_VLAN_CAM)
@@ -130,6 +164,11 @@ class natlas_mac:
             # error getting CAM for VLAN
             return None
 
+        # index the bridge tables by OID
+        portnums = self.__index_vbtbl(portnum_vbtbl)
+        ifindexes = self.__index_vbtbl(ifindex_vbtbl)
+
+        found = 0
         for cam_row in cam_vbtbl:
             for cam_n, cam_v in cam_row:
                 cam_entry = natlas_mac.mac_format_ascii(cam_v, 0)
@@ -137,29 +176,78 @@ class natlas_mac:
                 # find the interface index
                 p               = cam_n.getOid()
                 portnum_oid     = '%s.%i.%i.%i.%i.%i.%i' % (OID_BRIDGE_PORTNUMS, p[11], p[12], p[13], p[14], p[15], p[16])
-                bridge_portnum  = snmpobj.cache_lookup(portnum_vbtbl, portnum_oid)
+                bridge_portnum  = portnums.get(portnum_oid)
 
                 # get the interface index and description
                 try:
-                    ifidx       = snmpobj.cache_lookup(ifindex_vbtbl, OID_IFINDEX + '.' + bridge_portnum)
-                    port        = snmpobj.cache_lookup(ifname_vbtbl, OID_IFNAME + '.' + ifidx)
+                    ifidx       = ifindexes.get(OID_IFINDEX + '.' + bridge_portnum)
+                    port        = interfaces.get_name(ifidx) if (ifidx != None) else 'None'
                 except TypeError:
                     port = 'None'
 
                 mac_addr = natlas_mac.mac_format_ascii(cam_v, 1)
-                
-                if (display_progress == 1):
-                    sys.stdout.write('.') # found CAM entry
-                    sys.stdout.flush()
+                ret_macs.append(system_name, ip, vlan, mac_addr, port)
+                found += 1
 
-                entry = natlas_mac.mac_object(system_name, ip, vlan, mac_addr, port)
-                ret_macs.append(entry)
+        if (display_progress == 1):
+            # a '.' per CAM entry, written once for the VLAN
+            self.progress.add('macs', found, '.' * found)
 
-        # restore SNMP credentials
-        snmpobj.v2_community = old_cred
         return ret_macs
 
 
+    def get_mac_port(self, snmpobj, mac, vlans, interfaces=None):
+        '''
+        Find the port a single MAC address was learned on without walking
+        the CAM table.  Each VLAN is tried in order with direct GETs of
+        dot1dTpFdbPort.<mac> and dot1dBasePortIfIndex.<port>.
+
+        Args:
+            snmpobj         natlas_snmp with valid credentials
+            mac             MAC address string
+            vlans           List of VLAN IDs to look in
+            interfaces      Optional natlas_interface_table of the node
+
+        Returns:
+            (vlan, port) or (None, None) if the MAC is not found.
+        '''
+        imac = mac_str_to_int(mac)
+        mac_oid = '.'.join([str((imac >> s) & 0xff) for s in range(40, -8, -8)])
+
+        for vlan in vlans:
+            vsnmpobj = copy.copy(snmpobj)
+            vsnmpobj.v2_community = snmpobj.v2_community + '@' + str(vlan)
+
+            bridge_portnum = vsnmpobj.get_val(OID_BRIDGE_PORTNUMS + '.' + mac_oid)
+            if (bridge_portnum == None):
+                continue
+
+            ifidx = vsnmpobj.get_val(OID_IFINDEX + '.' + bridge_portnum)
+            if (ifidx == None):
+                return (vlan, 'None')
+
+            if (interfaces != None):
+                port = interfaces.get_name(ifidx)
+            else:
+                port = snmpobj.get_val(OID_IFNAME + '.' + ifidx)
+            return (vlan, port)
+
+        return (None, None)
+
+
+    def __index_vbtbl(self, vbtbl):
+        '''
+        Convert a get_bulk() table to a dict of OID -> value.
+        '''
+        ret = {}
+        if (vbtbl == None):
+            return ret
+        for row in vbtbl:
+            for n, v in row:
+                ret[str(n)] = v.prettyPrint()
+        return ret
+
+
     #
     # Parse an ASCII MAC address string to a hex string.
     #
@@ -31,16 +31,30 @@
 import sys
 import re
 
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 from .config import natlas_config
 from .network import natlas_network
 from .node import natlas_node, natlas_vlan, natlas_arp
 from .mac import natlas_mac
+from .table import natlas_mac_table, natlas_arp_table
 from .output import natlas_output
 from .output_diagram import natlas_output_diagram
 from .output_catalog import natlas_output_catalog
+from .dns import natlas_dns
+from .snapshot import natlas_snapshot
+from .checkpoint import natlas_checkpoint
+from .shard import natlas_shard_discovery
+from .network import CHECKPOINT_DETAILS
+from .event import natlas_event_stream
+from .progress import natlas_progress
+from .snmp import natlas_snmp
 
 REQUIRES_PYTHON = (3, 6)
 
+# max number of nodes queried at once by harvest_hosts()
+DEFAULT_HARVEST_WORKERS = 16
+
 # module return codes
 RETURN_SYNTAXERR    = -1
 RETURN_ERR          = 0
@@ -56,6 +70,8 @@ class natlas:
         self.network        = None
         self.diagram        = None
         self.catalog        = None
+        self.dns            = None
+        self.progress       = natlas_progress.create('text')
 
     def __try_snmp(self, node):
         if (node == None):              return 0
@@ -80,6 +96,7 @@ class natlas:
         
         # initalize objects
         self.network  = natlas_network(self.config)
+        self.network.set_progress(self.progress)
 
     def snmp_add_credential(self, snmp_ver, snmp_community):
         if (self.config == None):
@@ -95,10 +112,34 @@ class natlas:
     def set_discover_maxdepth(self, depth):
         self.network.set_max_depth(int(depth))
 
+    def set_time_budget(self, seconds):
+        '''
+        Stop discovering after a number of seconds and keep what was
+        found so far, see natlas_network.set_time_budget().
+        '''
+        self.network.set_time_budget(seconds)
+
     def set_verbose(self, verbose):
         self.network.set_verbose(verbose)
 
+    def set_progress(self, progress):
+        '''
+        Set how progress is reported, a natlas_progress or the kind of
+        one: 'quiet', 'text' (default), 'tty' or 'json'.
+        See natlas_progress.create().
+        '''
+        if (type(progress) == str):
+            progress = natlas_progress.create(progress)
+        self.progress = progress
+        natlas_snmp.set_reporter(progress)
+        if (self.network != None):
+            self.network.set_progress(progress)
+
     def discover_network(self, root_ip, details):
+        '''
+        Discover the network from root_ip, or from a list of seed IPs
+        discovered at the same time into one network.
+        '''
         self.network.discover(root_ip)
         if (details == 1):
             self.network.discover_details()
@@ -107,6 +148,121 @@ class natlas:
         self.diagram = natlas_output_diagram(self.network)
         self.catalog = natlas_output_catalog(self.network)
 
+    def discover_network_events(self, root_ip, details):
+        '''
+        Same as discover_network() but a generator of the natlas_event
+        of the discovery as they happen, eg to store the nodes while the
+        discovery is still running.  Stopping the iteration early stops
+        the discovery and keeps what was found so far.
+
+            for event in natlas_obj.discover_network_events(ip, 1):
+                if (event.type == EVENT_NODE_DETAILED):
+                    store(event.node)
+        '''
+        stream = natlas_event_stream(self.network)
+        for event in stream.run(self.discover_network, root_ip, details):
+            yield event
+
+    def sweep_network(self, ranges=None):
+        '''
+        Probe address ranges (default: the config sweep block) for SNMP
+        devices.  Returns their IPs, eg to add as seeds to discover_network().
+        '''
+        return self.network.sweep(ranges)
+
+    def discover_network_sharded(self, details, workers=None):
+        '''
+        Discover the network as the shards in the config, each shard in
+        its own process, up to workers processes at once (default: one
+        per CPU).  The shards are merged into one network.
+        '''
+        natlas_shard_discovery(self.network, workers).discover(details)
+
+        # initalize the output objects
+        self.diagram = natlas_output_diagram(self.network)
+        self.catalog = natlas_output_catalog(self.network)
+
+    def set_checkpoint(self, filename, interval=None):
+        '''
+        Save the progress of discover_network() to a file every interval
+        seconds (default config checkpoint.interval) so that it can be
+        continued with resume_network() if it is interrupted.
+        '''
+        self.network.set_checkpoint(natlas_checkpoint(self.config, filename, interval))
+
+    def resume_network(self, filename, details):
+        '''
+        Continue a discover_network() from the checkpoint in a file.
+        Nodes completed before the checkpoint are not queried again.
+        '''
+        phase = self.network.resume(natlas_checkpoint(self.config, filename))
+        if ((details == 1) & (phase == CHECKPOINT_DETAILS)):
+            self.network.discover_details()
+
+        # initalize the output objects
+        self.diagram = natlas_output_diagram(self.network)
+        self.catalog = natlas_output_catalog(self.network)
+
+    def discover_network_delta(self, snapshot_file, details):
+        '''
+        Update the topology saved in a snapshot file instead of
+        discovering the whole network.  Only nodes that changed since
+        the snapshot, and new nodes found behind them, are queried.
+        '''
+        old = natlas_snapshot(self.config).load(snapshot_file)
+        nodes = self.network.discover_delta(old)
+        if (details == 1):
+            self.network.discover_details(nodes)
+
+        # initalize the output objects
+        self.diagram = natlas_output_diagram(self.network)
+        self.catalog = natlas_output_catalog(self.network)
+
+    def save_snapshot(self, filename):
+        '''
+        Save the discovered topology to a file.
+        '''
+        natlas_snapshot(self.config).save(self.network, filename)
+
+    def load_snapshot(self, filename):
+        '''
+        Load a topology saved by save_snapshot() in place of discovering
+        the network.
+        '''
+        self.network = natlas_snapshot(self.config).load(filename)
+        self.network.set_progress(self.progress)
+        self.diagram = natlas_output_diagram(self.network)
+        self.catalog = natlas_output_catalog(self.network)
+
+    def get_vlan_links(self, vlan):
+        '''
+        Return a list of (natlas_node, natlas_node_link) for every
+        discovered link that carries the VLAN.
+        '''
+        return self.network.get_vlan_links(vlan)
+
+    def get_vlan_nodes(self, vlan):
+        '''
+        Return a list of the discovered nodes in the VLAN.
+        '''
+        return self.network.get_vlan_nodes(vlan)
+
+    def get_vlan_topology(self, vlan):
+        '''
+        Return a natlas_network with only the nodes and links in the VLAN.
+        '''
+        return self.network.get_vlan_topology(vlan)
+
+    def lookup_ip(self, ip):
+        '''
+        Find which discovered nodes own an IP address.
+
+        Returns:
+            List of natlas_ip_owner (node, interface, cidr, exact)
+            for the longest matching prefix.  Empty if none match.
+        '''
+        return self.network.lookup_ip(ip)
+
     def new_node(self, node_ip):
         node = natlas_node(ip=node_ip)
         self.__try_snmp(node)
@@ -143,12 +299,12 @@ class natlas:
             vlan                Filter results by VLAN
             MAC                 Filter results by MAC address (regex)
             port                Filter results by port (regex)
-            verbose             Display progress to stdout
+            verbose             Report progress, see set_progress()
 
             switch_ip or node is required
 
         Return:
-            Array of natlas_mac objects
+            natlas_mac_table of the MAC entries
         '''
         if (switch_ip == None):
             if (node == None):
@@ -156,29 +312,35 @@ class natlas:
                 return None
             switch_ip = node.get_ipaddr()
 
-        mac_obj = natlas_mac(self.config)
-
-        if (vlan == None):
-            # get all MACs
-            macs = mac_obj.get_macs(switch_ip, verbose)
-        else:
-            # get MACs only for one VLAN
-            macs = mac_obj.get_macs_for_vlan(switch_ip, vlan, verbose)
-
-        if ((mac == None) & (port == None)):
-            return macs if macs else []
+        mac_obj = natlas_mac(self.config, self.progress)
+        if (verbose == 1):
+            self.progress.start('macs')
+
+        # always finish, a tty or json reporter redraws from a timer
+        # thread until then
+        try:
+            if ((vlan == None) and (node != None) and (node.snmpobj.success == 1)):
+                # reuse what we already know about the node
+                macs = mac_obj.get_node_macs(node, verbose)
+            elif (vlan == None):
+                # get all MACs
+                macs = mac_obj.get_macs(switch_ip, verbose)
+            else:
+                # get MACs only for one VLAN
+                macs = mac_obj.get_macs_for_vlan(switch_ip, vlan, verbose)
+        finally:
+            if (verbose == 1):
+                self.progress.finish()
+
+        if (macs == None):
+            return natlas_mac_table()
 
         # filter results
-        ret = []
-        for m in macs:
-            if (mac != None):
-                if (re.match(mac, m.mac) == None):
-                    continue
-            if (port != None):
-                if (re.match(port, m.port) == None):
-                    continue
-            ret.append(m)
-        return ret
+        if (mac != None):
+            macs = macs.filter_mac(mac)
+        if (port != None):
+            macs = macs.filter_port(port)
+        return macs
 
     def get_discovered_nodes(self):
         return self.network.nodes
@@ -186,6 +348,26 @@ class natlas:
     def get_node_ip(self, node):
         return node.get_ipaddr()
 
+    def get_switch_mac_port(self, node, mac, vlans=None):
+        '''
+        Find the port a MAC address was learned on using direct GETs
+        instead of walking the whole CAM table.
+
+        Args:
+            node                natlas_node from new_node()
+            mac                 MAC address
+            vlans               List of VLAN IDs to look in, in order
+                                (default: all VLANs on the node)
+
+        Return:
+            (vlan, port) or (None, None) if not found
+        '''
+        self.__try_snmp(node)
+        if (vlans == None):
+            vlans = [v.id for v in node.get_vlans()]
+        mac_obj = natlas_mac(self.config)
+        return mac_obj.get_mac_port(node.snmpobj, mac, vlans, node.interfaces)
+
     def get_arp_table(self, switch_ip, ip=None, mac=None, interf=None, arp_type=None):
         '''
         Get the ARP table from a switch.
@@ -198,38 +380,152 @@ class natlas:
             arp_type            Filter results by ARP Type
 
         Return:
-            Array of natlas_arp objects
+            natlas_arp_table of the ARP entries
         '''
         node = natlas_node(switch_ip)
         if (node.try_snmp_creds(self.config.snmp_creds) == 0):
-            return []
+            return natlas_arp_table()
         arp = node.get_arp_table()
-        if (arp == None):
-            return []
 
-        if ((ip == None) & (mac == None) & (interf == None) & (arp_type == None)):
-            # no filtering
-            return arp
+        # filter the result table
+        if (ip != None):
+            arp = arp.filter_ip(ip)
+        if (mac != None):
+            arp = arp.filter_mac(mac)
+        if (interf != None):
+            arp = arp.filter_interf(str(interf))
+        if (arp_type != None):
+            arp = arp.filter_arp_type(arp_type)
+        return arp
+
+    def harvest_hosts(self, nodes=None, get_macs=True, get_arps=True, max_workers=DEFAULT_HARVEST_WORKERS):
+        '''
+        Collect the CAM and/or ARP tables from many nodes concurrently.
 
-        interf = str(interf) if vlan else None
+        The nodes are normally the result of a discovery; their cached
+        SNMP credentials, names and ifName tables are reused.
 
-        # filter the result table
-        ret = []
-        for a in arp:
-            if (ip != None):
-                if (re.match(ip, a.ip) == None):
-                    continue
-            if (mac != None):
-                if (re.match(mac, a.mac) == None):
-                    continue
-            if (interf != None):
-                if (re.match(interf, str(a.interf)) == None):
-                    continue
-            if (arp_type != None):
-                if (re.match(arp_type, a.arp_type) == None):
-                    continue
-            ret.append(a)
-        return ret
+        Args:
+            nodes               List of natlas_node (default: discovered nodes)
+            get_macs            Collect the CAM table
+            get_arps            Collect the ARP table
+            max_workers         Max number of nodes to query at once
+
+        Return:
+            Generator of (node, natlas_mac_table, natlas_arp_table, error)
+            tuples, yielded as each node finishes.  Tables are None if not
+            requested or if the node could not be queried; error is the
+            exception raised while querying the node, if any.
+        '''
+        if (nodes == None):
+            nodes = self.network.nodes
+
+        # Keep only a window of nodes in flight so finished tables are
+        # handed to the caller and released instead of piling up.
+        pool    = ThreadPoolExecutor(max_workers=max_workers)
+        nodes   = iter(nodes)
+        pending = set()
+        try:
+            while (1):
+                for n in nodes:
+                    pending.add(pool.submit(self.__harvest_node, n, get_macs, get_arps))
+                    if (len(pending) >= max_workers):
+                        break
+                if (len(pending) == 0):
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+        finally:
+            # the caller may stop early
+            for fut in pending:
+                fut.cancel()
+            pool.shutdown(wait=False)
+
+    def get_arp_nodes(self, nodes=None, vlans=None, max_workers=DEFAULT_HARVEST_WORKERS):
+        '''
+        Return the nodes that should be queried for ARP entries.
+
+        Pure layer 2 switches are skipped, as are routers whose SVI
+        subnets are all served by the routers already chosen (HSRP/VPC
+        peers).  See natlas_network.select_arp_nodes().  Nodes that have
+        not been queried for router/SVI info yet are queried concurrently.
+
+        Args:
+            nodes               List of natlas_node (default: discovered nodes)
+            vlans               List of VLAN IDs in scope (default: all)
+            max_workers         Max number of nodes to query at once
+
+        Return:
+            List of natlas_node
+        '''
+        if (nodes == None):
+            nodes = self.network.nodes
+
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        list(pool.map(self.__query_router_info, nodes))
+        pool.shutdown()
+
+        return self.network.select_arp_nodes(nodes, vlans)
+
+    def __query_router_info(self, node):
+        if (node.router != None):
+            # already known, eg from discover_details()
+            return
+        try:
+            if (node.snmpobj.success == 0):
+                if (node.try_snmp_creds(self.config.snmp_creds) == 0):
+                    return
+            node.opts.get_router    = True
+            node.opts.get_hsrp_pri  = True
+            node.opts.get_svi       = True
+            node.query_node()
+        except Exception as e:
+            # a bare print would break the tty line and the JSON stream
+            self.progress.message('[E] Unable to query %s: %s' % (node.get_ipaddr(), e))
+
+    def __harvest_node(self, node, get_macs, get_arps):
+        macs = None
+        arps = None
+        try:
+            if (node.snmpobj.success == 0):
+                if (node.try_snmp_creds(self.config.snmp_creds) == 0):
+                    # not a queryable node (phone, leaf, etc)
+                    return (node, None, None, None)
+            if (get_macs):
+                macs = natlas_mac(self.config).get_node_macs(node)
+            if (get_arps):
+                arps = node.get_arp_table()
+        except Exception as e:
+            return (node, macs, arps, e)
+        return (node, macs, arps, None)
+
+    def resolve_hosts(self, ips):
+        '''
+        Reverse resolve a list of IP addresses concurrently.
+        Results are cached as defined by the 'dns' config block.
+        Call close_resolver() when done to save the cache.
+
+        Args:
+            ips                 List of IP address strings
+
+        Return:
+            dict of IP -> DNS name ('' if the address did not resolve)
+        '''
+        if (self.config == None):
+            self.config = natlas_config()
+        if (self.dns == None):
+            self.dns = natlas_dns(self.config.dns)
+        return self.dns.resolve(ips)
+
+    def close_resolver(self):
+        '''
+        Save the DNS cache of resolve_hosts() and stop its threads.
+        '''
+        if (self.dns == None):
+            return
+        self.dns.close()
+        self.dns = None
 
     def get_neighbors(self, node):
         self.__try_snmp(node)
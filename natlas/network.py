@@ -24,10 +24,20 @@
         Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 '''
 
+import copy
+import heapq
+import itertools
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
 from timeit import default_timer as timer
 from .config import natlas_config
 from .util import *
 from .node import *
+from .ip_index import natlas_ip_index
+from .sweep import natlas_sweep
+from .event import *
+from .progress import natlas_progress
 
 DCODE_ROOT              = 0x01
 DCODE_ERR_SNMP          = 0x02
@@ -47,6 +57,14 @@ DCODE_LLDP_STR          = '[lldp]'
 DCODE_INCLUDE_STR       = 'i'
 DCODE_LEAF_STR          = 'L'
 
+# discovery phases saved in a checkpoint
+CHECKPOINT_DISCOVER     = 'discover'
+CHECKPOINT_DETAILS      = 'details'
+CHECKPOINT_DONE         = 'done'
+
+# max number of seeds discovered at once
+MAX_SEED_WORKERS        = 16
+
 NODE_KNOWN              = 0
 NODE_NEW                = 1
 NODE_NEWIP              = 2
@@ -59,6 +77,28 @@ class natlas_network:
         self.max_depth  = 0
         self.config     = conf
         self.verbose    = 1
+        self.vlan_links = None      # VLAN ID -> [(node, link)], see build_vlan_index()
+        self.vlan_nodes = None      # VLAN ID -> [node]
+        self.ip_index   = natlas_ip_index()
+        self.mem_exceeded = 0       # 1 once config.memory.max_memory_mb was reached
+        self.frontier   = []        # (node, depth) still to be discovered, last is next
+        self.details_done = set()   # id() of nodes discover_details() has queried
+        self.checkpoint = None      # natlas_checkpoint, see set_checkpoint()
+        self.shard      = None      # natlas_discover_shard, see set_shard()
+        self.seed_frontiers = []    # frontier of each seed while discover() runs
+        self.__lock     = threading.Condition()     # guards nodes and links while seeds run
+        self.__busy     = set()     # id() of nodes being queried
+        self.__pending  = {}        # id() -> new node being queried, not in nodes yet
+        self.__fingerprints = {}    # natlas_node.fingerprint -> node
+        self.budget     = conf.schedule.budget  # seconds, see set_time_budget()
+        self.deadline   = None      # timer() value the budget runs out at
+        self.unexplored = []        # nodes left undiscovered when the budget ran out
+        self.__heaps    = []        # frontiers of discover_frontier_by_priority() running
+        self.__seen     = {}        # id() -> number of neighbors that reported the node
+        self.__seq      = itertools.count()
+        self.listeners  = []        # functions called with each natlas_event
+        self.stopped    = 0         # 1 once stop() was called
+        self.progress   = natlas_progress.create('text')    # see set_progress()
 
     def __str__(self):
         return ('<root_node="%s", num_nodes=%i>' % (self.root_node.name, len(self.nodes)))
@@ -72,6 +112,65 @@ class natlas_network:
         for n in self.nodes:
             n.discovered = 0
 
+    def set_checkpoint(self, checkpoint):
+        '''
+        Save the progress of discover() and discover_details() with a
+        natlas_checkpoint so an interrupted discovery can be resumed.
+        '''
+        self.checkpoint = checkpoint
+
+    def set_time_budget(self, seconds):
+        '''
+        Limit discover() and discover_details() to a number of seconds
+        of wall clock time, counted from the start of discover().  When
+        it runs out the nodes still to be discovered are left as leaves
+        (see self.unexplored) and the remaining details are skipped.
+        Use with the 'schedule' config block so the most important
+        nodes are discovered first.
+
+        Args:
+            seconds     0 for no limit.
+        '''
+        self.budget = seconds
+
+    def set_progress(self, progress):
+        '''
+        Report the progress of discover() and discover_details() with a
+        natlas_progress, see natlas_progress.create().  Nothing is
+        reported if the verbose level is 0, except SNMP request errors.
+        '''
+        self.progress = progress
+        natlas_snmp.set_reporter(progress)
+
+    def add_listener(self, func):
+        '''
+        Call func(natlas_event) as nodes and links are found by
+        discover() and nodes are queried by discover_details(), eg to
+        store them while the discovery runs.  func is called in the
+        thread that found the node, possibly a seed thread, and should
+        not block for long.
+        '''
+        self.listeners.append(func)
+
+    def remove_listener(self, func):
+        self.listeners.remove(func)
+
+    def stop(self):
+        '''
+        Stop discover() and discover_details() as if the time budget ran
+        out, eg from another thread.  Stays stopped until self.stopped
+        is set back to 0.
+        '''
+        self.stopped = 1
+
+    def set_shard(self, shard):
+        '''
+        Only discover the nodes in a shard, a natlas_discover_shard from
+        the config.  Neighbors outside the shard are added to the network
+        and linked, but not queried or discovered.  Their shard does that.
+        '''
+        self.shard = shard
+
     def set_verbose(self, level):
         '''
         Set the verbose output level for discovery output.
@@ -89,6 +188,12 @@ class natlas_network:
         Populates self.nodes[] as a list of discovered nodes in the
         network with self.root_node being the root.
 
+        ip can also be a list of seed IPs, eg of islands of the network
+        that are not connected by CDP/LLDP.  The seeds are discovered
+        at the same time, each in its own thread, into one set of nodes
+        and links.  A node found from more than one seed is queried and
+        discovered once.  The first seed is the root node.
+
         This function will discover the network with minimal information.
         It is enough to define the structure of the network but will not
         include much data on each node.  Call discover_details() after this
@@ -96,30 +201,294 @@ class natlas_network:
         '''
 
         if (self.verbose > 0):
-            print('Discovery codes:\n'                                      \
-                  '    . depth             %s connection error\n'           \
-                  '    %s discovering node  %s numerating adjacencies\n'    \
-                  '    %s include node      %s leaf node\n' %
-                  (DCODE_ERR_SNMP_STR,
-                   DCODE_DISCOVERED_STR, DCODE_STEP_INTO_STR,
-                   DCODE_INCLUDE_STR, DCODE_LEAF_STR)
-                )
+            self.progress.message('Discovery codes:\n'                                      \
+                                  '    . depth             %s connection error\n'           \
+                                  '    %s discovering node  %s numerating adjacencies\n'    \
+                                  '    %s include node      %s leaf node\n' %
+                                  (DCODE_ERR_SNMP_STR,
+                                   DCODE_DISCOVERED_STR, DCODE_STEP_INTO_STR,
+                                   DCODE_INCLUDE_STR, DCODE_LEAF_STR)
+                                 )
+
+            self.progress.message('Discovering network...')
+            self.progress.start('discover')
+
+        self.vlan_links = None
+        self.vlan_nodes = None
+        self.__start_budget()
+
+        ips = ip if (type(ip) == list) else [ip]
+        self.root_node = None
+        self.seed_frontiers = [[] for i in ips]
+        self.frontier = self.seed_frontiers[0]
+
+        if (len(ips) == 1):
+            self.__discover_seed(ips[0], self.frontier)
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(ips), MAX_SEED_WORKERS)) as pool:
+                list(pool.map(self.__discover_seed, ips, self.seed_frontiers))
 
-            print('Discovering network...')
+        self.seed_frontiers = []
+        self.frontier = []
+        if (self.root_node == None):
+            return
+
+        self.__finish_discover()
+
+
+    def sweep(self, ranges=None):
+        '''
+        Probe address ranges (default: config sweep.ranges) for SNMP
+        devices, eg ones that do not run CDP/LLDP, to use as extra
+        seeds for discover().  Addresses and devices the discover ACL
+        denies are left out.  See natlas_sweep.
+
+        Returns:
+            List of the IPs of the devices found.
+        '''
+        sweep = natlas_sweep(self.config)
+        found = sweep.sweep(ranges, self.__sweep_accept)
+
+        if (self.verbose > 0):
+            self.progress.message('Swept %i addresses with %i packets, %i devices found.%s' %
+                    (sweep.probed, sweep.packets, len(found),
+                     ' Packet budget reached.' if (sweep.stopped == 1) else ''))
+
+        return [ip for ip, name, objid in found]
+
+
+    def __sweep_accept(self, ip, name):
+        '''
+        Called with name None before an address is probed, and with the
+        sysName of the device that answered.
+
+        The reply is matched against the discover ACL like a CDP/LLDP
+        neighbor is.  Before the probe the name is not known and a host
+        entry could still permit the device, so the address is only
+        skipped if an ip entry denies it before any permitting entry on
+        something other than the address.
+        '''
+        if (name != None):
+            name = util.shorten_host_name(name, self.config.host_domains)
+            return (self.__match_node_acl(ip, name) != 'deny')
 
+        for acl in self.config.discover_acl:
+            if (acl.type != 'ip'):
+                if (acl.action != 'deny'):
+                    return True
+                continue
+            if (self.__match_ip(ip, acl.str)):
+                return (acl.action != 'deny')
+        return False
+
+
+    def __discover_seed(self, ip, frontier):
+        '''
+        Query a seed node and discover the network behind it.
+        The first seed is the root node.
+        '''
         # Start the process of querying this node and recursing adjacencies.
         node, new_node = self.__query_node(ip, 'UNKNOWN')
-        self.root_node = node
 
-        if (node != None):
-            self.nodes.append(node)
+        with self.__lock:
+            if (new_node == NODE_NEW):
+                self.nodes.append(node)
+                self.__pending.pop(id(node), None)
+                self.__emit_new_node(node, 0)
+            if (frontier is self.seed_frontiers[0]):
+                self.root_node = node
+            self.ip_index.add_node(node)
             self.__print_step(node.ip[0], node.name, 0, DCODE_ROOT|DCODE_DISCOVERED)
-            self.__discover_node(node, 0)
-        else:
+            frontier.append((node, 0))
+
+        self.__discover_frontier(frontier)
+
+
+    def resume(self, checkpoint):
+        '''
+        Continue a discovery from a checkpoint saved by set_checkpoint().
+        Nodes that were completed before the checkpoint are not queried
+        again.  Checkpoints continue to be saved to the same file.
+
+        Returns:
+            The phase the discovery is in after resuming:
+                CHECKPOINT_DETAILS = call discover_details() next
+                CHECKPOINT_DONE    = the discovery was already complete
+        '''
+        phase = checkpoint.load(self)
+        self.checkpoint = checkpoint
+        self.__index_fingerprints()
+        self.__start_budget()
+
+        if (self.verbose > 0):
+            self.progress.message('Resuming %s from %s, %i nodes known, %i to discover.' %
+                    (phase, checkpoint.filename, len(self.nodes), len(self.frontier)))
+
+        if (phase == CHECKPOINT_DISCOVER):
+            if (self.verbose > 0):
+                self.progress.start('discover')
+            self.__discover_frontier()
+            self.__finish_discover()
+            phase = CHECKPOINT_DETAILS
+
+        return phase
+
+
+    def __start_budget(self):
+        self.unexplored = []
+        self.deadline = None
+        if (self.budget > 0):
+            self.deadline = timer() + self.budget
+
+
+    def __out_of_time(self):
+        if (self.stopped == 1):
+            return True
+        return ((self.deadline != None) and (timer() >= self.deadline))
+
+
+    def __stop_reason(self):
+        if (self.stopped == 1):
+            return 'Discovery was stopped'
+        return ('Time budget of %i seconds ran out' % self.budget)
+
+
+    def __emit(self, type, node, link=None, depth=None, error=None):
+        if (len(self.listeners) == 0):
+            return
+        event = natlas_event(type, node, link, depth, error)
+        for func in self.listeners:
+            func(event)
+
+
+    def __emit_new_node(self, node, depth, tried=True):
+        self.__emit(EVENT_NODE_DISCOVERED, node, depth=depth)
+        if (tried & (node.snmpobj.success == 0)):
+            self.__emit(EVENT_NODE_FAILED, node, depth=depth, error='No valid SNMP credentials')
+
+
+    def __discover_frontier(self, frontier=None):
+        '''
+        Discover the nodes on the frontier, depth first, until it is empty
+        or the time budget runs out.  With the 'schedule' config block the
+        highest priority node is discovered next instead.
+
+        Args:
+            frontier    List of (node, depth), default self.frontier.
+        '''
+        if (frontier == None):
+            frontier = self.frontier
+
+        if (self.config.schedule.enabled == True):
+            self.__discover_frontier_by_priority(frontier)
             return
 
+        while (len(frontier)):
+            if (self.__out_of_time()):
+                self.__leave_unexplored([n for n, depth in frontier])
+                del frontier[:]
+                return
+
+            node, depth = frontier.pop()
+            children = self.__discover_node(node, depth)
+
+            with self.__lock:
+                # push in reverse so the first neighbor is discovered next
+                for child in reversed(children):
+                    frontier.append((child, depth+1))
+
+                self.__save_checkpoint(CHECKPOINT_DISCOVER)
+
+
+    def __discover_frontier_by_priority(self, frontier):
+        '''
+        Discover the nodes on the frontier, highest priority first (see
+        __get_priority()), until it is empty or the time budget runs out.
+        The frontier is kept as a heap of (-priority, -seq, node, depth),
+        ties go to the node found last, like the depth first walk.
+        '''
+        heap = []
+        with self.__lock:
+            for node, depth in frontier:
+                self.__push_frontier(heap, node, depth)
+            del frontier[:]
+            self.__heaps.append(heap)
+
+        while (len(heap)):
+            if (self.__out_of_time()):
+                with self.__lock:
+                    self.__leave_unexplored([n for key, seq, n, depth in heap])
+                    del heap[:]
+                break
+
+            with self.__lock:
+                key, seq, node, depth = heapq.heappop(heap)
+
+            reseen = []
+            children = self.__discover_node(node, depth, reseen)
+
+            with self.__lock:
+                for child in children:
+                    self.__push_frontier(heap, child, depth+1)
+
+                # nodes still waiting that another neighbor reported
+                # gain priority from links_weight, queue them again.
+                # The old entry is skipped as the node is discovered by then.
+                if (self.config.schedule.links_weight != 0):
+                    for child in reseen:
+                        self.__push_frontier(heap, child, depth+1)
+
+                self.__save_checkpoint(CHECKPOINT_DISCOVER)
+
+        with self.__lock:
+            self.__heaps.remove(heap)
+
+
+    def __push_frontier(self, heap, node, depth):
+        priority = self.__get_priority(node, depth)
+        heapq.heappush(heap, (-priority, -next(self.__seq), node, depth))
+
+
+    def __get_priority(self, node, depth):
+        '''
+        Return the discovery priority of a node, higher goes first.
+        It is the priority of the first config schedule tier whose ACL
+        permits the node, plus depth_weight per hop from the root, plus
+        links_weight per discovered neighbor that reported the node.
+        '''
+        sched = self.config.schedule
+        priority = 0
+        for tier in sched.tiers:
+            if (self.__match_node_acl(node.ip[0], node.name, node.plat, node.ios, node.serial, acls=tier.acl) == 'permit'):
+                priority = tier.priority
+                break
+
+        return priority + (sched.depth_weight * depth) + (sched.links_weight * self.__seen.get(id(node), 0))
+
+
+    def __leave_unexplored(self, nodes):
+        '''
+        Keep the nodes that were not discovered in time as leaves.
+        '''
+        known = set([id(n) for n in self.unexplored])
+        for n in nodes:
+            if ((n.discovered != 0) | (id(n) in known)):
+                continue
+            known.add(id(n))
+            self.unexplored.append(n)
+            self.__print_step(n.ip[0], n.name, 0, DCODE_LEAF)
+
+
+    def __finish_discover(self):
+        if (self.verbose > 0):
+            self.progress.finish()
+        if ((self.verbose > 0) & (len(self.unexplored) > 0)):
+            self.progress.message('%s, %i nodes were left as leaves.' % (self.__stop_reason(), len(self.unexplored)))
+
         # we may have missed chassis info
         for n in self.nodes:
+            if (self.__out_of_time()):
+                break
             if ((n.serial == None) | (n.plat == None) | (n.ios == None)):
                 n.opts.get_chassis_info = True
                 if (n.serial == None):
@@ -130,29 +499,320 @@ class natlas_network:
                     n.opts.get_plat     = True
                 n.query_node()
 
+        # nodes that were queried but not added, eg denied by the ACL
+        self.__pending = {}
+
+        self.__save_checkpoint(CHECKPOINT_DETAILS, force=True)
+
+
+    def __save_checkpoint(self, phase, force=False):
+        if (self.checkpoint == None):
+            return
+        if ((force == True) or self.checkpoint.due()):
+            if (len(self.__heaps) > 0):
+                # the frontiers are heaps while scheduling by priority
+                self.frontier = [(n, depth) for heap in self.__heaps for key, seq, n, depth in heap]
+            elif (len(self.seed_frontiers) > 1):
+                # save the frontiers of all seeds, a resume walks them in turn
+                self.frontier = [f for frontier in self.seed_frontiers for f in frontier]
+            self.checkpoint.save(self, phase)
+
+
+    def discover_delta(self, old):
+        '''
+        Update a topology found by an earlier discovery, eg one loaded
+        from a snapshot, instead of discovering the network again.
+
+        Each known node is asked for its change stamp, a single SNMP GET
+        (see natlas_node.get_change_stamp()).  Nodes whose stamp shows no
+        change since they were discovered are carried over with their
+        links.  Changed nodes lose their links and are discovered again,
+        which also discovers any new nodes behind them.  Nodes that can
+        no longer be reached from the root are removed.
+
+        Args:
+            old         natlas_network with the earlier topology.  Its
+                        nodes are taken over by this network.
+
+        Returns:
+            List of the nodes that changed or are new.  Pass it to
+            discover_details() to collect details for only those nodes.
+        '''
+        self.root_node  = old.root_node
+        self.nodes      = old.nodes
+        self.vlan_links = None
+        self.vlan_nodes = None
+        self.ip_index   = natlas_ip_index()
+        self.__index_fingerprints()
+
+        if (self.root_node == None):
+            return []
+
+        if (self.verbose > 0):
+            self.progress.message('Checking %i known nodes for changes...' % len(self.nodes))
+
+        # a node that does not answer costs the full timeout of every
+        # credential, so the nodes are checked concurrently
+        with ThreadPoolExecutor(max_workers=MAX_SEED_WORKERS) as pool:
+            checks = list(pool.map(self.__check_node, self.nodes))
+
+        depths  = self.__get_node_depths()
+        changed = []
+        names   = {}        # id(node) -> sysName read with the stamp
+        for n, check in zip(self.nodes, checks):
+            if (check == None):
+                # not reachable, its neighbors will notice if it is gone
+                continue
+            if (n.fingerprint != None):
+                # eg from a snapshot saved without fingerprints
+                self.__fingerprints.setdefault(n.fingerprint, n)
+            stamp, name = check
+            if (natlas_node.stamp_changed(n.change_stamp, stamp) == 0):
+                n.change_stamp = stamp
+                continue
+            n.change_stamp = stamp
+            names[id(n)] = name
+            changed.append(n)
+
+        if (self.verbose > 0):
+            self.progress.message('%i of %i nodes changed.' % (len(changed), len(self.nodes)))
+
+        # nodes whose neighbors are discovered again, and whose links
+        # are found again by doing so.  Links of the other changed nodes,
+        # leaves and nodes at the max depth, were found by their neighbors.
+        walk = []
+        for n in changed:
+            acl_action = self.__match_node_acl(n.ip[0], n.name, n.plat, n.ios, n.serial)
+            if (n == self.root_node):
+                acl_action = 'permit'
+            if ((acl_action in ('leaf', 'include', 'deny')) | (depths.get(id(n), self.max_depth) >= self.max_depth)):
+                continue
+            walk.append(n)
+
+        walk_ids = set([id(n) for n in walk])
+        for n in self.nodes:
+            if (id(n) in walk_ids):
+                n.links = []
+            else:
+                n.links = [l for l in n.links if ((l.node == None) or (id(l.node) not in walk_ids))]
 
-    def discover_details(self):
+        for n in changed:
+            self.__reset_node(n, id(n) in walk_ids, names[id(n)])
+
+        known = len(self.nodes)
+        walk.sort(key=lambda n: depths[id(n)])
+        self.frontier = [(n, depths[id(n)]) for n in reversed(walk)]
+        if (self.verbose > 0):
+            self.progress.start('discover')
+        self.__discover_frontier()
+        if (self.verbose > 0):
+            self.progress.finish()
+        new_nodes = self.nodes[known:]
+
+        # drop nodes that are no longer linked to the rest
+        depths = self.__get_node_depths()
+        self.nodes = [n for n in self.nodes if (id(n) in depths)]
+
+        self.build_ip_index()
+        return [n for n in changed + new_nodes if (id(n) in depths)]
+
+
+    def __check_node(self, node):
+        '''
+        Probe a known node and read its change stamp, for discover_delta().
+
+        Returns:
+            (change stamp, sysName), or None if the node is not reachable.
+        '''
+        if (node.try_snmp_creds(self.config.snmp_creds) == 0):
+            return None
+        return node.get_change_stamp_and_name(self.config.host_domains)
+
+
+    def __reset_node(self, node, forget_links, name):
+        '''
+        Forget what was discovered about a changed node so it is queried again.
+        name is its sysName, read with the change stamp.
+        '''
+        node.svis               = []
+        node.loopbacks          = []
+        node.stack              = NODE_STACK_NONE
+        node.vss                = NODE_VSS_NONE
+        node.vpc_peerlink_node  = None
+        node.interfaces         = natlas_interface_table(node.snmpobj)
+        node.release_vbtbls(VBTBL_DROP)
+        if (forget_links == True):
+            node.discovered = 0
+
+        node.name = name or node.name
+        node.opts.get_serial = True
+        node.query_node()
+
+
+    def __get_node_depths(self, roots=None):
+        '''
+        Return a dict of id(node) -> hops from the root for every node
+        that can be reached from the root over links in either direction.
+
+        Args:
+            roots       List of nodes to count the hops from, the
+                        nearest one is used (default: the root node).
+        '''
+        if (roots == None):
+            roots = [self.root_node]
+
+        neighbors = {}
+        for n in self.nodes:
+            for link in n.links:
+                if (link.node == None):
+                    continue
+                neighbors.setdefault(id(n), []).append(link.node)
+                neighbors.setdefault(id(link.node), []).append(n)
+
+        depths = dict([(id(n), 0) for n in roots])
+        queue  = list(roots)
+        for n in queue:
+            for nb in neighbors.get(id(n), []):
+                if (id(nb) not in depths):
+                    depths[id(nb)] = depths[id(n)] + 1
+                    queue.append(nb)
+        return depths
+
+
+    def merge(self, other):
+        '''
+        Merge the nodes and links of another network, eg one discovered
+        by a shard, into this network.  Nodes known to both are matched
+        by IP and name and kept once, with the attributes of the copy
+        that was queried the most.  Links found by both ends are kept once.
+
+        Args:
+            other       natlas_network to merge.  Its nodes and links
+                        are taken over by this network.
+
+        Returns:
+            dict of id(node of other) -> node of this network
+        '''
+        node_map = {}
+        for on in other.nodes:
+            node = None
+            for ip in on.ip:
+                node, node_updated = self.__get_known_node(ip, on.name)
+                if (node != None):
+                    break
+
+            if (node == None):
+                self.nodes.append(on)
+                node_map[id(on)] = on
+                continue
+
+            if (self.__merge_rank(on) > self.__merge_rank(node)):
+                for attr in natlas_node.__slots__:
+                    if (attr not in ('ip', 'links', 'opts')):
+                        setattr(node, attr, getattr(on, attr))
+            for ip in on.ip:
+                if (ip not in node.ip):
+                    node.ip.append(ip)
+            node_map[id(on)] = node
+
+        for on in other.nodes:
+            node = node_map[id(on)]
+            for link in on.links:
+                if (link.node != None):
+                    link.node = node_map.get(id(link.node), link.node)
+                for ex_link in node.links:
+                    if ((ex_link.node == link.node) & (ex_link.local_port == link.local_port)):
+                        break
+                else:
+                    self.__add_link(node, link)
+
+        if ((self.root_node == None) & (other.root_node != None)):
+            self.root_node = node_map[id(other.root_node)]
+
+        self.vlan_links = None
+        self.vlan_nodes = None
+        self.build_ip_index()
+        self.__index_fingerprints()
+        return node_map
+
+
+    def __merge_rank(self, node):
+        return (node.snmpobj.success * 2) + node.discovered
+
+
+    def discover_unwalked(self, roots):
+        '''
+        Discover the nodes that were found as a neighbor but were not
+        discovered, eg after merge() the nodes at the edge of a shard
+        that no shard permits.  The depth of a node is counted from the
+        nearest of roots.
+
+        Args:
+            roots       List of natlas_node the discovery started at.
+        '''
+        depths = self.__get_node_depths(roots)
+        walk = []
+        for n in self.nodes:
+            if ((n.discovered != 0) | (id(n) not in depths)):
+                continue
+            if (depths[id(n)] >= self.max_depth):
+                continue
+            acl_action = self.__match_node_acl(n.ip[0], n.name, n.plat, n.ios, n.serial)
+            if (acl_action in ('leaf', 'include', 'deny')):
+                continue
+            walk.append(n)
+
+        if (self.verbose > 0):
+            self.progress.message('Discovering %i nodes outside of the shards...' % len(walk))
+            self.progress.start('discover')
+
+        for n in walk:
+            self.__query_node(n.ip[0], n.name)
+
+        walk.sort(key=lambda n: depths[id(n)])
+        self.frontier = [(n, depths[id(n)]) for n in reversed(walk)]
+        self.__discover_frontier()
+        self.__finish_discover()
+
+
+    def discover_details(self, nodes=None):
         '''
         Enumerate the discovered nodes from discover() and update the
         nodes in the array with additional info.
+
+        Args:
+            nodes       List of natlas_node to query (default: all
+                        discovered nodes), eg the nodes returned by
+                        discover_delta().
         '''
         if (self.root_node == None):
             return
 
+        if (nodes == None):
+            nodes = self.nodes
+
         if (self.verbose > 0):
-            print('\nCollecting node details...')
+            self.progress.message('\nCollecting node details...')
+            self.progress.start('details', len(nodes))
 
         ni = 0
-        for n in self.nodes:
+        for n in nodes:
             ni = ni + 1
+            if (self.__out_of_time()):
+                if (self.verbose > 0):
+                    self.progress.message('%s, details of %i nodes were skipped.' % (self.__stop_reason(), len(nodes) - ni + 1))
+                break
+
+            if (id(n) in self.details_done):
+                # queried before the discovery was resumed
+                continue
 
             indicator = '+'
             if (n.snmpobj.success == 0):
                 indicator = '!'
 
             if (self.verbose > 0):
-                sys.stdout.write('[%i/%i]%s %s (%s)' % (ni, len(self.nodes), indicator, n.name, n.snmpobj._ip))
-                sys.stdout.flush()
+                self.progress.add('details', 0, '[%i/%i]%s %s (%s)' % (ni, len(nodes), indicator, n.name, n.snmpobj._ip))
 
             # set what details to discover for this node
             n.opts.get_router        = True
@@ -173,14 +833,25 @@ class natlas_network:
 
             start = timer()
             n.query_node()
+            self.ip_index.add_node(n)
+            self.__release_vbtbls(n)
             end = timer()
             if (self.verbose > 0):
-                print(' %.2f sec' % (end - start))
+                self.progress.add('details', 1, ' %.2f sec\n' % (end - start))
+
+            self.details_done.add(id(n))
+            self.__save_checkpoint(CHECKPOINT_DETAILS)
+            self.__emit(EVENT_NODE_DETAILED, n)
+
+        # SVIs may have changed what the VLAN index would hold
+        self.vlan_links = None
+        self.vlan_nodes = None
 
         # There is some back fill information we can populate now that
         # we know all there is to know.
         if (self.verbose > 0):
-            print('\nBack filling node details...')
+            self.progress.finish()
+            self.progress.message('\nBack filling node details...')
 
         for n in self.nodes:
             # Find and link VPC nodes together for easy reference later
@@ -191,24 +862,270 @@ class natlas_network:
                         link.node.vpc_peerlink_node = n
                         break
 
+        self.details_done = set()
+        self.__save_checkpoint(CHECKPOINT_DONE, force=True)
+
+
+    def select_arp_nodes(self, nodes=None, vlans=None):
+        '''
+        Choose which nodes to collect ARP tables from.
+
+        Only routers (node.router == 1) are selected.  If vlans is given
+        only routers with an SVI in one of those VLANs are selected.
+
+        Routers that serve the same SVI subnets, such as HSRP or VPC
+        peers, hold the same ARP entries, so the routers are chosen as a
+        greedy cover of the subnets: repeatedly take the router that adds
+        the most subnets not yet covered, preferring the highest HSRP
+        priority and then discovery order, until every subnet is covered.
+        This also skips a peer whose subnets are all served by others
+        when the HSRP groups are split across several routers.  When
+        vlans is given only the subnets of SVIs in those VLANs count.
+
+        The nodes must have been queried with opts.get_router, get_svi
+        and get_hsrp_pri.
+
+        Args:
+            nodes       List of natlas_node (default: all discovered nodes)
+            vlans       List of VLAN IDs in scope (default: all)
+
+        Returns:
+            List of natlas_node, in the order given
+        '''
+        if (nodes == None):
+            nodes = self.nodes
+        if (vlans != None):
+            vlans = [str(v) for v in vlans]
+
+        ret        = []
+        candidates = []
+        for n in nodes:
+            if (n.router != 1):
+                continue
+            svis = n.svis
+            if (vlans != None):
+                svis = [svi for svi in n.svis if (str(svi.vlan) in vlans)]
+                if (len(svis) == 0):
+                    continue
+
+            subnets = set()
+            for svi in svis:
+                for cidr in svi.ip:
+                    subnets.add(util.get_cidr_network(cidr))
+            if (len(subnets) == 0):
+                # routed only, nothing to compare against
+                ret.append(n)
+                continue
+            candidates.append((n, subnets))
+
+        uncovered = set()
+        for n, subnets in candidates:
+            uncovered |= subnets
+
+        while (len(uncovered) > 0):
+            best      = None
+            best_key  = None
+            for i, (n, subnets) in enumerate(candidates):
+                key = (len(subnets & uncovered), int(n.hsrp_pri or 0), -i)
+                if ((best_key == None) or (key > best_key)):
+                    best     = i
+                    best_key = key
+            n, subnets = candidates[best]
+            ret.append(n)
+            uncovered -= subnets
+
+        order = dict([(id(n), i) for i, n in enumerate(nodes)])
+        ret.sort(key=lambda n: order[id(n)])
+        return ret
+
+
+    def build_vlan_index(self, get_node_vlans=True):
+        '''
+        Index which links and nodes carry each VLAN.
+
+        A trunk carries the VLANs allowed on both of its ends, an access
+        link carries its access VLAN.  A node is in a VLAN if the VLAN is
+        defined on it, it has an SVI in it, or it is at either end of a
+        link that carries it.
+
+        Trunks that allow all VLANs are only indexed under VLANs that are
+        known somewhere in the network.
+
+        Args:
+            get_node_vlans      Walk the VLAN table of each reachable node.
+                                The tables are cached on the nodes.
+        '''
+        vlan_links = {}
+        vlan_nodes = {}
+        seen       = set()
+
+        # VLANs defined on each node
+        node_vlans = {}
+        universe   = 0
+        for n in self.nodes:
+            bitmap = 0
+            if ((get_node_vlans == True) & (n.snmpobj.success == 1)):
+                for vlan in n.get_vlans():
+                    bitmap |= 1 << int(vlan.id)
+            for svi in n.svis:
+                bitmap |= 1 << int(svi.vlan)
+            node_vlans[id(n)] = bitmap
+            universe |= bitmap
+
+            for link in n.links:
+                for vlan in (link.vlan, link.local_native_vlan, link.remote_native_vlan):
+                    if (str(vlan).isdigit()):
+                        universe |= 1 << int(vlan)
+        if (universe == 0):
+            universe = VLAN_BITMAP_ALL
+
+        for n in self.nodes:
+            for vlan in util.vlan_bitmap_to_list(node_vlans[id(n)]):
+                self.__index_vlan_node(vlan_nodes, seen, vlan, n)
+
+            for link in n.links:
+                for vlan in util.vlan_bitmap_to_list(link.get_vlan_bitmap(universe)):
+                    vlan_links.setdefault(vlan, []).append((n, link))
+                    self.__index_vlan_node(vlan_nodes, seen, vlan, n)
+                    if (link.node != None):
+                        self.__index_vlan_node(vlan_nodes, seen, vlan, link.node)
+
+        self.vlan_links = vlan_links
+        self.vlan_nodes = vlan_nodes
+
+
+    def get_vlans(self):
+        '''
+        Return a sorted list of the VLAN IDs in the VLAN index.
+        '''
+        if (self.vlan_nodes == None):
+            self.build_vlan_index()
+        return sorted(self.vlan_nodes)
+
+
+    def get_vlan_links(self, vlan):
+        '''
+        Return a list of (node, natlas_node_link) for the links that carry the VLAN.
+        '''
+        if (self.vlan_links == None):
+            self.build_vlan_index()
+        return self.vlan_links.get(int(vlan), [])
+
+
+    def get_vlan_nodes(self, vlan):
+        '''
+        Return a list of the nodes in the VLAN.
+        '''
+        if (self.vlan_nodes == None):
+            self.build_vlan_index()
+        return self.vlan_nodes.get(int(vlan), [])
+
+
+    def get_vlan_topology(self, vlan):
+        '''
+        Return a new natlas_network with only the nodes and links in
+        the VLAN.  The nodes and links are shallow copies so the links
+        of the original network are untouched.
+        '''
+        sub    = natlas_network(self.config)
+        copies = {}
+        for n in self.get_vlan_nodes(vlan):
+            c = copy.copy(n)
+            c.links = []
+            copies[id(n)] = c
+            sub.nodes.append(c)
+
+        for n, link in self.get_vlan_links(vlan):
+            l = copy.copy(link)
+            l.node = copies.get(id(link.node))
+            copies[id(n)].links.append(l)
+
+        sub.root_node = copies.get(id(self.root_node))
+        if ((sub.root_node == None) & (len(sub.nodes) > 0)):
+            sub.root_node = sub.nodes[0]
+        sub.max_depth = self.max_depth
+        sub.verbose   = self.verbose
+        sub.progress  = self.progress
+        sub.build_ip_index()
+        return sub
+
+
+    def build_ip_index(self):
+        '''
+        Rebuild the IP index from all nodes, eg after the nodes were
+        loaded from a snapshot.  During discovery the index is kept up
+        to date as nodes are found.
+        '''
+        self.ip_index = natlas_ip_index()
+        for n in self.nodes:
+            self.ip_index.add_node(n)
+
+
+    def lookup_ip(self, ip):
+        '''
+        Find which nodes own an IP address.
+
+        Returns:
+            List of natlas_ip_owner for the longest matching prefix.
+            If the address is configured on a node the owners have
+            exact=1, otherwise they are the nodes attached to the most
+            specific subnet containing the address.
+        '''
+        return self.ip_index.lookup(ip)
+
+
+    def __index_vlan_node(self, vlan_nodes, seen, vlan, node):
+        if ((vlan, id(node)) in seen):
+            return
+        seen.add((vlan, id(node)))
+        vlan_nodes.setdefault(vlan, []).append(node)
+
+
+    def get_port_index(self):
+        '''
+        Build an index of the neighbor found on each port.
+
+        Links are only stored on one of their two nodes so both
+        directions are added.  A LAG is indexed under its port-channel
+        name as well as under each member port.
+
+        Returns:
+            dict of (node IP, port name) -> (neighbor natlas_node, natlas_node_link)
+            There is an entry for every known IP of the node.
+        '''
+        index = {}
+        for n in self.nodes:
+            for link in n.links:
+                if (link.node == None):
+                    continue
+                ends = ((n, link.node, link.local_port, link.local_lag),
+                        (link.node, n, link.remote_port, link.remote_lag))
+                for node, neighbor, port, lag in ends:
+                    for ip in node.ip:
+                        if (port != None):
+                            index.setdefault((ip, port), (neighbor, link))
+                        if ((lag != None) & (lag != 'UNKNOWN')):
+                            index.setdefault((ip, lag), (neighbor, link))
+        return index
+
 
     def __print_step(self, ip, name, depth, dcodes):
         if (self.verbose == 0):
             return
 
         if (dcodes & DCODE_DISCOVERED):
-            sys.stdout.write('%-3i' % len(self.nodes))
+            line = '%-3i' % len(self.nodes)
         else:
-            sys.stdout.write('   ')
+            line = '   '
 
         if (dcodes & DCODE_INCLUDE):
             # flip this off cause we didn't even try
             dcodes = dcodes & ~DCODE_ERR_SNMP
 
-        if   (dcodes & DCODE_ROOT):         sys.stdout.write( DCODE_ROOT_STR )
-        elif (dcodes & DCODE_CDP):          sys.stdout.write( DCODE_CDP_STR )
-        elif (dcodes & DCODE_LLDP):         sys.stdout.write( DCODE_LLDP_STR )
-        else:                               sys.stdout.write('      ')
+        if   (dcodes & DCODE_ROOT):         line += DCODE_ROOT_STR
+        elif (dcodes & DCODE_CDP):          line += DCODE_CDP_STR
+        elif (dcodes & DCODE_LLDP):         line += DCODE_LLDP_STR
+        else:                               line += '      '
 
         status = ''        
         if   (dcodes & DCODE_ERR_SNMP):     status += DCODE_ERR_SNMP_STR
@@ -216,14 +1133,19 @@ class natlas_network:
         elif (dcodes & DCODE_INCLUDE):      status += DCODE_INCLUDE_STR
         if   (dcodes & DCODE_DISCOVERED):   status += DCODE_DISCOVERED_STR
         elif (dcodes & DCODE_STEP_INTO):    status += DCODE_STEP_INTO_STR
-        sys.stdout.write('%3s' % status)
+        line += '%3s' % status
 
-        for i in range(0, depth):
-            sys.stdout.write('.')
+        line += '.' * depth
 
         name = util.shorten_host_name(name, self.config.host_domains)
-        if (self.verbose > 0):
-            print('%s (%s)' % (name, ip))
+        line += '%s (%s)\n' % (name, ip)
+
+        # one line of text, the counts for the other reporters
+        if (dcodes & DCODE_ERR_SNMP):
+            self.progress.add('failed', 1)
+        if   (dcodes & DCODE_DISCOVERED):   self.progress.add('nodes', 1, line)
+        elif (dcodes & DCODE_STEP_INTO):    self.progress.add('walked', 1, line)
+        else:                               self.progress.add('unexplored', 1, line)
 
 
     def __query_node(self, ip, host):
@@ -243,26 +1165,47 @@ class natlas_network:
                                 NODE_KNOWN = Already knew about this node
         '''
         host = util.shorten_host_name(host, self.config.host_domains)
-        node, node_updated = self.__get_known_node(ip, host)
 
-        if (node == None):
-            # new node
-            node        = natlas_node()
-            node.name   = host
-            node.ip     = [ip]
-            state       = NODE_NEW
-        else:
-            # existing node
-            if (node.snmpobj.success == 1):
-                # we already queried this node successfully - return it
-                return (node, NODE_KNOWN)
-            # existing node but we couldn't connect before
-            if (node_updated == 1):
-                state = NODE_NEWIP
+        with self.__lock:
+            node, node_updated = self.__get_known_node(ip, host)
+            while ((node != None) and (id(node) in self.__busy)):
+                # another seed is querying this node, wait for it
+                self.__lock.wait()
+                node, node_updated = self.__get_known_node(ip, host)
+
+            if (node == None):
+                # new node
+                node        = natlas_node()
+                node.name   = host
+                node.ip     = [ip]
+                state       = NODE_NEW
+                self.__pending[id(node)] = node
             else:
-                state = NODE_KNOWN
-            node.name = host
+                # existing node
+                if (node.snmpobj.success == 1):
+                    # we already queried this node successfully - return it
+                    return (node, NODE_KNOWN)
+                # existing node but we couldn't connect before
+                if (node_updated == 1):
+                    state = NODE_NEWIP
+                else:
+                    state = NODE_KNOWN
+                node.name = host
 
+            self.__busy.add(id(node))
+
+        try:
+            return self.__query_snmp(node, ip, host, state)
+        finally:
+            with self.__lock:
+                self.__busy.discard(id(node))
+                self.__lock.notify_all()
+
+
+    def __query_snmp(self, node, ip, host, state):
+        '''
+        The SNMP part of __query_node(), run without holding the lock.
+        '''
         if (ip == 'UNKNOWN'):
             return (node, state)
 
@@ -275,12 +1218,24 @@ class natlas_network:
         if (node.try_snmp_creds(self.config.snmp_creds) == 0):
             return (node, state)
 
-        node.name = node.get_system_name(self.config.host_domains)
+        # the first request also read the fingerprint, so a device known
+        # by another IP or name is found before it is queried any more
+        if (node.fingerprint != None):
+            with self.__lock:
+                known = self.__fingerprints.get(node.fingerprint)
+                if ((known != None) and (known is not node)):
+                    return (self.__merge_duplicate(node, known, ip, state), NODE_KNOWN)
+                self.__fingerprints[node.fingerprint] = node
+            node.name = util.shorten_host_name(node.fingerprint[0], self.config.host_domains)
+        else:
+            node.name = node.get_system_name(self.config.host_domains)
+
         if (node.name != host):
             # the hostname changed (cdp/lldp vs snmp)!
             # double check we don't already know about this node
             if (state == NODE_NEW):
-                node2, node_updated2 = self.__get_known_node(ip, host)
+                with self.__lock:
+                    node2, node_updated2 = self.__get_known_node(ip, host, skip=node)
                 if ((node2 != None) & (node_updated2 == 0)):
                     return (node, NODE_KNOWN)
                 if (node_updated2 == 1):
@@ -293,13 +1248,90 @@ class natlas_network:
             node.name = node.get_ipaddr()
 
         node.opts.get_serial = True     # CDP/LLDP does not report, need for extended ACL
+        node.opts.get_change_stamp = True
         node.query_node()
         return (node, state)
 
 
-    def __get_known_node(self, ip, host):
+    def __merge_duplicate(self, dup, node, ip, state):
+        '''
+        Merge dup into node, the same device found by its fingerprint.
+        dup is either new, or was known but could not be queried before.
+
+        Returns:
+            node
+        '''
+        if (ip not in node.ip):
+            node.ip.append(ip)
+
+        if (state == NODE_NEW):
+            # not added to the network yet
+            self.__pending.pop(id(dup), None)
+            self.ip_index.add_node(node)
+            return node
+
+        for n in self.nodes:
+            for link in n.links:
+                if (link.node is dup):
+                    link.node = node
+        for link in dup.links:
+            for ex_link in node.links:
+                if ((ex_link.node is link.node) & (ex_link.local_port == link.local_port)):
+                    break
+            else:
+                node.links.append(link)
+
+        for dip in dup.ip:
+            if (dip not in node.ip):
+                node.ip.append(dip)
+
+        # dup may still be on a frontier, do not walk it or save it
+        dup.discovered = 1
+        self.__remove_from_frontiers(dup)
+        self.__pending.pop(id(dup), None)
+        if (dup in self.nodes):
+            self.nodes.remove(dup)
+        if (self.root_node is dup):
+            self.root_node = node
+        self.ip_index.remove_node(dup)
+        self.ip_index.add_node(node)
+        return node
+
+
+    def __remove_from_frontiers(self, node):
+        for frontier in itertools.chain([self.frontier], self.seed_frontiers):
+            frontier[:] = [f for f in frontier if (f[0] is not node)]
+        for heap in self.__heaps:
+            heap[:] = [e for e in heap if (e[2] is not node)]
+            heapq.heapify(heap)
+
+
+    def __index_fingerprints(self):
+        self.__fingerprints = {}
+        for n in self.nodes:
+            if (n.fingerprint != None):
+                self.__fingerprints.setdefault(n.fingerprint, n)
+
+
+    def __get_boundary_node(self, ip, host):
+        '''
+        Return the node of a neighbor outside of the shard without
+        querying it, and NODE_NEW or NODE_KNOWN.
         '''
-        Look for known nodes by IP and HOST.
+        host = util.shorten_host_name(host, self.config.host_domains)
+        node, node_updated = self.__get_known_node(ip, host)
+        if (node != None):
+            return (node, NODE_KNOWN)
+
+        node        = natlas_node()
+        node.name   = host
+        node.ip     = [ip]
+        return (node, NODE_NEW)
+
+
+    def __get_known_node(self, ip, host, skip=None):
+        '''
+        Look for known nodes by IP and HOST, other than skip.
         If found by HOST, add the IP if not already known.
 
         Return:
@@ -307,15 +1339,26 @@ class natlas_network:
             updated:    1=updated, 0=not updated
         '''
         # already known by IP ?
-        for ex in self.nodes:
+        for ex in itertools.chain(self.nodes, list(self.__pending.values())):
+            if (ex is skip):
+                continue
             for exip in ex.ip:
                 if (exip == '0.0.0.0'):
                     continue
                 if (exip == ip):
                     return (ex, 0)
 
+        # seeds have no name until they are queried
+        if (host == 'UNKNOWN'):
+            return (None, 0)
+
         # already known by HOST ?
         node = self.__get_known_node_by_host(host)
+        if (node == None):
+            for ex in self.__pending.values():
+                if ((ex.name == host) & (ex is not skip)):
+                    node = ex
+                    break
         if (node != None):
             # node already known
             if (ip not in node.ip):
@@ -326,40 +1369,47 @@ class natlas_network:
         return (None, 0)
 
 
-    def __discover_node(self, node, depth):
+    def __discover_node(self, node, depth, reseen=None):
         '''
-        Given a node, recursively enumerate its adjacencies
-        until we reach the specified depth (>0).
+        Given a node, enumerate its adjacencies.
 
         Args:
             node:   natlas_node object to enumerate.
-            depth:  The depth left that we can go further away from the root.
+            depth:  The depth of the node from the root.
+            reseen: Optional list the neighbors that were already known
+                    but not discovered yet are added to.
+
+        Returns:
+            List of the new neighbors that should be discovered next,
+            at depth+1.
         '''
         if (node == None):
-            return
+            return []
 
         if (depth >= self.max_depth):
-            return
-
-        if (node.discovered > 0):
-            return
-        node.discovered = 1
-
-        # vmware ESX can report IP as 0.0.0.0
-        # If we are allowing 0.0.0.0/32 in the config,
-        # then we added it as a leaf, but don't discover it
-        if (node.ip[0] == '0.0.0.0'):
-            return
-
-        # may be a leaf we couldn't connect to previously
-        if (node.snmpobj.success == 0):
-            return
-
-        # print some info to stdout
-        dcodes = DCODE_STEP_INTO
-        if (depth == 0):
-            dcodes |= DCODE_ROOT
-        self.__print_step(node.ip[0], node.name, depth, dcodes)
+            return []
+
+        with self.__lock:
+            # another seed may have got here first
+            if (node.discovered > 0):
+                return []
+            node.discovered = 1
+
+            # vmware ESX can report IP as 0.0.0.0
+            # If we are allowing 0.0.0.0/32 in the config,
+            # then we added it as a leaf, but don't discover it
+            if (node.ip[0] == '0.0.0.0'):
+                return []
+
+            # may be a leaf we couldn't connect to previously
+            if (node.snmpobj.success == 0):
+                return []
+
+            # print some info to stdout
+            dcodes = DCODE_STEP_INTO
+            if (depth == 0):
+                dcodes |= DCODE_ROOT
+            self.__print_step(node.ip[0], node.name, depth, dcodes)
 
         # get the cached snmp credentials
         snmpobj = node.snmpobj
@@ -372,7 +1422,9 @@ class natlas_network:
         lldp_neighbors = node.get_lldp_neighbors()
         neighbors      = cdp_neighbors + lldp_neighbors
         if (len(neighbors) == 0):
-            return
+            with self.__lock:
+                self.__release_vbtbls(node)
+            return []
 
         for n in neighbors:
             # some neighbors may not advertise IP addresses - default them to 0.0.0.0
@@ -387,56 +1439,101 @@ class natlas_network:
             
             dcodes = DCODE_DISCOVERED
             child = None
+            walk_child = 1
             if (acl_action == 'include'):
                 # include this node but do not discover it
                 child    = natlas_node()
                 child.ip = [n.remote_ip]
                 dcodes  |= DCODE_INCLUDE
+                query_result = NODE_NEW
+            elif ((self.shard != None) and (self.__match_node_acl(n.remote_ip, n.remote_name, acls=self.shard.acl) != 'permit')):
+                # in another shard, link to it but leave it to that shard
+                with self.__lock:
+                    child, query_result = self.__get_boundary_node(n.remote_ip, n.remote_name)
+                walk_child = 0
             else:
                 # discover this node
                 child, query_result = self.__query_node(n.remote_ip, n.remote_name)
 
-            # if we couldn't pull info from SNMP fill in what we know
-            if (child.snmpobj.success == 0):
-                child.name = util.shorten_host_name(n.remote_name, self.config.host_domains)
-                dcodes  |= DCODE_ERR_SNMP
-            
-            # need to check the ACL again for extended ops (we have more info)
-            acl_action = self.__match_node_acl(n.remote_ip, n.remote_name, n.remote_plat, n.remote_ios, child.serial)
-            if (acl_action == 'deny'):
-                continue
+            with self.__lock:
+                # if we couldn't pull info from SNMP fill in what we know
+                if (child.snmpobj.success == 0):
+                    child.name = util.shorten_host_name(n.remote_name, self.config.host_domains)
+                    dcodes  |= DCODE_ERR_SNMP
 
-            if (query_result == NODE_NEW):
-                self.nodes.append(child)
-                if (acl_action == 'leaf'):          dcodes |= DCODE_LEAF
-                if (n.discovered_proto == 'cdp'):   dcodes |= DCODE_CDP
-                if (n.discovered_proto == 'lldp'):  dcodes |= DCODE_LLDP
-                self.__print_step(n.remote_ip, n.remote_name, depth+1, dcodes)
+                # need to check the ACL again for extended ops (we have more info)
+                acl_action = self.__match_node_acl(n.remote_ip, n.remote_name, n.remote_plat, n.remote_ios, child.serial)
+                if (acl_action == 'deny'):
+                    continue
 
-            # CDP/LLDP advertises the platform
-            child.plat = n.remote_plat
-            child.ios  = n.remote_ios
-            
-            # add the discovered node to the link object and link to the parent
-            n.node = child
-            self.__add_link(node, n)
+                if (query_result == NODE_NEW):
+                    self.nodes.append(child)
+                    self.__pending.pop(id(child), None)
+                    if (acl_action == 'leaf'):          dcodes |= DCODE_LEAF
+                    if (n.discovered_proto == 'cdp'):   dcodes |= DCODE_CDP
+                    if (n.discovered_proto == 'lldp'):  dcodes |= DCODE_LLDP
+                    self.__print_step(n.remote_ip, n.remote_name, depth+1, dcodes)
+                    self.__emit_new_node(child, depth+1, tried=(walk_child & (acl_action != 'include')))
+
+                # CDP/LLDP advertises the platform
+                child.plat = n.remote_plat
+                child.ios  = n.remote_ios
+
+                # add the discovered node to the link object and link to the parent
+                n.node = child
+                if (self.__add_link(node, n) == 1):
+                    self.__emit(EVENT_LINK_ADDED, node, link=n, depth=depth)
+                self.ip_index.add_node(child)
+                self.__seen[id(child)] = self.__seen.get(id(child), 0) + 1
 
             # if we need to discover this node then add it to the list
-            if ((query_result == NODE_NEW) & (acl_action != 'leaf') & (acl_action != 'include')):
-                valid_neighbors.append(child)
+            if ((acl_action != 'leaf') & (acl_action != 'include') & (walk_child == 1)):
+                if (query_result == NODE_NEW):
+                    valid_neighbors.append(child)
+                elif ((reseen != None) and (child.discovered == 0)):
+                    reseen.append(child)
 
-        # discover the valid neighbors
-        for n in valid_neighbors:
-            self.__discover_node(n, depth+1)
+        with self.__lock:
+            # the links of this node are known now
+            self.ip_index.add_node(node)
+            self.__release_vbtbls(node)
 
+        return valid_neighbors
 
-    def __match_node_acl(self, ip, host, platform=None, software=None, serial=None):
-        for acl in self.config.discover_acl:
+
+    def __release_vbtbls(self, node):
+        '''
+        Apply config.memory.vbtbl_policy to the raw SNMP tables of a node
+        that has been parsed.  Once the process reaches max_memory_mb the
+        tables of every node are dropped, and dropped from then on.
+        '''
+        policy = self.config.memory.vbtbl_policy
+        max_mb = self.config.memory.max_memory_mb
+
+        if ((self.mem_exceeded == 0) & (max_mb > 0)):
+            rss = util.get_rss_mb()
+            if (rss > max_mb):
+                self.mem_exceeded = 1
+                if (self.verbose > 0):
+                    self.progress.message('Memory use %i MB is over %i MB, dropping cached SNMP tables' % (rss, max_mb))
+                for n in self.nodes:
+                    n.release_vbtbls(VBTBL_DROP)
+
+        if (self.mem_exceeded == 1):
+            policy = VBTBL_DROP
+
+        node.release_vbtbls(policy)
+
+
+    def __match_node_acl(self, ip, host, platform=None, software=None, serial=None, acls=None):
+        if (acls == None):
+            acls = self.config.discover_acl
+        for acl in acls:
             if (acl.type == 'ip'):
                 if (self.__match_ip(ip, acl.str)):
                     return acl.action
             elif (acl.type == 'host'):
-                if (self.__match_strpattern(host, acl.str)):
+                if ((host != None) and self.__match_strpattern(host, acl.str)):
                     return acl.action
             elif (acl.type == 'platform'):
                 if ((platform != None) and self.__match_strpattern(platform, acl.str)):
@@ -31,6 +31,34 @@ from .util          import *
 from .node_stack    import natlas_node_stack, natlas_node_stack_member
 from .node_vss      import natlas_node_vss,   natlas_node_vss_member
 from .mac           import natlas_mac
+from .table         import natlas_arp_table
+from .interface     import natlas_interface_table, IFTYPE_LOOPBACK
+
+# Stack and VSS details of a node that is neither.  These are shared by
+# every such node and must not be modified, a node that is queried gets
+# its own objects.
+NODE_STACK_NONE = natlas_node_stack()
+NODE_VSS_NONE   = natlas_node_vss()
+
+# What to do with the raw SNMP tables a node caches once they are parsed,
+# see natlas_node.release_vbtbls()
+VBTBL_KEEP      = 'keep'
+VBTBL_COMPACT   = 'compact'
+VBTBL_DROP      = 'drop'
+VBTBL_POLICIES  = [ VBTBL_KEEP, VBTBL_COMPACT, VBTBL_DROP ]
+
+# Read by natlas_node.get_change_stamp().  The first is sysUpTime, the
+# rest are the sysUpTime of the last change to a table.
+NODE_CHANGE_OIDS = [ OID_SYS_UPTIME, OID_IF_LAST_CHANGE, OID_LLDP_LAST_CHANGE, OID_ENT_LAST_CHANGE ]
+
+# Read with the first request to a node by natlas_node.try_snmp_creds(),
+# see natlas_node.make_fingerprint().
+NODE_FINGERPRINT_OIDS = [ OID_SYSNAME, OID_SYS_OBJECT_ID, OID_SNMP_ENGINE_ID,
+                          OID_SYS_SERIAL, OID_ENTPHYENTRY_SERIAL + '.1' ]
+
+NODE_VBTBL_ATTRS = ('cdp_vbtbl', 'ldp_vbtbl', 'lldp_vbtbl', 'link_type_vbtbl', 'lag_vbtbl',
+                    'vlan_vbtbl', 'svi_vbtbl', 'trk_allowed_vbtbl', 'trk_native_vbtbl',
+                    'vpc_vbtbl', 'vlans_vbtbl', 'vlandesc_vbtbl', 'arp_vbtbl')
 
 class natlas_node_link:
     '''
@@ -39,6 +67,12 @@ class natlas_node_link:
     and returned as natlas_node_link objects.
     '''
 
+    __slots__ = ('node', 'link_type', 'remote_ip', 'remote_name', 'vlan', 'local_native_vlan',
+                 'local_allowed_vlans', 'remote_native_vlan', 'remote_allowed_vlans',
+                 'local_port', 'remote_port', 'local_lag', 'remote_lag', 'local_lag_ips',
+                 'remote_lag_ips', 'local_if_ip', 'remote_if_ip', 'remote_platform',
+                 'remote_plat', 'remote_ios', 'remote_mac', 'discovered_proto')
+
     def __init__(self):
         # the linked node
         self.node                       = None
@@ -48,8 +82,8 @@ class natlas_node_link:
         self.remote_ip                  = None
         self.remote_name                = None
         self.vlan                       = None
-        self.local_native_vlan          = None
-        self.local_allowed_vlans        = None
+        self.local_native_vlan          = None     # int
+        self.local_allowed_vlans        = None     # VLAN bitmap, see util.parse_vlan_bitmap()
         self.remote_native_vlan         = None
         self.remote_allowed_vlans       = None
         self.local_port                 = None
@@ -61,6 +95,7 @@ class natlas_node_link:
         self.local_if_ip                = None
         self.remote_if_ip               = None
         self.remote_platform            = None
+        self.remote_plat                = None
         self.remote_ios                 = None
         self.remote_mac                 = None
         self.discovered_proto           = None
@@ -88,15 +123,41 @@ class natlas_node_link:
                 'remote_mac             = %s\n' \
                 'discovered_proto       = %s\n' \
                 % (self.link_type, self.remote_ip, self.remote_name, self.vlan, self.local_native_vlan,
-                    self.local_allowed_vlans, self.remote_native_vlan, self.remote_allowed_vlans,
+                    util.vlan_bitmap_to_str(self.local_allowed_vlans), self.remote_native_vlan,
+                    util.vlan_bitmap_to_str(self.remote_allowed_vlans),
                     self.local_port, self.remote_port, self.local_lag, self.remote_lag, self.local_lag_ips,
                     self.remote_lag_ips, self.local_if_ip, self.remote_if_ip, self.remote_platform, self.remote_ios,
                     self.remote_mac, self.discovered_proto))
     def __repr__(self):
         return ('<local_port="%s",remote_name="%s",remote_port="%s">' % (self.local_port, self.remote_name, self.remote_port))
 
+    def get_vlan_bitmap(self, universe=VLAN_BITMAP_ALL):
+        '''
+        Return the bitmap of the VLANs the link carries.
+        A trunk carries the VLANs of universe allowed on both of its ends,
+        other switched links their access VLAN, routed links none.
+        '''
+        if (self.link_type == '1'):
+            bitmap = universe
+            if (self.local_allowed_vlans != None):
+                bitmap &= self.local_allowed_vlans
+            if (self.remote_allowed_vlans != None):
+                bitmap &= self.remote_allowed_vlans
+            return bitmap
+        if (str(self.vlan).isdigit()):
+            return 1 << int(self.vlan)
+        return 0
+
+    def carries_vlan(self, vlan):
+        '''
+        Return True if the link carries the VLAN, see get_vlan_bitmap().
+        '''
+        return bool((self.get_vlan_bitmap() >> int(vlan)) & 1)
+
 
 class natlas_node_svi:
+    __slots__ = ('vlan', 'ip')
+
     def __init__(self, vlan):
         self.vlan   = vlan
         self.ip     = []
@@ -107,6 +168,8 @@ class natlas_node_svi:
 
 
 class natlas_node_lo:
+    __slots__ = ('name', 'ips')
+
     def __init__(self, name, ips):
         self.name = name.replace('Loopback', 'lo')
         self.ips = ips
@@ -117,6 +180,8 @@ class natlas_node_lo:
 
 
 class natlas_vlan:
+    __slots__ = ('id', 'name')
+
     def __init__(self, vid, name):
         self.id     = vid
         self.name   = name
@@ -126,6 +191,8 @@ class natlas_vlan:
         return self.__str__()
 
 class natlas_arp:
+    __slots__ = ('ip', 'mac', 'interf', 'arp_type')
+
     def __init__(self, ip, mac, interf, arp_type):
         self.ip         = ip
         self.mac        = mac
@@ -138,6 +205,11 @@ class natlas_arp:
 
 class natlas_node:
     class _node_opts:
+        __slots__ = ('get_name', 'get_ip', 'get_plat', 'get_ios', 'get_router', 'get_ospf_id',
+                     'get_bgp_las', 'get_hsrp_pri', 'get_hsrp_vip', 'get_serial', 'get_stack',
+                     'get_stack_details', 'get_vss', 'get_vss_details', 'get_svi', 'get_lo',
+                     'get_bootf', 'get_chassis_info', 'get_vpc', 'get_change_stamp')
+
         def __init__(self):
             self.reset()
 
@@ -161,6 +233,14 @@ class natlas_node:
             self.get_bootf          = setting
             self.get_chassis_info   = setting
             self.get_vpc            = setting
+            self.get_change_stamp   = setting
+
+    __slots__ = ('opts', 'snmpobj', 'links', 'discovered', 'name', 'ip', 'plat', 'ios', 'router',
+                 'ospf_id', 'bgp_las', 'hsrp_pri', 'hsrp_vip', 'serial', 'bootfile', 'svis',
+                 'loopbacks', 'vpc_peerlink_if', 'vpc_peerlink_node', 'vpc_domain', 'stack',
+                 'vss', 'interfaces', 'change_stamp', 'fingerprint', 'cdp_vbtbl', 'ldp_vbtbl', 'lldp_vbtbl', 'link_type_vbtbl',
+                 'lag_vbtbl', 'vlan_vbtbl', 'svi_vbtbl', 'trk_allowed_vbtbl', 'trk_native_vbtbl',
+                 'vpc_vbtbl', 'vlans_vbtbl', 'vlandesc_vbtbl', 'arp_vbtbl')
 
     def __init__(self, ip=None):
         self.opts               = natlas_node._node_opts()
@@ -183,22 +263,23 @@ class natlas_node:
         self.vpc_peerlink_if    = None
         self.vpc_peerlink_node  = None
         self.vpc_domain         = None
-        self.stack              = natlas_node_stack()
-        self.vss                = natlas_node_vss()
+        self.stack              = NODE_STACK_NONE
+        self.vss                = NODE_VSS_NONE
+        self.interfaces         = natlas_interface_table(self.snmpobj)
+        self.change_stamp       = None
+        self.fingerprint        = None
         
         self.cdp_vbtbl          = None
         self.ldp_vbtbl          = None
+        self.lldp_vbtbl         = None
         self.link_type_vbtbl    = None
         self.lag_vbtbl          = None
         self.vlan_vbtbl         = None
-        self.ifname_vbtbl       = None
-        self.ifip_vbtbl         = None
         self.svi_vbtbl          = None
-        self.ethif_vbtbl        = None
         self.trk_allowed_vbtbl  = None
         self.trk_native_vbtbl   = None
         self.vpc_vbtbl          = None
-        self.vlan_vbtbl         = None
+        self.vlans_vbtbl        = None
         self.vlandesc_vbtbl     = None
         self.arp_vbtbl          = None
 
@@ -238,19 +319,69 @@ class natlas_node:
         self.links.append(link)
 
 
+    def release_vbtbls(self, policy):
+        '''
+        Apply a retention policy to the raw SNMP tables cached by this node.
+
+        Args:
+            policy      VBTBL_KEEP    = leave the tables as they were walked
+                        VBTBL_COMPACT = replace them with natlas_oid_table's
+                        VBTBL_DROP    = release them, they are walked again
+                                        if a later lookup needs them
+        '''
+        if (policy == VBTBL_KEEP):
+            return
+        for a in NODE_VBTBL_ATTRS:
+            if (policy == VBTBL_DROP):
+                setattr(self, a, None)
+            else:
+                setattr(self, a, natlas_snmp.compact_vbtbl(getattr(self, a)))
+
+
     # find valid credentials for this node.
-    # try each known IP until one works
+    # try each known IP until one works.  The IP and community that
+    # worked before, eg saved in a snapshot, are tried first.
     def try_snmp_creds(self, snmp_creds):
         if (self.snmpobj.success == 0):
-            for ipaddr in self.ip:
+            ips = self.ip
+            if (self.snmpobj._ip in ips):
+                ips = [self.snmpobj._ip] + [ip for ip in ips if (ip != self.snmpobj._ip)]
+            if (self.snmpobj.v2_community != None):
+                hint = self.snmpobj.v2_community
+                snmp_creds = ([c for c in snmp_creds if (c.get('community') == hint)] +
+                              [c for c in snmp_creds if (c.get('community') != hint)])
+            for ipaddr in ips:
                 if ((ipaddr == '0.0.0.0') | (ipaddr == 'UNKNOWN') | (ipaddr == '')):
                     continue
                 self.snmpobj._ip = ipaddr
-                if (self.snmpobj.get_cred(snmp_creds) == 1):
+                vals = self.snmpobj.probe(snmp_creds, NODE_FINGERPRINT_OIDS, 1, 5)
+                if (vals != None):
+                    self.fingerprint = natlas_node.make_fingerprint(vals)
                     return 1
         return 0
 
 
+    def make_fingerprint(vals):
+        '''
+        Make the fingerprint of a node from the NODE_FINGERPRINT_OIDS
+        values.  Nodes with the same fingerprint are the same device,
+        even if they were reached by different IPs or have different
+        names in CDP and LLDP.
+
+        Returns:
+            Tuple of sysName, sysObjectID, snmpEngineID and serial.
+            None if the node has neither an engine ID nor a serial,
+            as the name alone may not be unique.
+        '''
+        # empty strings are as good as missing
+        name, objid, engine, serial, ent_serial = [v or None for v in vals]
+        if (serial == None):
+            serial = ent_serial
+        if ((name == None) | ((engine == None) & (serial == None))):
+            return None
+        return (name, objid, engine, serial)
+
+
     # Query this node.
     # Set .opts and .snmp_creds before calling.
     def query_node(self):
@@ -260,6 +391,11 @@ class natlas_node:
 
         snmpobj = self.snmpobj
 
+        # read before anything else so a change made while the node is
+        # being queried shows up the next time
+        if (self.opts.get_change_stamp == True):
+            self.change_stamp = self.get_change_stamp()
+
         if (self.opts.get_name == True):
             self.name = self.get_system_name([])
 
@@ -304,34 +440,20 @@ class natlas_node:
             if (self.svi_vbtbl == None):
                 self.svi_vbtbl          = snmpobj.get_bulk(OID_SVI_VLANIF)
 
-            if (self.ifip_vbtbl == None):
-                self.ifip_vbtbl         = snmpobj.get_bulk(OID_IF_IP)
-
-            for row in self.svi_vbtbl:
-                for n, v in row:
-                    n = str(n)
-                    vlan = n.split('.')[14]
-                    svi = natlas_node_svi(vlan)
-                    svi_ips = self.__get_cidrs_from_ifidx(v)
-                    svi.ip.extend(svi_ips)
-                    self.svis.append(svi)
+            for n, v in natlas_snmp.vbtbl_items(self.svi_vbtbl):
+                vlan = n.split('.')[14]
+                svi = natlas_node_svi(vlan)
+                svi_ips = self.__get_cidrs_from_ifidx(v)
+                svi.ip.extend(svi_ips)
+                self.svis.append(svi)
 
         # loopback
         if (self.opts.get_lo == True):
-            self.ethif_vbtbl = snmpobj.get_bulk(OID_ETH_IF)
-
-            if (self.ifip_vbtbl == None):
-                self.ifip_vbtbl = snmpobj.get_bulk(OID_IF_IP)
-
-            for row in self.ethif_vbtbl:
-                for n, v in row:
-                    n = str(n)
-                    if (n.startswith(OID_ETH_IF_TYPE) & (v == 24)):
-                        ifidx = n.split('.')[10]
-                        lo_name = snmpobj.cache_lookup(self.ethif_vbtbl, OID_ETH_IF_DESC + '.' + ifidx)
-                        lo_ips = self.__get_cidrs_from_ifidx(ifidx)
-                        lo = natlas_node_lo(lo_name, lo_ips)
-                        self.loopbacks.append(lo)
+            for intf in self.interfaces.get_by_type(IFTYPE_LOOPBACK):
+                lo_name = self.interfaces.get_descr(intf.ifidx)
+                lo_ips = self.__get_cidrs_from_ifidx(intf.ifidx)
+                lo = natlas_node_lo(lo_name, lo_ips)
+                self.loopbacks.append(lo)
 
         # bootfile
         if (self.opts.get_bootf):
@@ -343,28 +465,64 @@ class natlas_node:
 
         # VPC peerlink
         if (self.opts.get_vpc):
-            self.vpc_domain, self.vpc_peerlink_if = self.__get_vpc_info(self.ethif_vbtbl)
+            self.vpc_domain, self.vpc_peerlink_if = self.__get_vpc_info()
             
         # reset the get options
         self.opts.reset()
         return 1
 
 
-    def __get_cidrs_from_ifidx(self, ifidx):
-        ips = []
+    def get_change_stamp(self):
+        '''
+        Read the values that change when the neighbors, interfaces or
+        hardware of this node change.
+
+        Returns:
+            List of strings, see NODE_CHANGE_OIDS, with None for any
+            the node does not support.  None if the node did not answer.
+        '''
+        return self.snmpobj.get_vals(NODE_CHANGE_OIDS)
+
+
+    def get_change_stamp_and_name(self, domains):
+        '''
+        Same as get_change_stamp() but also read the system name in the
+        same request.
+
+        Returns:
+            (change stamp, shortened system name), (None, None) if the
+            node did not answer.
+        '''
+        vals = self.snmpobj.get_vals(NODE_CHANGE_OIDS + [OID_SYSNAME])
+        if (vals == None):
+            return (None, None)
+        return (vals[:-1], util.shorten_host_name(vals[-1], domains))
+
+
+    def stamp_changed(old, new):
+        '''
+        Compare two values of get_change_stamp().
+        Returns 1 if the node may have changed between them, 0 if not.
+
+        A node that rebooted, or that supports none of the last change
+        values, is always treated as changed.
+        '''
+        if ((old == None) | (new == None)):
+            return 1
+        if (len(old) != len(new)):
+            return 1
+        try:
+            if (int(new[0]) < int(old[0])):
+                return 1
+        except (TypeError, ValueError):
+            return 1
+        if (new[1:].count(None) == len(new) - 1):
+            return 1
+        return 0 if (old[1:] == new[1:]) else 1
+
 
-        for ifrow in self.ifip_vbtbl:
-            for ifn, ifv in ifrow:
-                ifn = str(ifn)
-                if (ifn.startswith(OID_IF_IP_ADDR)):
-                    if (str(ifv) == str(ifidx)):
-                        t = ifn.split('.')
-                        ip = ".".join(t[10:])
-                        mask = self.snmpobj.cache_lookup(self.ifip_vbtbl, OID_IF_IP_NETM + ip)
-                        nbits = util.get_net_bits_from_mask(mask)
-                        cidr = '%s/%i' % (ip, nbits)
-                        ips.append(cidr)
-        return ips
+    def __get_cidrs_from_ifidx(self, ifidx):
+        return self.interfaces.get_cidrs(ifidx)
 
 
     def __cache_common_mibs(self):
@@ -377,8 +535,7 @@ class natlas_node:
         if (self.vlan_vbtbl == None):
             self.vlan_vbtbl = self.snmpobj.get_bulk(OID_IF_VLAN)
 
-        if (self.ifname_vbtbl == None):
-            self.ifname_vbtbl = self.snmpobj.get_bulk(OID_IFNAME)
+        self.interfaces.load_names()
 
         if (self.trk_allowed_vbtbl == None):
             self.trk_allowed_vbtbl = self.snmpobj.get_bulk(OID_TRUNK_ALLOW)
@@ -386,8 +543,7 @@ class natlas_node:
         if (self.trk_native_vbtbl == None):
             self.trk_native_vbtbl = self.snmpobj.get_bulk(OID_TRUNK_NATIVE)
 
-        if (self.ifip_vbtbl == None):
-            self.ifip_vbtbl = self.snmpobj.get_bulk(OID_IF_IP)
+        self.interfaces.load_cidrs()
 
 
     #
@@ -402,7 +558,7 @@ class natlas_node:
         # get list of CDP neighbors
         self.cdp_vbtbl = snmpobj.get_bulk(OID_CDP)
         if (self.cdp_vbtbl == None):
-            print('No CDP Neighbors Found.')
+            natlas_snmp.report_error('No CDP Neighbors Found.')
             return []
 
         # cache some common MIB trees
@@ -432,6 +588,7 @@ class natlas_node:
 
                 # get remote platform
                 rplat = snmpobj.cache_lookup(self.cdp_vbtbl, OID_CDP_DEVPLAT + '.' + ifidx + '.' + ifidx2)
+                rplat = util.intern_str(rplat)
 
                 # get IOS version
                 rios = snmpobj.cache_lookup(self.cdp_vbtbl, OID_CDP_IOS + '.' + ifidx + '.' + ifidx2)
@@ -467,69 +624,93 @@ class natlas_node:
 
         self.lldp_vbtbl = snmpobj.get_bulk(OID_LLDP)
         if (self.lldp_vbtbl == None):
-            print('No LLDP Neighbors Found.')
+            natlas_snmp.report_error('No LLDP Neighbors Found.')
             return []
 
         self.__cache_common_mibs()
 
-        for row in self.lldp_vbtbl:
-            for name, val in row:
-                name = str(name)
-                if (name.startswith(OID_LLDP_TYPE) == 0):
-                    continue
-
-                t = name.split('.')
-                ifidx = t[12]
-                ifidx2 = t[13]
-
-                rip = ''
-                for r in self.lldp_vbtbl:
-                    for     n, v in r:
-                        n = str(n)
-                        if (n.startswith(OID_LLDP_DEVADDR + '.' + ifidx + '.' + ifidx2)):
-                            t2 = n.split('.')
-                            rip = '.'.join(t2[16:])
-
+        for (ifidx, ifidx2), rem in self.__parse_lldp_table(self.lldp_vbtbl).items():
+            lport = self.__get_ifname(ifidx)
 
-                lport = self.__get_ifname(ifidx)
+            rport = self.shorten_port_name(rem.get(OID_LLDP_DEVPORT))
 
-                rport = snmpobj.cache_lookup(self.lldp_vbtbl, OID_LLDP_DEVPORT + '.' + ifidx + '.' + ifidx2)
-                rport = self.shorten_port_name(rport)
+            devid = rem.get(OID_LLDP_DEVID)
+            try:
+                mac_seg = [devid[x:x+4] for x in range(2, len(devid), 4)]
+                devid = '.'.join(mac_seg)
+            except:
+                pass
 
-                devid = snmpobj.cache_lookup(self.lldp_vbtbl, OID_LLDP_DEVID + '.' + ifidx + '.' + ifidx2)
+            rimg = rem.get(OID_LLDP_DEVDESC)
+            if (rimg != None):
                 try:
-                    mac_seg = [devid[x:x+4] for x in xrange(2, len(devid), 4)]
-                    devid = '.'.join(mac_seg)
+                    rimg = binascii.unhexlify(rimg[2:])
                 except:
                     pass
+                rimg = self.__format_ios_ver(rimg)
 
-                rimg = snmpobj.cache_lookup(self.lldp_vbtbl, OID_LLDP_DEVDESC + '.' + ifidx + '.' + ifidx2)
-                if (rimg != None):
-                    try:
-                        rimg = binascii.unhexlify(rimg[2:])
-                    except:
-                        pass
-                    rimg = self.__format_ios_ver(rimg)
-
-                name = snmpobj.cache_lookup(self.lldp_vbtbl, OID_LLDP_DEVNAME + '.' + ifidx + '.' + ifidx2)
-                if ((name == None) | (name == '')):
-                    name = devid
+            name = rem.get(OID_LLDP_DEVNAME)
+            if ((name == None) | (name == '')):
+                name = devid
 
-                link                  = self.__get_node_link_info(ifidx, ifidx2)
-                link.remote_ip        = rip
-                link.remote_name      = name
-                link.discovered_proto = 'lldp'
-                link.local_port       = lport
-                link.remote_port      = rport
-                link.remote_plat      = None
-                link.remote_ios       = rimg
-                link.remote_mac       = devid
+            link                  = self.__get_node_link_info(ifidx, ifidx2)
+            link.remote_ip        = rem.get(OID_LLDP_DEVADDR, '')
+            link.remote_name      = name
+            link.discovered_proto = 'lldp'
+            link.local_port       = lport
+            link.remote_port      = rport
+            link.remote_plat      = None
+            link.remote_ios       = rimg
+            link.remote_mac       = devid
 
-                neighbors.append(link)
+            neighbors.append(link)
 
         return neighbors
 
 
+    def __parse_lldp_table(self, vbtbl):
+        '''
+        Parse the LLDP remote tables in one pass.
+
+        Returns:
+            dict of (localPort, remIndex) -> {column OID -> value}, in table order.
+            Only neighbors with an OID_LLDP_TYPE row are returned.  The
+            management address, if any, is under OID_LLDP_DEVADDR; if a
+            neighbor advertises more than one the last one is used.
+        '''
+        columns = (OID_LLDP_TYPE, OID_LLDP_DEVID, OID_LLDP_DEVPORT, OID_LLDP_DEVNAME, OID_LLDP_DEVDESC)
+
+        rems  = {}
+        addrs = {}
+        for row in vbtbl:
+            for n, v in row:
+                # lldpRemTable:        <column>.<timeMark>.<localPort>.<remIndex>
+                # lldpRemManAddrTable: <column>.<timeMark>.<localPort>.<remIndex>.<subtype>.<len>.<addr>
+                t = str(n).split('.')
+                if (len(t) < 14):
+                    continue
+                column = '.'.join(t[:12])
+                key    = (t[12], t[13])
+
+                if (column == OID_LLDP_DEVADDR):
+                    addrs[key] = '.'.join(t[16:])
+                elif (column in columns):
+                    rem = rems.get(key)
+                    if (rem == None):
+                        rem = rems[key] = {}
+                    rem[column] = v.prettyPrint()
+
+        ret = {}
+        for key, rem in rems.items():
+            if (OID_LLDP_TYPE not in rem):
+                continue
+            if (key in addrs):
+                rem[OID_LLDP_DEVADDR] = addrs[key]
+            ret[key] = rem
+
+        return ret
+
+
     def __get_node_link_info(self, ifidx, ifidx2):
         snmpobj = self.snmpobj
 
@@ -537,12 +718,15 @@ class natlas_node:
         link_type = snmpobj.cache_lookup(self.link_type_vbtbl, OID_TRUNK_VTP + '.' + ifidx)
 
         native_vlan = None
-        allowed_vlans = 'All'
+        allowed_vlans = VLAN_BITMAP_ALL
         if (link_type == '1'):
             native_vlan = snmpobj.cache_lookup(self.trk_native_vbtbl, OID_TRUNK_NATIVE + '.' + ifidx)
+            native_vlan = int(native_vlan) if ((native_vlan or '').isdigit()) else None
 
             allowed_vlans = snmpobj.cache_lookup(self.trk_allowed_vbtbl, OID_TRUNK_ALLOW + '.' + ifidx)
-            allowed_vlans = self.__parse_allowed_vlans(allowed_vlans)
+            allowed_vlans = util.parse_vlan_bitmap(allowed_vlans)
+            if (allowed_vlans == None):
+                allowed_vlans = VLAN_BITMAP_ALL
 
         # get LAG membership
         lag = snmpobj.cache_lookup(self.lag_vbtbl, OID_LAG_LACP + '.' + ifidx)
@@ -557,7 +741,7 @@ class natlas_node:
 
         link                        = natlas_node_link()
         link.link_type              = link_type
-        link.vlan                   = vlan
+        link.vlan                   = util.intern_str(vlan)
         link.local_native_vlan      = native_vlan
         link.local_allowed_vlans    = allowed_vlans
         link.local_lag              = lag_ifname
@@ -568,53 +752,6 @@ class natlas_node:
         return link
 
 
-    def __parse_allowed_vlans(self, allowed_vlans):
-        if (allowed_vlans.startswith('0x') == False):
-            return 'All'
-
-        ret = ''
-        group = 0
-        op = 0
-
-        for i in range(2, len(allowed_vlans)):
-            v = int(allowed_vlans[i], 16)
-            for b in range(0, 4):
-                a = v & (0x1 << (3 - b))
-                vlan = ((i-2)*4)+b
-
-                if (a):
-                    if (op == 1):
-                        group += 1
-                    else:
-                        if (len(ret)):
-                            if (group > 1):
-                                ret += '-'
-                                ret += str(vlan - 1) if vlan else '1'
-                            else:
-                                ret += ',%i' % vlan
-                        else:
-                            ret += str(vlan)
-                        group = 0
-                        op = 1
-                else:
-                    if (op == 1):
-                        if (len(ret)):
-                            if (group > 1):
-                                ret += '-%i' % (vlan - 1)
-                        op = 0
-                    group = 0
-
-        if (op):
-            if (ret == '1'):
-                return 'All'
-            if (group):
-                ret += '-1001'
-            else:
-                ret += ',1001'
-
-        return ret if len(ret) else 'All'
-
-
     def __get_chassis_info(self):
         # Get:
         #    Serial number
@@ -649,7 +786,7 @@ class natlas_node:
                 idx = t[12]
 
                 if (self.opts.get_serial):  self.serial = snmpobj.cache_lookup(serial_vbtbl, OID_ENTPHYENTRY_SERIAL + '.' + idx)
-                if (self.opts.get_plat):    self.plat   = snmpobj.cache_lookup(platf_vbtbl, OID_ENTPHYENTRY_PLAT + '.' + idx)
+                if (self.opts.get_plat):    self.plat   = util.intern_str(snmpobj.cache_lookup(platf_vbtbl, OID_ENTPHYENTRY_PLAT + '.' + idx))
                 if (self.opts.get_ios):     self.ios    = snmpobj.cache_lookup(ios_vbtbl, OID_ENTPHYENTRY_SOFTWARE + '.' + idx)
 
         if (self.opts.get_ios):
@@ -677,13 +814,7 @@ class natlas_node:
     def __get_ifname(self, ifidx):
         if ((ifidx == None) | (ifidx == OID_ERR)):
             return 'UNKNOWN'
-        if (self.ifname_vbtbl == None):
-            self.ifname_vbtbl = self.snmpobj.get_bulk(OID_IFNAME)
-
-        str = self.snmpobj.cache_lookup(self.ifname_vbtbl, OID_IFNAME + '.' + ifidx)
-        str = self.shorten_port_name(str)
-
-        return str or 'UNKNOWN'
+        return self.interfaces.get_short_name(ifidx) or 'UNKNOWN'
 
 
     def get_system_name(self, domains):
@@ -705,10 +836,10 @@ class natlas_node:
 
         if (img_s):
             if (img_s.group(1) == 'CCM:'):
-                return 'CCM %s' % img_s.group(2)
-            return img_s.group(2)
+                return util.intern_str('CCM %s' % img_s.group(2))
+            return util.intern_str(img_s.group(2))
 
-        return img
+        return util.intern_str(img)
 
     def get_ipaddr(self):
         '''
@@ -736,7 +867,7 @@ class natlas_node:
         return ''
 
 
-    def __get_vpc_info(self, ifarr):
+    def __get_vpc_info(self):
         '''
         If VPC is enabled,
         Return the VPC domain and interface name of the VPC peerlink.
@@ -745,70 +876,65 @@ class natlas_node:
             self.vpc_vbtbl = self.snmpobj.get_bulk(OID_VPC_PEERLINK_IF)
         if ((self.vpc_vbtbl == None) | (len(self.vpc_vbtbl) == 0)):
             return (None, None)
-        domain = natlas_snmp.get_last_oid_token(self.vpc_vbtbl[0][0][0])
-        ifidx  = str(self.vpc_vbtbl[0][0][1])
-        ifname = self.snmpobj.cache_lookup(ifarr, OID_ETH_IF_DESC + '.' + ifidx)
-        ifname = self.shorten_port_name(ifname)
+        n, ifidx = next(natlas_snmp.vbtbl_items(self.vpc_vbtbl))
+        domain = int(n.split('.')[-1])
+        ifname = self.shorten_port_name(self.interfaces.get_descr(ifidx))
         return (domain, ifname)
 
     def get_vlans(self):
         # use cache if possible
-        if (self.vlan_vbtbl == None):
-            self.vlan_vbtbl     = self.snmpobj.get_bulk(OID_VLANS)
+        if (self.vlans_vbtbl == None):
+            self.vlans_vbtbl    = self.snmpobj.get_bulk(OID_VLANS)
         if (self.vlandesc_vbtbl == None):
             self.vlandesc_vbtbl = self.snmpobj.get_bulk(OID_VLAN_DESC)
         arr = []
+        if (self.vlans_vbtbl == None):
+            return arr
+        descs = [v for n, v in natlas_snmp.vbtbl_items(self.vlandesc_vbtbl)]
         i = 0
-        for vlan_row in self.vlan_vbtbl:
-            for vlan_n, vlan_v in vlan_row:
-                # get VLAN ID from OID
-                vlan = natlas_snmp.get_last_oid_token(vlan_n)
-                if (vlan >= 1002):
-                    continue
-                arr.append(natlas_vlan(vlan, str(self.vlandesc_vbtbl[i][0][1])))
-                i = i + 1
+        for vlan_n, vlan_v in natlas_snmp.vbtbl_items(self.vlans_vbtbl):
+            # get VLAN ID from OID
+            vlan = int(vlan_n.split('.')[-1])
+            if (vlan >= 1002):
+                continue
+            arr.append(natlas_vlan(vlan, descs[i]))
+            i = i + 1
         return arr
 
     def get_arp_table(self):
+        '''
+        Return the ARP table of this node as a natlas_arp_table.
+        '''
         # use cache if possible
         if (self.arp_vbtbl == None):
             self.arp_vbtbl = self.snmpobj.get_bulk(OID_ARP)
-        arr = []
-        for r in self.arp_vbtbl:
-            for n, v in r:
-                n = str(n)
-                if (n.startswith(OID_ARP_VLAN)):
-                    tok    = n.split('.')
-                    ip     = '.'.join(tok[11:])
-                    interf = self.__get_ifname(str(v))
-                    mach   = self.snmpobj.cache_lookup(self.arp_vbtbl, OID_ARP_MAC+'.'+str(v)+'.'+ip)
-                    mac    = natlas_mac.mac_hex_to_ascii(mach, 1) 
-                    atype  = self.snmpobj.cache_lookup(self.arp_vbtbl, OID_ARP_TYPE+'.'+str(v)+'.'+ip)
-
-                    atype = int(atype)
-                    type_str = 'unknown'
-                    if   (atype == ARP_TYPE_OTHER):     type_str = 'other'
-                    elif (atype == ARP_TYPE_INVALID):   type_str = 'invalid'
-                    elif (atype == ARP_TYPE_DYNAMIC):   type_str = 'dynamic'
-                    elif (atype == ARP_TYPE_STATIC):    type_str = 'static'
-
-                    arr.append(natlas_arp(ip, mac, interf, type_str))
-        return arr if arr else []
+        arr = natlas_arp_table()
+        if (self.arp_vbtbl == None):
+            return arr
+
+        # one pass to map OID -> value, a raw table would be scanned
+        # for the MAC and type of every row
+        tbl = natlas_snmp.compact_vbtbl(self.arp_vbtbl)
+        for n, v in tbl.items():
+            if (n.startswith(OID_ARP_VLAN)):
+                tok    = n.split('.')
+                ip     = '.'.join(tok[11:])
+                interf = self.__get_ifname(v)
+                mach   = tbl.get(OID_ARP_MAC+'.'+v+'.'+ip)
+                mac    = natlas_mac.mac_hex_to_ascii(mach, 1) 
+                atype  = tbl.get(OID_ARP_TYPE+'.'+v+'.'+ip)
+
+                atype = int(atype)
+                type_str = 'unknown'
+                if   (atype == ARP_TYPE_OTHER):     type_str = 'other'
+                elif (atype == ARP_TYPE_INVALID):   type_str = 'invalid'
+                elif (atype == ARP_TYPE_DYNAMIC):   type_str = 'dynamic'
+                elif (atype == ARP_TYPE_STATIC):    type_str = 'static'
+
+                arr.append(ip, mac, interf, type_str)
+        return arr
 
 
     def shorten_port_name(self, port):
-        if (port == OID_ERR):
-            return 'UNKNOWN'
-
-        if (port != None):
-            port = port.replace('TenGigabitEthernet', 'te')
-            port = port.replace('GigabitEthernet', 'gi')
-            port = port.replace('FastEthernet', 'fa')
-            port = port.replace('port-channel', 'po')
-            port = port.replace('Te', 'te')
-            port = port.replace('Gi', 'gi')
-            port = port.replace('Fa', 'fa')
-            port = port.replace('Po', 'po')
-
-        return port
+        return util.shorten_port_name(port)
 
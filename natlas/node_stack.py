@@ -30,6 +30,7 @@ import sys
 
 
 class natlas_node_stack_member:
+    __slots__ = ('opts', 'num', 'role', 'pri', 'mac', 'img', 'serial', 'plat')
 
     def __init__(self):
         self.opts   = None
@@ -48,6 +49,7 @@ class natlas_node_stack_member:
 
 
 class natlas_node_stack:
+    __slots__ = ('members', 'count', 'enabled', 'opts')
 
     def __init__(self, snmpobj = None, opts = None):
         self.members = []
@@ -30,6 +30,8 @@ from .util import *
 
 
 class natlas_node_vss_member:
+    __slots__ = ('opts', 'ios', 'serial', 'plat')
+
     def __init__(self):
         self.opts   = None
         self.ios    = None
@@ -43,8 +45,10 @@ class natlas_node_vss_member:
 
 
 class natlas_node_vss:
+    __slots__ = ('members', 'enabled', 'domain', 'opts')
+
     def __init__(self, snmpobj = None, opts = None):
-        self.members = [ natlas_node_vss_member(), natlas_node_vss_member() ]
+        self.members = []           # both chassis once VSS is enabled
         self.enabled = 0
         self.domain = None
         self.opts = opts
@@ -63,6 +67,8 @@ class natlas_node_vss:
         if (self.enabled == 0):
             return
 
+        self.members = [ natlas_node_vss_member(), natlas_node_vss_member() ]
+
         if (self.opts == None):
             return
 
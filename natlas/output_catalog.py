@@ -27,6 +27,7 @@
 from .config import natlas_config
 from .network import natlas_network
 from .output import natlas_output
+from .output_csv import natlas_output_csv
 from ._version import __version__
 
 
@@ -38,8 +39,9 @@ class natlas_output_catalog:
         self.config  = network.config
 
     def generate(self, filename):
+        f = natlas_output_csv(filename)
         try:
-            f = open(filename, 'w')
+            f.open()
         except:
             print('Unable to open catalog file "%s"' % filename)
             return
@@ -56,17 +58,17 @@ class natlas_output_catalog:
                 for smem in n.stack.members:
                     serial = smem.serial or 'NOT CONFIGURED TO POLL'
                     plat   = smem.plat or 'NOT CONFIGURED TO POLL'
-                    f.write('"%s","%s","%s","%s","%s","STACK","%s"\n' % (n.name, n.ip[0], plat, n.ios, serial, n.bootfile))
+                    f.write_row([n.name, n.ip[0], plat, n.ios, serial, 'STACK', n.bootfile])
             elif (n.vss.enabled != 0):
                 #vss
                 for i in range(0, 2):
                     serial = n.vss.members[i].serial
                     plat   = n.vss.members[i].plat
                     ios    = n.vss.members[i].ios
-                    f.write('"%s","%s","%s","%s","%s","VSS","%s"\n' % (n.name, n.ip[0], plat, ios, serial, n.bootfile))
+                    f.write_row([n.name, n.ip[0], plat, ios, serial, 'VSS', n.bootfile])
             else:
                 # stand alone
-                f.write('"%s","%s","%s","%s","%s","","%s"\n' % (n.name, n.ip[0], n.plat, n.ios, n.serial, n.bootfile))
+                f.write_row([n.name, n.ip[0], n.plat, n.ios, n.serial, '', n.bootfile])
 
         f.close()
 
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        output_csv.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+import csv
+import gzip
+
+from .output import natlas_output
+
+
+class natlas_output_csv:
+    '''
+    Streaming CSV writer.
+
+    Rows are written to the file as soon as they are given to write_row(),
+    nothing is buffered beyond the file object itself.  All fields are
+    quoted and embedded quotes are escaped by the csv module.
+
+    If the file name ends with .gz the output is gzip compressed.
+    '''
+
+    def __init__(self, filename, colnames=None):
+        natlas_output.__init__(self)
+        self.type       = 'csv'
+        self.filename   = filename
+        self.colnames   = colnames
+        self.rows       = 0
+        self.__fd       = None
+        self.__writer   = None
+
+    def __str__(self):
+        return ('<filename="%s", rows=%i>' % (self.filename, self.rows))
+    def __repr__(self):
+        return self.__str__()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        if (self.filename.endswith('.gz')):
+            self.__fd = gzip.open(self.filename, 'wt', newline='')
+        else:
+            self.__fd = open(self.filename, 'w', newline='')
+        self.__writer = csv.writer(self.__fd, quoting=csv.QUOTE_ALL)
+        if (self.colnames != None):
+            self.__writer.writerow(self.colnames)
+
+    def write_row(self, row):
+        self.__writer.writerow(['' if (v == None) else v for v in row])
+        self.rows += 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def close(self):
+        if (self.__fd != None):
+            self.__fd.close()
+            self.__fd = None
+            self.__writer = None
@@ -51,6 +51,7 @@ class natlas_output_diagram:
         natlas_output.__init__(self)
         self.network = network
         self.config  = network.config
+        self.__unexplored = set()
 
     def generate(self, dot_file, title):
         self.network.reset_discovered()
@@ -93,6 +94,7 @@ class natlas_output_diagram:
         )
 
         # add all of the nodes and links
+        self.__unexplored = set([id(n) for n in self.network.unexplored])
         self.__generate(diagram, self.network.root_node)
 
 
@@ -109,11 +111,50 @@ class natlas_output_diagram:
                 print('Created diagram: %s' % f)
 
 
-    def __generate(self, diagram, node):
+    def __generate(self, diagram, root):
+        '''
+        Add the root node and everything linked to it to the diagram.
+
+        The walk is depth first.  A node is added before its links, and
+        each link after the nodes behind it.  It keeps an explicit stack
+        rather than recursing so long chains of nodes do not hit the
+        Python recursion limit.
+        '''
+        if (self.__add_node(diagram, root) == 0):
+            return
+
+        # [node, index of the next link, LAGs drawn, 1 if the node behind the link was added]
+        stack = [[root, 0, [], 0]]
+        while (len(stack)):
+            frame = stack[-1]
+            node, i, lags, child_added = frame
+            if (i >= len(node.links)):
+                stack.pop()
+                continue
+
+            link = node.links[i]
+            if (child_added == 0):
+                frame[3] = 1
+                if (self.__add_node(diagram, link.node) == 1):
+                    stack.append([link.node, 0, [], 0])
+                continue
+
+            frame[1] = i + 1
+            frame[3] = 0
+            self.__add_node_link(diagram, node, link, lags)
+
+
+    def __add_node(self, diagram, node):
+        '''
+        Add a node to the diagram if it has not been added yet.
+
+        Returns:
+            1 if the node was added, 0 if not.
+        '''
         if (node == None):
-            return (0, 0)
+            return 0
         if (node.discovered > 0):
-            return (0, 0)
+            return 0
         node.discovered = 1
 
         dot_node = self.__get_node(diagram, node)
@@ -208,33 +249,38 @@ class natlas_output_diagram:
                 )
             diagram.add_subgraph(cluster)
 
-        lags = []
-        for link in node.links:
-            self.__generate(diagram, link.node)
-
-            # determine if this link should be broken out or not
-            expand_lag = 0
-            if (self.config.diagram.expand_lag == 1):
-                expand_lag = 1
-            elif (link.local_lag == 'UNKNOWN'):
-                expand_lag = 1
-            elif (self.__does_lag_span_devs(link.local_lag, node.links) > 1):
-                # a LAG could span different devices, eg Nexus.
-                # in this case we should always break it out, otherwise we could
-                # get an unlinked node in the diagram.
-                expand_lag = 1
-
-            if (expand_lag == 1):
-                self.__create_link(diagram, node, link, 0)
-            else:
-                found = 0
-                for lag in lags:
-                    if (link.local_lag == lag):
-                        found = 1
-                        break
-                if (found == 0):
-                    lags.append(link.local_lag)
-                    self.__create_link(diagram, node, link, 1)
+        return 1
+
+
+    def __add_node_link(self, diagram, node, link, lags):
+        '''
+        Add a link of a node to the diagram.  Members of a LAG are drawn
+        as one link unless expand_lag is set, lags is the list of the
+        LAGs of the node that have been drawn.
+        '''
+        # determine if this link should be broken out or not
+        expand_lag = 0
+        if (self.config.diagram.expand_lag == 1):
+            expand_lag = 1
+        elif (link.local_lag == 'UNKNOWN'):
+            expand_lag = 1
+        elif (self.__does_lag_span_devs(link.local_lag, node.links) > 1):
+            # a LAG could span different devices, eg Nexus.
+            # in this case we should always break it out, otherwise we could
+            # get an unlinked node in the diagram.
+            expand_lag = 1
+
+        if (expand_lag == 1):
+            self.__create_link(diagram, node, link, 0)
+        else:
+            found = 0
+            for lag in lags:
+                if (link.local_lag == lag):
+                    found = 1
+                    break
+            if (found == 0):
+                lags.append(link.local_lag)
+                self.__create_link(diagram, node, link, 1)
 
 
     def __get_node(self, diagram, node):
@@ -270,6 +316,10 @@ class natlas_output_diagram:
         if (node.router == 1):
             dot_node.shape = 'diamond'
 
+        if (id(node) in self.__unexplored):
+            # left as a leaf when the time budget ran out
+            dot_node.style = 'dashed'
+
         return dot_node
 
 
@@ -348,11 +398,11 @@ class natlas_output_diagram:
                 link_label += '\nNative P:%s C:%s' % (link.local_native_vlan, link.remote_native_vlan)
 
             if (link.local_allowed_vlans == link.remote_allowed_vlans):
-                link_label += '\nAllowed %s' % link.local_allowed_vlans
+                link_label += '\nAllowed %s' % util.vlan_bitmap_to_str(link.local_allowed_vlans)
             else:
-                link_label += '\nAllowed P:%s' % link.local_allowed_vlans
+                link_label += '\nAllowed P:%s' % util.vlan_bitmap_to_str(link.local_allowed_vlans)
                 if (link.remote_allowed_vlans != None):
-                    link_label += '\nAllowed C:%s' % link.remote_allowed_vlans
+                    link_label += '\nAllowed C:%s' % util.vlan_bitmap_to_str(link.remote_allowed_vlans)
         elif (link.link_type is None):
             # Routed = Bold/Red
             link_color = 'red'
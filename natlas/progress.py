@@ -0,0 +1,255 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        progress.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+
+import sys
+import json
+import time
+import threading
+
+from timeit import default_timer as timer
+
+# seconds between refreshes of the throttled reporters
+PROGRESS_TTY_INTERVAL   = 0.1
+PROGRESS_JSON_INTERVAL  = 1.0
+
+class natlas_progress:
+    '''
+    Progress reporter of a discovery or MAC table walk.  This one is
+    quiet, it only keeps the counts.  See natlas_progress.create() for
+    the others.
+
+    Progress is reported as counters, eg nodes, failed, details, macs,
+    that are added to as the work is done.  The text of add() is only
+    used by natlas_progress_text, which writes it as is, so the callers
+    format the classic output and the other reporters can ignore it.
+    Callers add in batches, eg once per VLAN rather than once per MAC,
+    so no reporter does I/O per entry.  The throttled reporters also
+    refresh from a timer thread, see start_timer(), so they keep
+    updating while a single long SNMP walk adds nothing.
+    '''
+
+    def __init__(self, out=None):
+        self.out        = out if (out != None) else sys.stdout
+        self.phase      = None
+        self.total      = None
+        self.counts     = {}
+        self.start_time = timer()
+        self.lock       = threading.RLock()     # held while writing
+        self.__timer    = None
+
+    def __str__(self):
+        return ('<phase=%s, total=%s, counts=%s>' % (self.phase, self.total, self.counts))
+    def __repr__(self):
+        return self.__str__()
+
+    def create(kind, out=None):
+        '''
+        Return a new reporter.
+
+        Args:
+            kind        'quiet'     no output
+                        'text'      a line per node, the classic output
+                        'tty'       a status line refreshed in place
+                        'json'      JSON lines of the counts, once a second
+            out         File to write to (default: sys.stdout)
+        '''
+        if (kind == 'quiet'):   return natlas_progress(out)
+        if (kind == 'text'):    return natlas_progress_text(out)
+        if (kind == 'tty'):     return natlas_progress_tty(out)
+        if (kind == 'json'):    return natlas_progress_json(out)
+        raise ValueError('Invalid progress reporter "%s"' % kind)
+
+    def start(self, phase, total=None):
+        '''
+        Start a phase of the work, eg 'discover' or 'details', with
+        total steps if known.  The counts are kept across phases.
+        '''
+        self.phase = phase
+        self.total = total
+        self.refresh(True)
+
+    def add(self, counter, n=1, text=None):
+        '''
+        Add n to a counter.  text is written by natlas_progress_text.
+        '''
+        self.counts[counter] = self.counts.get(counter, 0) + n
+        self.refresh()
+
+    def message(self, text):
+        '''
+        Report a line of text, eg a summary.
+        '''
+        return
+
+    def finish(self):
+        '''
+        End the phase and report the final counts.
+        '''
+        self.refresh(True)
+
+    def refresh(self, force=False):
+        return
+
+    def start_timer(self, interval):
+        '''
+        Call refresh() every interval seconds from a daemon thread until
+        stop_timer().  Does nothing if the timer is already running.
+        '''
+        if (self.__timer != None):
+            return
+        stop = threading.Event()
+        t = threading.Thread(target=self.__tick, args=(stop, interval), name='natlas-progress')
+        t.daemon = True
+        self.__timer = (t, stop)
+        t.start()
+
+    def stop_timer(self):
+        '''
+        Stop the thread of start_timer() and wait for it to exit.
+        Must not be called with self.lock held.
+        '''
+        if (self.__timer == None):
+            return
+        t, stop = self.__timer
+        self.__timer = None
+        stop.set()
+        t.join()
+
+    def __tick(self, stop, interval):
+        while (stop.wait(interval) == False):
+            self.refresh()
+
+
+class natlas_progress_text(natlas_progress):
+    def add(self, counter, n=1, text=None):
+        self.counts[counter] = self.counts.get(counter, 0) + n
+        if (text != None):
+            self.out.write(text)
+            self.out.flush()
+
+    def message(self, text):
+        self.out.write(text + '\n')
+        self.out.flush()
+
+
+class natlas_progress_tty(natlas_progress):
+    '''
+    A status line rewritten in place at most every
+    PROGRESS_TTY_INTERVAL seconds.  Messages are written above it.
+    '''
+
+    def __init__(self, out=None):
+        natlas_progress.__init__(self, out)
+        self.__next = 0
+        self.__line = ''
+
+    def start(self, phase, total=None):
+        natlas_progress.start(self, phase, total)
+        self.start_timer(PROGRESS_TTY_INTERVAL)
+
+    def message(self, text):
+        text = text.strip('\n')
+        if (text == ''):
+            return
+        with self.lock:
+            self.out.write('\r\x1b[K%s\n%s' % (text, self.__line))
+            self.out.flush()
+
+    def finish(self):
+        self.stop_timer()
+        with self.lock:
+            self.refresh(True)
+            if (self.__line != ''):
+                self.out.write('\n')
+                self.out.flush()
+            self.__line = ''
+
+    def refresh(self, force=False):
+        with self.lock:
+            now = timer()
+            if ((force == False) & (now < self.__next)):
+                return
+            self.__next = now + PROGRESS_TTY_INTERVAL
+            if (self.phase == None):
+                return
+
+            done = self.counts.get(self.phase, 0)
+            line = '%-9s' % self.phase
+            if (self.total != None):
+                width = 20
+                fill = int(width * done / self.total) if (self.total > 0) else width
+                line += ' [%s%s] %i/%i' % ('#' * fill, '.' * (width - fill), done, self.total)
+            counts = ['%s=%i' % (k, v) for k, v in sorted(self.counts.items()) if (k != self.phase)]
+            if (len(counts) > 0):
+                line += '  ' + ' '.join(counts)
+            line += '  %.1fs' % (now - self.start_time)
+
+            self.__line = line
+            self.out.write('\r\x1b[K' + line)
+            self.out.flush()
+
+
+class natlas_progress_json(natlas_progress):
+    '''
+    JSON lines for logs: one for each message and phase, and one of the
+    counts at most every PROGRESS_JSON_INTERVAL seconds.
+    '''
+
+    def __init__(self, out=None):
+        natlas_progress.__init__(self, out)
+        self.__next = timer() + PROGRESS_JSON_INTERVAL
+
+    def start(self, phase, total=None):
+        self.phase = phase
+        self.total = total
+        self.__write({'event': 'start', 'phase': phase, 'total': total})
+        self.start_timer(PROGRESS_JSON_INTERVAL)
+
+    def message(self, text):
+        text = text.strip('\n')
+        if (text == ''):
+            return
+        self.__write({'event': 'message', 'phase': self.phase, 'text': text})
+
+    def finish(self):
+        self.stop_timer()
+        self.__write({'event': 'finish', 'phase': self.phase, 'total': self.total, 'counts': dict(self.counts)})
+
+    def refresh(self, force=False):
+        with self.lock:
+            now = timer()
+            if ((force == False) & (now < self.__next)):
+                return
+            self.__next = now + PROGRESS_JSON_INTERVAL
+            self.__write({'event': 'progress', 'phase': self.phase, 'total': self.total, 'counts': dict(self.counts)})
+
+    def __write(self, rec):
+        rec['time']     = time.strftime('%Y-%m-%dT%H:%M:%S')
+        rec['elapsed']  = round(timer() - self.start_time, 3)
+        with self.lock:
+            self.out.write(json.dumps(rec) + '\n')
+            self.out.flush()
@@ -0,0 +1,141 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        shard.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from timeit import default_timer as timer
+
+from .network import natlas_network, CHECKPOINT_DETAILS
+from .checkpoint import natlas_checkpoint
+
+class natlas_shard_discovery:
+    '''
+    Discover the shards defined in the config, each in its own process,
+    and merge them into one network.
+
+    A shard only queries the nodes its ACL permits.  Neighbors outside
+    of it are linked but left to their own shard, so each node is
+    queried by one process.  The shards are merged in config order, then
+    nodes at the edges that no shard permits are discovered, and the
+    details of nodes the shards did not collect are collected.
+
+    The work is spread over processes rather than threads so the SNMP
+    parsing of the shards runs in parallel.  Shard results are returned
+    to the parent as checkpoint dicts (see natlas_checkpoint.to_dict()).
+    '''
+
+    def __init__(self, network, workers=None):
+        self.network    = network
+        self.workers    = workers
+
+    def __str__(self):
+        return ('<shards=%i, workers=%s>' % (len(self.network.config.shards), self.workers))
+    def __repr__(self):
+        return self.__str__()
+
+    def discover(self, details):
+        '''
+        Discover all shards into self.network.
+
+        Args:
+            details     1 to also collect the details of each node
+        '''
+        network = self.network
+        conf    = network.config
+        shards  = conf.shards
+
+        if (network.verbose > 0):
+            network.progress.message('Discovering %i shards...' % len(shards))
+
+        results = [None] * len(shards)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {}
+            for i, shard in enumerate(shards):
+                fut = pool.submit(natlas_shard_discovery.discover_shard, conf, shard, network.max_depth, details)
+                futures[fut] = i
+
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    results[i] = fut.result()
+                except Exception as e:
+                    network.progress.message('[E] Shard %s failed: %s' % (shards[i].name, e))
+                    continue
+                if (network.verbose > 0):
+                    network.progress.message('    %s: %i nodes in %.2f sec' % (shards[i].name, len(results[i][0]['nodes']), results[i][2]))
+
+        # merge in config order so the result does not depend on
+        # which shard finished first
+        roots    = []
+        detailed = set()
+        for result in results:
+            if (result == None):
+                continue
+            data, detailed_idx, elapsed = result
+            shard_net = natlas_network(conf)
+            natlas_checkpoint(conf, None).from_dict(data, shard_net)
+            shard_nodes = shard_net.nodes[:]
+            node_map = network.merge(shard_net)
+
+            if (shard_net.root_node != None):
+                roots.append(node_map[id(shard_net.root_node)])
+            for i in detailed_idx:
+                detailed.add(id(node_map[id(shard_nodes[i])]))
+
+        if (len(roots) == 0):
+            return
+
+        network.discover_unwalked(roots)
+
+        if (details == 1):
+            network.details_done = detailed
+            network.discover_details()
+            network.details_done = set()
+
+    def discover_shard(conf, shard, max_depth, details):
+        '''
+        Discover one shard.  Run in a worker process.
+
+        Returns:
+            (checkpoint dict of the shard network,
+             list of node indexes whose details were collected,
+             seconds taken)
+        '''
+        start = timer()
+
+        network = natlas_network(conf)
+        network.set_verbose(0)
+        network.set_max_depth(max_depth)
+        network.set_shard(shard)
+        network.discover(shard.root)
+
+        detailed = []
+        if (details == 1):
+            walked = [n for n in network.nodes if (n.discovered == 1)]
+            network.discover_details(walked)
+            detailed = [i for i, n in enumerate(network.nodes) if (n.discovered == 1)]
+
+        data = natlas_checkpoint(conf, None).to_dict(network, CHECKPOINT_DETAILS)
+        return (data, detailed, timer() - start)
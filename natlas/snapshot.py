@@ -0,0 +1,250 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        snapshot.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+import json
+import time
+
+from .network import natlas_network
+from .node import natlas_node, natlas_node_link, natlas_node_svi, natlas_node_lo
+from .node_stack import natlas_node_stack, natlas_node_stack_member
+from .node_vss import natlas_node_vss, natlas_node_vss_member
+from .util import *
+from ._version import __version__
+
+SNAPSHOT_VERSION = 2
+
+# attributes saved for each object
+NODE_ATTRS  = ('name', 'ip', 'plat', 'ios', 'router', 'ospf_id', 'bgp_las', 'hsrp_pri',
+               'hsrp_vip', 'serial', 'bootfile', 'vpc_peerlink_if', 'vpc_domain', 'change_stamp')
+LINK_ATTRS  = ('link_type', 'remote_ip', 'remote_name', 'vlan', 'local_native_vlan',
+               'local_allowed_vlans', 'remote_native_vlan', 'remote_allowed_vlans',
+               'local_port', 'remote_port', 'local_lag', 'remote_lag', 'local_lag_ips',
+               'remote_lag_ips', 'local_if_ip', 'remote_if_ip', 'remote_platform',
+               'remote_ios', 'remote_mac', 'discovered_proto')
+# VLAN bitmaps are saved as hex strings
+LINK_BITMAP_ATTRS   = ('local_allowed_vlans', 'remote_allowed_vlans')
+STACK_MEMBER_ATTRS  = ('num', 'role', 'pri', 'mac', 'img', 'serial', 'plat')
+VSS_MEMBER_ATTRS    = ('ios', 'serial', 'plat')
+
+class natlas_snapshot:
+    '''
+    Save and load a discovered topology (nodes and links) as JSON.
+
+    A loaded snapshot gives a natlas_network that can be used for output
+    and lookups without touching the network.  Loaded nodes have no
+    credentials until they are queried again; the IP and the position
+    in the config of the credential that worked are saved so they are
+    tried first (see natlas_node.try_snmp_creds()).
+    '''
+
+    def __init__(self, conf):
+        self.config = conf
+
+    def __str__(self):
+        return ('<version=%i>' % SNAPSHOT_VERSION)
+    def __repr__(self):
+        return self.__str__()
+
+    def save(self, network, filename):
+        data = self.to_dict(network)
+        with open(filename, 'w') as f:
+            json.dump(data, f)
+
+    def load(self, filename):
+        '''
+        Load a snapshot file.
+
+        Returns:
+            natlas_network
+        '''
+        with open(filename, 'r') as f:
+            data = json.load(f)
+
+        if (data.get('version') != SNAPSHOT_VERSION):
+            raise Exception('Unsupported snapshot version in %s' % filename)
+
+        return self.from_dict(data)
+
+    def to_dict(self, network):
+        '''
+        Return the topology of a network as a dict that can be saved as JSON.
+        Nodes are saved in the order of network.nodes.
+        '''
+        nodes = network.nodes
+        node_idx = {}
+        for i, n in enumerate(nodes):
+            node_idx[id(n)] = i
+
+        data = {
+            'version':  SNAPSHOT_VERSION,
+            'natlas':   __version__,
+            'created':  int(time.time()),
+            'root':     node_idx.get(id(network.root_node)),
+            'nodes':    [self.__node_to_dict(n) for n in nodes],
+            'links':    []
+        }
+
+        for i, n in enumerate(nodes):
+            for link in n.links:
+                l = self.__attrs_to_dict(link, LINK_ATTRS)
+                for a in LINK_BITMAP_ATTRS:
+                    if (l[a] != None):
+                        l[a] = '%x' % l[a]
+                l['from'] = i
+                l['to']   = node_idx.get(id(link.node))
+                data['links'].append(l)
+
+        return data
+
+    def from_dict(self, data, network=None):
+        '''
+        Build a network from a dict returned by to_dict().
+
+        Args:
+            data        dict from to_dict()
+            network     natlas_network to load the nodes into, its nodes
+                        are replaced.  A new one is created if None.
+
+        Returns:
+            natlas_network
+        '''
+        if (network == None):
+            network = natlas_network(self.config)
+
+        network.nodes     = []
+        network.root_node = None
+        for d in data['nodes']:
+            network.nodes.append(self.__node_from_dict(d))
+
+        for d in data['links']:
+            link = natlas_node_link()
+            self.__attrs_from_dict(link, LINK_ATTRS, d)
+            for a in LINK_BITMAP_ATTRS:
+                if (d.get(a) != None):
+                    setattr(link, a, int(d[a], 16))
+            if (d['to'] != None):
+                link.node = network.nodes[d['to']]
+            network.nodes[d['from']].add_link(link)
+
+        if (data['root'] != None):
+            network.root_node = network.nodes[data['root']]
+
+        network.build_ip_index()
+        return network
+
+    def __node_to_dict(self, node):
+        d = self.__attrs_to_dict(node, NODE_ATTRS)
+        d['fingerprint'] = [self.__json_value(v) for v in node.fingerprint] if (node.fingerprint != None) else None
+        d['snmp']       = self.__snmp_to_list(node)
+        d['svis']       = [[svi.vlan, svi.ip] for svi in node.svis]
+        d['loopbacks']  = [[lo.name, lo.ips] for lo in node.loopbacks]
+        d['stack']      = {
+            'count':    node.stack.count,
+            'enabled':  node.stack.enabled,
+            'members':  [self.__attrs_to_dict(m, STACK_MEMBER_ATTRS) for m in node.stack.members]
+        }
+        d['vss']        = {
+            'enabled':  node.vss.enabled,
+            'domain':   self.__json_value(node.vss.domain),
+            'members':  [self.__attrs_to_dict(m, VSS_MEMBER_ATTRS) for m in node.vss.members]
+        }
+        return d
+
+    def __node_from_dict(self, d):
+        node = natlas_node()
+        self.__attrs_from_dict(node, NODE_ATTRS, d)
+        node.discovered = 1
+        if (d.get('fingerprint') != None):
+            node.fingerprint = tuple([util.intern_str(v) for v in d['fingerprint']])
+        self.__snmp_from_list(node, d.get('snmp'))
+
+        for vlan, ips in d['svis']:
+            svi = natlas_node_svi(vlan)
+            svi.ip = ips
+            node.svis.append(svi)
+        for name, ips in d['loopbacks']:
+            node.loopbacks.append(natlas_node_lo(name, ips))
+
+        # nodes without a stack or VSS keep the shared empty defaults
+        if ((d['stack']['count'] > 0) | (len(d['stack']['members']) > 0)):
+            node.stack          = natlas_node_stack()
+            node.stack.count    = d['stack']['count']
+            node.stack.enabled  = d['stack']['enabled']
+            for m in d['stack']['members']:
+                member = natlas_node_stack_member()
+                self.__attrs_from_dict(member, STACK_MEMBER_ATTRS, m)
+                node.stack.members.append(member)
+
+        if (d['vss']['enabled'] == 1):
+            node.vss            = natlas_node_vss()
+            node.vss.enabled    = 1
+            node.vss.domain     = d['vss']['domain']
+            node.vss.members    = [ natlas_node_vss_member(), natlas_node_vss_member() ]
+            for i, m in enumerate(d['vss']['members'][:2]):
+                self.__attrs_from_dict(node.vss.members[i], VSS_MEMBER_ATTRS, m)
+
+        return node
+
+    def __snmp_to_list(self, node):
+        '''
+        Return [config credential index, IP] of the credential that worked
+        for the node, or None.
+        '''
+        if ((node.snmpobj.v2_community == None) or (self.config == None)):
+            return None
+        for i, cred in enumerate(self.config.snmp_creds):
+            if ((cred['ver'] == node.snmpobj.ver) & (cred['community'] == node.snmpobj.v2_community)):
+                return [i, node.snmpobj._ip]
+        return None
+
+    def __snmp_from_list(self, node, snmp):
+        # only a hint, success stays 0 until the node is queried
+        if ((snmp == None) or (self.config == None)):
+            return
+        i, ip = snmp
+        if (i >= len(self.config.snmp_creds)):
+            return
+        cred = self.config.snmp_creds[i]
+        node.snmpobj._ip            = ip
+        node.snmpobj.ver            = cred['ver']
+        node.snmpobj.v2_community   = cred['community']
+
+    def __attrs_to_dict(self, obj, attrs):
+        d = {}
+        for a in attrs:
+            d[a] = self.__json_value(getattr(obj, a, None))
+        return d
+
+    def __attrs_from_dict(self, obj, attrs, d):
+        for a in attrs:
+            setattr(obj, a, util.intern_str(d.get(a)))
+
+    def __json_value(self, v):
+        # SNMP values and other objects are saved as their string form
+        if ((v == None) | isinstance(v, (str, int, float, list))):
+            return v
+        return str(v)
+
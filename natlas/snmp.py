@@ -32,6 +32,14 @@ OID_SYSNAME             = '1.3.6.1.2.1.1.5.0'
 
 OID_SYS_SERIAL          = '1.3.6.1.4.1.9.3.6.3.0'
 OID_SYS_BOOT            = '1.3.6.1.4.1.9.2.1.73.0'
+OID_SYS_UPTIME          = '1.3.6.1.2.1.1.3.0'
+OID_SYS_OBJECT_ID       = '1.3.6.1.2.1.1.2.0'
+OID_SNMP_ENGINE_ID      = '1.3.6.1.6.3.10.2.1.1.0'
+
+# sysUpTime of the last change to a table, used to skip unchanged nodes
+OID_IF_LAST_CHANGE      = '1.3.6.1.2.1.31.1.5.0'                    # ifTableLastChange
+OID_LLDP_LAST_CHANGE    = '1.0.8802.1.1.2.1.2.1.0'                  # lldpStatsRemTablesLastChangeTime
+OID_ENT_LAST_CHANGE     = '1.3.6.1.2.1.47.1.4.1.0'                  # entLastChangeTime
 
 OID_IFNAME              = '1.3.6.1.2.1.31.1.1.1.1'                  # + ifidx (BULK)
 
@@ -131,13 +139,53 @@ ARP_TYPE_INVALID        = 2
 ARP_TYPE_DYNAMIC        = 3
 ARP_TYPE_STATIC         = 4
 
+class natlas_oid_table(dict):
+    '''
+    Compact form of a get_bulk() table.
+
+    Maps each OID string to the prettyPrint() string of its value, in
+    the order the table was walked.  It holds no pysnmp objects and is
+    accepted by natlas_snmp.cache_lookup() and natlas_snmp.vbtbl_items()
+    in place of the raw table.
+    '''
+    __slots__ = ()
+
+    def __init__(self, varBindTable=None):
+        dict.__init__(self)
+        if (varBindTable == None):
+            return
+        for r in varBindTable:
+            for n, v in r:
+                self[str(n)] = v.prettyPrint()
+
+
 class natlas_snmp:
+    __slots__ = ('success', 'ver', 'v2_community', '_ip')
+
+    # natlas_progress that request errors are reported to, see
+    # set_reporter().  None prints them.
+    reporter = None
+
     def __init__(self, ip='0.0.0.0'):
         self.success = 0
         self.ver = 0
         self.v2_community = None
         self._ip = ip
 
+    #
+    # Report request errors through a natlas_progress instead of
+    # printing them, so they do not break a tty status line or a JSON
+    # stream.  Shared by all natlas_snmp objects, as stdout is.
+    #
+    def set_reporter(progress):
+        natlas_snmp.reporter = progress
+
+    def report_error(text):
+        if (natlas_snmp.reporter == None):
+            print(text)
+        else:
+            natlas_snmp.reporter.message(text)
+
     #
     # Try to find valid SNMP credentials in the provided list.
     # Returns 1 if success, 0 if failed.
@@ -168,6 +216,46 @@ class natlas_snmp:
 
         return 0
 
+    #
+    # Lightweight probe for sweeping address ranges.
+    # Try each credential with a single GET of OIDs, waiting timeout
+    # seconds and resending retries times.  Sets the credentials like
+    # get_cred() does.
+    # Returns the list of values, or None if there was no response.
+    # An agent that rejects the request with an error still has valid
+    # credentials, all of its values are None.
+    #
+    def probe(self, snmp_creds, oids, timeout=1, retries=0):
+        for cred in snmp_creds:
+            if (cred['ver'] != 2):
+                continue
+
+            community = cred['community']
+
+            cmdGen = cmdgen.CommandGenerator()
+            errIndication, errStatus, errIndex, varBinds = cmdGen.getCmd(
+                            cmdgen.CommunityData(community),
+                            cmdgen.UdpTransportTarget((self._ip, SNMP_PORT), timeout=timeout, retries=retries),
+                            *oids, lookupNames = False, lookupValues = False
+            )
+            if (errIndication):
+                continue
+
+            self.ver = 2
+            self.success = 1
+            self.v2_community = community
+
+            if (errStatus):
+                return [None] * len(oids)
+
+            ret = []
+            for n, v in varBinds:
+                r = v.prettyPrint()
+                ret.append(None if ((r == OID_ERR) | (r == OID_ERR_INST)) else r)
+            return ret
+
+        return None
+
     #
     # Get single SNMP value at OID.
     #
@@ -180,7 +268,7 @@ class natlas_snmp:
         )
 
         if errIndication:
-            print('[E] get_snmp_val(%s): %s' % (self.v2_community, errIndication))
+            natlas_snmp.report_error('[E] get_snmp_val(%s): %s' % (self.v2_community, errIndication))
         else:
             r = varBinds[0][1].prettyPrint()
             if ((r == OID_ERR) | (r == OID_ERR_INST)):
@@ -190,6 +278,32 @@ class natlas_snmp:
         return None
 
 
+    #
+    # Get several single SNMP values in one request.
+    # Returns a list with a value, or None, for each OID.
+    # Returns None if the request failed.
+    #
+    def get_vals(self, oids):
+        cmdGen = cmdgen.CommandGenerator()
+        errIndication, errStatus, errIndex, varBinds = cmdGen.getCmd(
+                        cmdgen.CommunityData(self.v2_community),
+                        cmdgen.UdpTransportTarget((self._ip, SNMP_PORT), retries=2),
+                        *oids, lookupNames = False, lookupValues = False
+        )
+
+        if errIndication:
+            natlas_snmp.report_error('[E] get_snmp_vals(%s): %s' % (self.v2_community, errIndication))
+            return None
+        if errStatus:
+            return None
+
+        ret = []
+        for n, v in varBinds:
+            r = v.prettyPrint()
+            ret.append(None if ((r == OID_ERR) | (r == OID_ERR_INST)) else r)
+        return ret
+
+
     #
     # Get bulk SNMP value at OID.
     #
@@ -206,7 +320,7 @@ class natlas_snmp:
         )
 
         if errIndication:
-            print('[E] get_snmp_bulk(%s): %s' % (self.v2_community, errIndication))
+            natlas_snmp.report_error('[E] get_snmp_bulk(%s): %s' % (self.v2_community, errIndication))
         else:
             ret = []
             for r in varBindTable:
@@ -227,6 +341,9 @@ class natlas_snmp:
         if (varBindTable == None):
             return None
 
+        if (type(varBindTable) == natlas_oid_table):
+            return varBindTable.get(name)
+
         for r in varBindTable:
             for n, v in r:
                 n = str(n)
@@ -235,6 +352,32 @@ class natlas_snmp:
         return None
 
 
+    #
+    # Iterate over the (OID, value) strings of a get_bulk() table
+    # or of a natlas_oid_table.
+    #
+    def vbtbl_items(varBindTable):
+        if (varBindTable == None):
+            return
+
+        if (type(varBindTable) == natlas_oid_table):
+            yield from varBindTable.items()
+            return
+
+        for r in varBindTable:
+            for n, v in r:
+                yield (str(n), v.prettyPrint())
+
+
+    #
+    # Replace a get_bulk() table with its natlas_oid_table.
+    #
+    def compact_vbtbl(varBindTable):
+        if ((varBindTable == None) or (type(varBindTable) == natlas_oid_table)):
+            return varBindTable
+        return natlas_oid_table(varBindTable)
+
+
     #
     # Given an OID 1.2.3.4...x.y.z return z
     #
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        sweep.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+import time
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .snmp import *
+
+# addresses in flight per worker
+SWEEP_WINDOW = 4
+
+class natlas_sweep:
+    '''
+    Probe address ranges for SNMP devices, eg to find devices that are
+    not seen by CDP/LLDP such as firewalls.
+
+    Each address gets one GET of sysName and sysObjectID per SNMP
+    credential.  Probes run in config.sweep.workers threads but are
+    paced to config.sweep.rate packets per second.  A probe is counted
+    as the most packets it can send, one per credential per try, and
+    the sweep stops once config.sweep.max_packets would be exceeded.
+    Only SWEEP_WINDOW addresses per worker are queued at a time, so
+    large ranges are never expanded in memory.
+    '''
+
+    def __init__(self, conf):
+        self.config     = conf
+        self.probed     = 0     # addresses probed
+        self.packets    = 0     # packets counted against the budget
+        self.stopped    = 0     # 1 if the packet budget ran out
+        self.__lock     = threading.Lock()
+        self.__next     = 0     # time the next probe may start
+
+    def __str__(self):
+        return ('<probed=%i, packets=%i, stopped=%i>' % (self.probed, self.packets, self.stopped))
+    def __repr__(self):
+        return self.__str__()
+
+    def sweep(self, ranges=None, accept=None):
+        '''
+        Probe every host address in a list of ranges.
+
+        Args:
+            ranges      List of CIDR strings (default: config sweep.ranges)
+            accept      Optional function(ip, name) that returns True if
+                        the address should be used.  It is called with
+                        name None before an address is probed, and with
+                        the sysName of each device that responds.
+
+        Returns:
+            List of (ip, sysName, sysObjectID) of the devices that
+            responded, in address order.
+        '''
+        if (ranges == None):
+            ranges = self.config.sweep.ranges
+
+        ips     = self.__get_addresses(ranges, accept)
+        window  = max(1, self.config.sweep.workers) * SWEEP_WINDOW
+        found   = []
+        pending = {}    # future -> (address order, ip)
+        order   = 0
+
+        self.__next = time.time()
+        pool = ThreadPoolExecutor(max_workers=self.config.sweep.workers)
+        try:
+            while (1):
+                if (self.stopped == 0):
+                    for ip in ips:
+                        pending[pool.submit(self.__probe, ip)] = (order, ip)
+                        order += 1
+                        if (len(pending) >= window):
+                            break
+                if (len(pending) == 0):
+                    break
+                done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    i, ip = pending.pop(fut)
+                    vals = fut.result()
+                    if (vals != None):
+                        found.append((i, ip, vals))
+        finally:
+            for fut in pending:
+                fut.cancel()
+            pool.shutdown()
+
+        ret = []
+        found.sort(key=lambda f: f[0])
+        for i, ip, vals in found:
+            if ((accept != None) and (accept(ip, vals[0]) == False)):
+                continue
+            ret.append((ip, vals[0], vals[1]))
+        return ret
+
+    def __get_addresses(self, ranges, accept):
+        '''
+        Generate the addresses to probe, once each, in range order.
+        Overlaps are skipped by the ranges already done rather than a
+        set of every address.
+        '''
+        done = []
+        for cidr in ranges:
+            first, last = natlas_sweep.get_host_range(cidr)
+            for i in range(first, last + 1):
+                if (len([1 for f, l in done if ((i >= f) & (i <= l))]) > 0):
+                    continue
+                ip = natlas_sweep.int_to_ip(i)
+                if ((accept != None) and (accept(ip, None) == False)):
+                    continue
+                yield ip
+            done.append((first, last))
+
+    def __probe(self, ip):
+        creds   = [c for c in self.config.snmp_creds if (c['ver'] == 2)]
+        cost    = len(creds) * (1 + self.config.sweep.retries)
+        budget  = self.config.sweep.max_packets
+        rate    = self.config.sweep.rate
+
+        with self.__lock:
+            if ((self.stopped == 1) or ((budget > 0) & (self.packets + cost > budget))):
+                self.stopped = 1
+                return None
+            self.packets += cost
+            self.probed  += 1
+
+            # reserve the next slot, keeping the rate over all workers
+            start = self.__next
+            if (rate > 0):
+                self.__next = max(self.__next, time.time()) + (cost / rate)
+
+        delay = start - time.time()
+        if (delay > 0):
+            time.sleep(delay)
+
+        snmpobj = natlas_snmp(ip)
+        return snmpobj.probe(creds, [OID_SYSNAME, OID_SYS_OBJECT_ID],
+                             self.config.sweep.timeout, self.config.sweep.retries)
+
+    def get_host_range(cidr):
+        '''
+        Return the (first, last) host addresses of a CIDR as integers,
+        leaving out the network and broadcast addresses unless it is a
+        /31 or /32.
+        '''
+        t = cidr.split('/')
+        nbits = int(t[1]) if (len(t) > 1) else 32
+        o = t[0].split('.')
+        ip = ((int(o[0])<<24) + (int(o[1]) << 16) + (int(o[2]) << 8) + (int(o[3])))
+        first = ip & ((0xFFFFFFFF << (32 - nbits)) & 0xFFFFFFFF)
+        last  = first + (1 << (32 - nbits)) - 1
+        if (nbits < 31):
+            first += 1
+            last  -= 1
+        return (first, last)
+
+    def int_to_ip(i):
+        return '%i.%i.%i.%i' % (((i >> 24) & 0xFF), ((i >> 16) & 0xFF), ((i >> 8) & 0xFF), (i & 0xFF))
+
+    def get_hosts(cidr):
+        '''
+        Return the host addresses of a CIDR, leaving out the network
+        and broadcast addresses unless it is a /31 or /32.
+        '''
+        first, last = natlas_sweep.get_host_range(cidr)
+        for i in range(first, last + 1):
+            yield natlas_sweep.int_to_ip(i)
@@ -0,0 +1,384 @@
+#!/usr/bin/python
+
+'''
+        natlas
+        table.py
+
+        Michael Laforest
+        mjlaforest@gmail.com
+
+        Copyright (C) 2015-2018 Michael Laforest
+
+        This program is free software; you can redistribute it and/or
+        modify it under the terms of the GNU General Public License
+        as published by the Free Software Foundation; either version 2
+        of the License, or (at your option) any later version.
+
+        This program is distributed in the hope that it will be useful,
+        but WITHOUT ANY WARRANTY; without even the implied warranty of
+        MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+        GNU General Public License for more details.
+
+        You should have received a copy of the GNU General Public License
+        along with this program; if not, write to the Free Software
+        Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+'''
+
+'''
+    Compact columnar tables for CAM (MAC) and ARP results.
+
+    Each entry is stored as a row index into a set of typed arrays
+    rather than as a Python object holding several strings:
+
+        MAC addresses   uint64
+        IPv4 addresses  uint32
+        VLANs           uint16
+        strings         uint32 id into a shared natlas_string_table
+
+    Iterating or indexing a table returns lightweight row views that
+    expose the same attributes as natlas_mac.mac_object / natlas_arp,
+    so existing code can keep using m.mac, m.port, a.ip, etc.
+'''
+
+import re
+import socket
+import struct
+
+from array import array
+
+# typecodes for the columns
+TC_UINT16   = 'H'
+TC_UINT32   = 'I' if (array('I').itemsize == 4) else 'L'
+TC_UINT64   = 'Q'
+
+MAC_UNKNOWN = 0
+IP_UNKNOWN  = 0
+
+
+class natlas_string_table:
+    '''
+    Intern repeated strings (hostnames, ports, ARP types) to integer ids.
+    '''
+    def __init__(self):
+        self.strings = []
+        self.ids     = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, s):
+        if (s == None):
+            s = ''
+        sid = self.ids.get(s)
+        if (sid == None):
+            sid = len(self.strings)
+            self.strings.append(s)
+            self.ids[s] = sid
+        return sid
+
+    def get(self, sid):
+        return self.strings[sid]
+
+    def match_ids(self, pattern):
+        '''
+        Return the set of ids whose string matches the regex pattern.
+        The regex runs once per distinct string, not once per row.
+        '''
+        return set([i for i, s in enumerate(self.strings) if (re.match(pattern, s) != None)])
+
+
+#
+# Conversion helpers between the ASCII and integer forms.
+#
+def mac_str_to_int(mac):
+    if ((mac == None) | (mac == '')):
+        return MAC_UNKNOWN
+    try:
+        return int(re.sub('[\.:\-]', '', mac), 16)
+    except ValueError:
+        return MAC_UNKNOWN
+
+def mac_int_to_str(imac):
+    s = '%012x' % imac
+    return '%s.%s.%s' % (s[0:4], s[4:8], s[8:12])
+
+def ip_str_to_int(ip):
+    try:
+        return struct.unpack('!I', socket.inet_aton(ip))[0]
+    except (OSError, TypeError):
+        return IP_UNKNOWN
+
+def ip_int_to_str(iip):
+    return socket.inet_ntoa(struct.pack('!I', iip))
+
+def mac_prefix_to_mask(prefix):
+    '''
+    Convert a MAC prefix (eg, '0023.24' or '00:23:24') into a (value, mask)
+    pair that can be tested against the uint64 MAC column.
+    '''
+    hexstr = re.sub('[\.:\-]', '', prefix)
+    if ((len(hexstr) == 0) | (len(hexstr) > 12)):
+        raise ValueError('Invalid MAC prefix "%s"' % prefix)
+    shift = 48 - (len(hexstr) * 4)
+    value = int(hexstr, 16) << shift
+    mask  = (0xFFFFFFFFFFFF >> shift) << shift
+    return (value, mask)
+
+
+def match_values(column, pattern, fmt):
+    '''
+    Return the set of distinct values in column whose fmt(value) form
+    matches the regex pattern.  The regex runs once per distinct value.
+    '''
+    r = re.compile(pattern)
+    return set([v for v in set(column) if (r.match(fmt(v)) != None)])
+
+
+class natlas_table:
+    '''
+    Methods shared by the columnar tables, which all have a macs column.
+    Subclasses provide take().
+
+    The filter_*() methods are a single Python pass over one column,
+    comparing plain integers; no row objects or strings are built per
+    row.  This is not vectorised: array.array has no bulk compare, and
+    on CPython a list comprehension over the column measured faster
+    than itertools.compress()/map().
+    '''
+
+    def filter_mac(self, pattern):
+        '''
+        Filter by regex against the aabb.ccdd.eeff form of the MAC.
+        '''
+        macs = match_values(self.macs, pattern, mac_int_to_str)
+        return self.take([i for i, m in enumerate(self.macs) if (m in macs)])
+
+    def filter_mac_prefix(self, prefix):
+        value, mask = mac_prefix_to_mask(prefix)
+        return self.take([i for i, m in enumerate(self.macs) if ((m & mask) == value)])
+
+    def index_by_mac(self):
+        '''
+        Build a hash index of MAC -> list of row indexes.
+        A MAC can appear more than once (multiple VLANs, multiple IPs,
+        or multiple devices).
+        '''
+        index = {}
+        for i, m in enumerate(self.macs):
+            rows = index.get(m)
+            if (rows == None):
+                index[m] = [i]
+            else:
+                rows.append(i)
+        return index
+
+
+class natlas_mac_table(natlas_table):
+    '''
+    Columnar CAM table.
+    '''
+
+    class row:
+        __slots__ = ('table', 'idx')
+
+        def __init__(self, table, idx):
+            self.table  = table
+            self.idx    = idx
+
+        @property
+        def node_host(self):    return self.table.strtbl.get(self.table.hosts[self.idx])
+        @property
+        def node_ip(self):      return self.table.strtbl.get(self.table.node_ips[self.idx])
+        @property
+        def vlan(self):         return self.table.vlans[self.idx]
+        @property
+        def mac(self):          return mac_int_to_str(self.table.macs[self.idx])
+        @property
+        def mac_int(self):      return self.table.macs[self.idx]
+        @property
+        def port(self):         return self.table.strtbl.get(self.table.ports[self.idx])
+
+        def __str__(self):
+            return ('<node_host="%s", node_ip="%s", vlan="%s", mac="%s", port="%s">'
+                    % (self.node_host, self.node_ip, self.vlan, self.mac, self.port))
+        def __repr__(self):
+            return self.__str__()
+
+
+    def __init__(self, strtbl=None):
+        self.strtbl     = strtbl if (strtbl != None) else natlas_string_table()
+        self.hosts      = array(TC_UINT32)
+        self.node_ips   = array(TC_UINT32)
+        self.vlans      = array(TC_UINT16)
+        self.macs       = array(TC_UINT64)
+        self.ports      = array(TC_UINT32)
+
+    def __str__(self):
+        return ('<macs=%i>' % len(self.macs))
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self.macs)
+
+    def __iter__(self):
+        for i in range(0, len(self.macs)):
+            yield natlas_mac_table.row(self, i)
+
+    def __getitem__(self, idx):
+        if (idx < 0):
+            idx += len(self.macs)
+        if ((idx < 0) | (idx >= len(self.macs))):
+            raise IndexError('natlas_mac_table index out of range')
+        return natlas_mac_table.row(self, idx)
+
+    def append(self, node_host, node_ip, vlan, mac, port):
+        self.hosts.append(self.strtbl.intern(node_host))
+        self.node_ips.append(self.strtbl.intern(node_ip))
+        self.vlans.append(int(vlan))
+        self.macs.append(mac if (type(mac) == int) else mac_str_to_int(mac))
+        self.ports.append(self.strtbl.intern(port))
+
+    def extend(self, other):
+        if (other == None):
+            return
+        if (other.strtbl is self.strtbl):
+            self.hosts.extend(other.hosts)
+            self.node_ips.extend(other.node_ips)
+            self.ports.extend(other.ports)
+        else:
+            # remap the string ids into our table
+            remap = [self.strtbl.intern(s) for s in other.strtbl.strings]
+            self.hosts.extend([remap[i] for i in other.hosts])
+            self.node_ips.extend([remap[i] for i in other.node_ips])
+            self.ports.extend([remap[i] for i in other.ports])
+        self.vlans.extend(other.vlans)
+        self.macs.extend(other.macs)
+
+    def take(self, indexes):
+        '''
+        Return a new table with only the rows at indexes.
+        The string table is shared with this table.
+        '''
+        ret = natlas_mac_table(self.strtbl)
+        ret.hosts       = array(TC_UINT32, [self.hosts[i] for i in indexes])
+        ret.node_ips    = array(TC_UINT32, [self.node_ips[i] for i in indexes])
+        ret.vlans       = array(TC_UINT16, [self.vlans[i] for i in indexes])
+        ret.macs        = array(TC_UINT64, [self.macs[i] for i in indexes])
+        ret.ports       = array(TC_UINT32, [self.ports[i] for i in indexes])
+        return ret
+
+    def filter_vlan(self, vlan):
+        vlan = int(vlan)
+        return self.take([i for i, v in enumerate(self.vlans) if (v == vlan)])
+
+    def filter_port(self, pattern):
+        ids = self.strtbl.match_ids(pattern)
+        return self.take([i for i, p in enumerate(self.ports) if (p in ids)])
+
+    def find_mac(self, mac):
+        '''
+        Return the first row with the MAC address, or None.
+        '''
+        imac = mac if (type(mac) == int) else mac_str_to_int(mac)
+        try:
+            return natlas_mac_table.row(self, self.macs.index(imac))
+        except ValueError:
+            return None
+
+
+class natlas_arp_table(natlas_table):
+    '''
+    Columnar ARP table.
+    '''
+
+    class row:
+        __slots__ = ('table', 'idx')
+
+        def __init__(self, table, idx):
+            self.table  = table
+            self.idx    = idx
+
+        @property
+        def ip(self):           return ip_int_to_str(self.table.ips[self.idx])
+        @property
+        def ip_int(self):       return self.table.ips[self.idx]
+        @property
+        def mac(self):          return mac_int_to_str(self.table.macs[self.idx])
+        @property
+        def mac_int(self):      return self.table.macs[self.idx]
+        @property
+        def interf(self):       return self.table.strtbl.get(self.table.interfs[self.idx])
+        @property
+        def arp_type(self):     return self.table.strtbl.get(self.table.types[self.idx])
+
+        def __str__(self):
+            return ('<ip="%s",mac="%s",interf="%s",arp_type="%s">' % (self.ip, self.mac, self.interf, self.arp_type))
+        def __repr__(self):
+            return self.__str__()
+
+
+    def __init__(self, strtbl=None):
+        self.strtbl     = strtbl if (strtbl != None) else natlas_string_table()
+        self.ips        = array(TC_UINT32)
+        self.macs       = array(TC_UINT64)
+        self.interfs    = array(TC_UINT32)
+        self.types      = array(TC_UINT32)
+
+    def __str__(self):
+        return ('<arps=%i>' % len(self.ips))
+    def __repr__(self):
+        return self.__str__()
+
+    def __len__(self):
+        return len(self.ips)
+
+    def __iter__(self):
+        for i in range(0, len(self.ips)):
+            yield natlas_arp_table.row(self, i)
+
+    def __getitem__(self, idx):
+        if (idx < 0):
+            idx += len(self.ips)
+        if ((idx < 0) | (idx >= len(self.ips))):
+            raise IndexError('natlas_arp_table index out of range')
+        return natlas_arp_table.row(self, idx)
+
+    def append(self, ip, mac, interf, arp_type):
+        self.ips.append(ip if (type(ip) == int) else ip_str_to_int(ip))
+        self.macs.append(mac if (type(mac) == int) else mac_str_to_int(mac))
+        self.interfs.append(self.strtbl.intern(interf))
+        self.types.append(self.strtbl.intern(arp_type))
+
+    def extend(self, other):
+        if (other == None):
+            return
+        if (other.strtbl is self.strtbl):
+            self.interfs.extend(other.interfs)
+            self.types.extend(other.types)
+        else:
+            remap = [self.strtbl.intern(s) for s in other.strtbl.strings]
+            self.interfs.extend([remap[i] for i in other.interfs])
+            self.types.extend([remap[i] for i in other.types])
+        self.ips.extend(other.ips)
+        self.macs.extend(other.macs)
+
+    def take(self, indexes):
+        ret = natlas_arp_table(self.strtbl)
+        ret.ips         = array(TC_UINT32, [self.ips[i] for i in indexes])
+        ret.macs        = array(TC_UINT64, [self.macs[i] for i in indexes])
+        ret.interfs     = array(TC_UINT32, [self.interfs[i] for i in indexes])
+        ret.types       = array(TC_UINT32, [self.types[i] for i in indexes])
+        return ret
+
+    def filter_ip(self, pattern):
+        ips = match_values(self.ips, pattern, ip_int_to_str)
+        return self.take([i for i, a in enumerate(self.ips) if (a in ips)])
+
+    def filter_interf(self, pattern):
+        ids = self.strtbl.match_ids(pattern)
+        return self.take([i for i, v in enumerate(self.interfs) if (v in ids)])
+
+    def filter_arp_type(self, pattern):
+        ids = self.strtbl.match_ids(pattern)
+        return self.take([i for i, v in enumerate(self.types) if (v in ids)])
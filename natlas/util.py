@@ -27,7 +27,9 @@
 # Set the below line =0 if you do not want to use PyNetAddr
 USE_NETADDR = 1
 
+import os
 import re
+import sys
 import struct
 import binascii
 
@@ -37,6 +39,14 @@ from .config import natlas_config
 if (USE_NETADDR == 1):
     from netaddr import IPAddress, IPNetwork
 
+# VLAN bitmaps are ints where bit N is set if VLAN N is in the set
+VLAN_STD_MAX            = 1001
+VLAN_BITMAP_STD         = (1 << (VLAN_STD_MAX + 1)) - 2        # VLANs 1-1001
+VLAN_BITMAP_ALL         = (1 << 4095) - 2                      # VLANs 1-4094
+
+# byte -> byte with its bits in reverse order
+REVERSE_BITS            = bytes([int('{:08b}'.format(i)[::-1], 2) for i in range(256)])
+
 class util:
 
     def get_net_bits_from_mask(netm):
@@ -75,6 +85,18 @@ class util:
         return ((cidr_ip & cidr_mb) == (ip & cidr_mb))
 
 
+    #
+    # Return the network address of a CIDR, eg 10.1.2.3/24 -> 10.1.2.0/24
+    #
+    def get_cidr_network(cidr):
+        t = cidr.split('/')
+        nbits = int(t[1]) if (len(t) > 1) else 32
+        o = t[0].split('.')
+        ip = ((int(o[0])<<24) + (int(o[1]) << 16) + (int(o[2]) << 8) + (int(o[3])))
+        ip = ip & ((0xFFFFFFFF << (32 - nbits)) & 0xFFFFFFFF)
+        return '%i.%i.%i.%i/%i' % (((ip >> 24) & 0xFF), ((ip >> 16) & 0xFF), ((ip >> 8) & 0xFF), (ip & 0xFF), nbits)
+
+
     #
     # Shorten the hostname by removing any defined domain suffixes.
     #
@@ -105,6 +127,111 @@ class util:
         return host
 
 
+    #
+    # Shorten an interface name, eg GigabitEthernet1/0/1 -> gi1/0/1
+    #
+    def shorten_port_name(port):
+        if (port == OID_ERR):
+            return 'UNKNOWN'
+
+        if (port != None):
+            port = port.replace('TenGigabitEthernet', 'te')
+            port = port.replace('GigabitEthernet', 'gi')
+            port = port.replace('FastEthernet', 'fa')
+            port = port.replace('port-channel', 'po')
+            port = port.replace('Te', 'te')
+            port = port.replace('Gi', 'gi')
+            port = port.replace('Fa', 'fa')
+            port = port.replace('Po', 'po')
+
+        return util.intern_str(port)
+
+
+    #
+    # Return the resident memory of this process in MB, or 0 if unknown.
+    #
+    def get_rss_mb():
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf('SC_PAGE_SIZE') / 1048576
+        except (OSError, ValueError, AttributeError):
+            pass
+        try:
+            import resource
+            # peak rather than current, but the best we have (KB on Linux, bytes on macOS)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss / (1048576 if (sys.platform == 'darwin') else 1024)
+        except ImportError:
+            return 0
+
+
+    #
+    # Intern a string that is repeated across many nodes or links, eg
+    # platform, software version or port names, so all copies share
+    # one object.  Anything other than a str is returned as is.
+    #
+    def intern_str(s):
+        if (type(s) == str):
+            return sys.intern(s)
+        return s
+
+
+    #
+    # Convert an SNMP VLAN bit string (0x..., first bit is VLAN 0) to a
+    # VLAN bitmap.  Returns None if the value is not a hex string.
+    #
+    def parse_vlan_bitmap(hexstr):
+        if ((hexstr == None) or (hexstr.startswith('0x') == False)):
+            return None
+        h = hexstr[2:]
+        if (len(h) % 2):
+            h += '0'
+        try:
+            b = bytes.fromhex(h)
+        except ValueError:
+            return None
+        # the SNMP string is MSB first - reverse each byte so VLAN N is bit N
+        return int.from_bytes(b.translate(REVERSE_BITS), 'little')
+
+
+    #
+    # Return a list of the VLAN IDs set in a VLAN bitmap.
+    #
+    def vlan_bitmap_to_list(bitmap):
+        if (bitmap == None):
+            return []
+        bits = bin(bitmap)[:1:-1]
+        return [v for v in range(len(bits)) if (bits[v] == '1')]
+
+
+    #
+    # Return a VLAN bitmap as a range string, eg 1-10,20,30-40
+    # Only the standard VLAN range (1-1001) is shown.
+    #
+    def vlan_bitmap_to_str(bitmap):
+        if (bitmap == None):
+            return None
+        bitmap &= VLAN_BITMAP_STD
+        if (bitmap == VLAN_BITMAP_STD):
+            return 'All'
+        if (bitmap == 0):
+            return 'None'
+
+        ranges = []
+        while (bitmap):
+            start = (bitmap & -bitmap).bit_length() - 1
+            run = bitmap >> start
+            n = (run ^ (run + 1)).bit_length() - 1      # number of consecutive VLANs
+            if (n > 1):
+                ranges.append('%i-%i' % (start, start + n - 1))
+            else:
+                ranges.append(str(start))
+            bitmap &= ~(((1 << n) - 1) << start)
+
+        return ','.join(ranges)
+
+
     #
     # Return a string representation of an IPv4 address
     #